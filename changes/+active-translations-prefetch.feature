@@ -0,0 +1 @@
+Add the ``:active`` suffix to BLOG_OPTIMIZE_PROFILES prefetch lookups to only prefetch the translations in the active language and its fallbacks
@@ -0,0 +1 @@
+Add ArchiveMonth counters table, kept up to date on post changes, with rebuild_blog_archive command
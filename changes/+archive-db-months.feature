@@ -0,0 +1 @@
+Add BLOG_ARCHIVE_DB_AGGREGATION to group and count archive months in the database
@@ -0,0 +1 @@
+Fetch AuthorEntriesPlugin posts and counts with a fixed number of queries using a window function
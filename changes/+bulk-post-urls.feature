@@ -0,0 +1 @@
+Add bulk URL resolver for post querysets (Post.objects.get_urls) and use it in sitemap and menu
@@ -0,0 +1 @@
+Protect feeds and latest posts caches from cache stampedes, serving stale entries while a single request recomputes them (BLOG_CACHE_STALE_TIMEOUT, BLOG_CACHE_LOCK_TIMEOUT, BLOG_CACHE_XFETCH_BETA)
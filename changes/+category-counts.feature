@@ -0,0 +1 @@
+Annotate published posts count on categories in the category plugin and in the post views / plugins prefetches
@@ -0,0 +1 @@
+Add opt-in per-apphook cache of the post detail responses to anonymous users, with ETag and Last-Modified headers (BLOG_DETAIL_CACHE, BLOG_DETAIL_CACHE_TIMEOUT)
@@ -0,0 +1 @@
+Cache whole feed responses with invalidation on posts changes and publication boundaries, and support conditional GET
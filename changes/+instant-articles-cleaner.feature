@@ -0,0 +1 @@
+Clean the Instant Articles HTML in a single pass over the article element
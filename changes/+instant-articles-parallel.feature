@@ -0,0 +1 @@
+Render the Instant Articles feed items missing from the cache in parallel threads (BLOG_FEED_INSTANT_RENDER_WORKERS)
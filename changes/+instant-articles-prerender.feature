@@ -0,0 +1 @@
+Pre-render Facebook Instant Articles content in a background thread pool when posts are saved (BLOG_FEED_INSTANT_PRERENDER_WORKERS)
@@ -0,0 +1 @@
+Add opt-in per-apphook keyset pagination for blog list views
@@ -0,0 +1 @@
+Answer conditional requests to the post list views with 304 Not Modified using cheap list validators (BLOG_LIST_CONDITIONAL_GET)
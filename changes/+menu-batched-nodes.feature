@@ -0,0 +1 @@
+Build the blog menu with a fixed number of queries and precomputed URL templates
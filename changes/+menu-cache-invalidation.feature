@@ -0,0 +1 @@
+Clear only the menu cache of the sites and languages affected by blog posts, categories and configs changes
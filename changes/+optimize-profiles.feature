@@ -0,0 +1 @@
+Add declarative optimization profiles (BLOG_OPTIMIZE_PROFILES) to load the related objects of the posts rendered by views and plugins in a constant number of queries
@@ -0,0 +1 @@
+Cached latest entries and featured posts plugins expire at the next publication window boundary of their posts
@@ -0,0 +1 @@
+Add Post.all_sites flag to filter posts by site without joining the sites table
@@ -0,0 +1 @@
+Add pregenerate_blog_files command to render sitemaps and feeds to static files, and PregeneratedFileView to serve them
@@ -0,0 +1 @@
+Add BLOG_PUBLICATION_TIME_BUCKET setting to quantize the reference time of published posts and cache latest posts ids
@@ -0,0 +1 @@
+Add paginated, streaming sitemap sections per apphook config and language (BlogSitemaps) for the sitemap index
@@ -0,0 +1 @@
+Store post permalinks per translation to build post URLs without extra queries
@@ -0,0 +1 @@
+Add single-query tag cloud engine (TaggedFilterItem.tag_cloud_values) and use it in BlogTagsPlugin
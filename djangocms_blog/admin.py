@@ -486,6 +486,8 @@ class BlogConfigAdmin(BaseAppHookConfig, TranslatableAdmin):
                 {
                     "fields": (
                         "config.paginate_by",
+                        "config.keyset_pagination",
+                        "config.detail_cache",
                         "config.url_patterns",
                         "config.template_prefix",
                         "config.menu_structure",
@@ -546,13 +548,3 @@ class BlogConfigAdmin(BaseAppHookConfig, TranslatableAdmin):
                 },
             ),
         ]
-
-    def save_model(self, request, obj, form, change):
-        """
-        Clear menu cache when changing menu structure
-        """
-        if "config.menu_structure" in form.changed_data:
-            from menus.menu_pool import menu_pool
-
-            menu_pool.clear(all=True)
-        return super().save_model(request, obj, form, change)
@@ -0,0 +1,146 @@
+import math
+import random
+import time
+
+from django.core.cache import cache
+
+from .settings import get_setting
+
+LOCK_CACHE_KEY = "{}:lock"
+
+
+def _pack(value, timeout, delta, version):
+    return {
+        "value": value,
+        "expires": time.time() + timeout if timeout is not None else None,
+        "delta": delta,
+        "version": version,
+    }
+
+
+def _is_entry(entry):
+    # values stored by previous releases under the same keys are not packed, they are handled as missing
+    return isinstance(entry, dict) and entry.keys() >= {"value", "expires", "delta", "version"}
+
+
+def _get_entries(keys):
+    return {key: entry for key, entry in cache.get_many(keys).items() if _is_entry(entry)}
+
+
+def _physical_timeout(timeout):
+    if not timeout:
+        # ``0`` disables the cache
+        return timeout
+    return timeout + get_setting("CACHE_STALE_TIMEOUT")
+
+
+def is_fresh(entry, version=None):
+    """
+    Check if the given cache entry can be served without recomputing it.
+
+    Entries are stale once expired or if their version does not match; entries close to their expiration are
+    considered stale with a probability increasing with the time spent to compute them (probabilistic early
+    recomputation, aka "XFetch"), so that they are usually recomputed by a single worker before they expire.
+    """
+    if not _is_entry(entry) or entry["version"] != version:
+        return False
+    if entry["expires"] is None:
+        return True
+    beta = get_setting("CACHE_XFETCH_BETA")
+    return time.time() - entry["delta"] * beta * math.log(1 - random.random()) < entry["expires"]
+
+
+def get(key):
+    """
+    Return the value stored under ``key`` (fresh or stale), ``None`` if missing.
+    """
+    entry = cache.get(key)
+    if _is_entry(entry):
+        return entry["value"]
+
+
+def store(key, value, timeout, delta=0, version=None):
+    """
+    Store the value under ``key``: the value is fresh for ``timeout`` seconds (forever if ``None``), then stale for
+    ``BLOG_CACHE_STALE_TIMEOUT`` seconds.
+
+    :param delta: time spent to compute the value (in seconds)
+    :param version: version of the value (see :py:func:`get_many_or_set`)
+    """
+    cache.set(key, _pack(value, timeout, delta, version), timeout=_physical_timeout(timeout))
+
+
+def expire(keys):
+    """
+    Mark the values stored under ``keys`` as stale, instead of deleting them: values are served until they are
+    recomputed (for ``BLOG_CACHE_STALE_TIMEOUT`` seconds at most).
+    """
+    entries = _get_entries(keys)
+    for entry in entries.values():
+        entry["expires"] = 0
+    if entries:
+        cache.set_many(entries, timeout=get_setting("CACHE_STALE_TIMEOUT"))
+
+
+def get_many_or_set(keys, compute, timeout, version=None):
+    """
+    Return the values stored under ``keys``, computing the missing and stale ones with ``compute``.
+
+    Only the worker acquiring the key lock recomputes a stale value, the other ones serve the stale value meanwhile;
+    when the value is missing the other workers wait for it up to ``BLOG_CACHE_LOCK_TIMEOUT`` seconds, and compute it
+    themselves if it's still missing.
+
+    :param keys: dictionary of cache key: argument passed to ``compute``
+    :param compute: callable returning the list of values of the given list of arguments
+    :param timeout: timeout of fresh values (forever if ``None``), or a callable returning it (only called when values
+                    are computed)
+    :param version: current version of the values (e.g.: :py:func:`djangocms_blog.managers.get_published_version`),
+                    values stored with a different version are stale
+    :return: dictionary of cache key: value
+    """
+    entries = _get_entries(keys.keys())
+    values = {}
+    locked = []
+    waiting = []
+    for key in keys:
+        entry = entries.get(key)
+        if entry is not None and is_fresh(entry, version):
+            values[key] = entry["value"]
+        elif cache.add(LOCK_CACHE_KEY.format(key), True, timeout=get_setting("CACHE_LOCK_TIMEOUT")):
+            locked.append(key)
+        elif entry is not None:
+            values[key] = entry["value"]
+        else:
+            waiting.append(key)
+    if waiting:
+        deadline = time.monotonic() + get_setting("CACHE_LOCK_TIMEOUT")
+        while waiting and time.monotonic() < deadline:
+            time.sleep(0.05)
+            for key, entry in _get_entries(waiting).items():
+                values[key] = entry["value"]
+                waiting.remove(key)
+    missing = locked + waiting
+    if missing:
+        try:
+            start = time.monotonic()
+            computed = dict(zip(missing, compute([keys[key] for key in missing])))
+            delta = (time.monotonic() - start) / len(missing)
+            if callable(timeout):
+                timeout = timeout()
+            cache.set_many(
+                {key: _pack(value, timeout, delta, version) for key, value in computed.items()},
+                timeout=_physical_timeout(timeout),
+            )
+            values.update(computed)
+        finally:
+            cache.delete_many([LOCK_CACHE_KEY.format(key) for key in locked])
+    return {key: values[key] for key in keys}
+
+
+def get_or_set(key, compute, timeout, version=None):
+    """
+    Return the value stored under ``key``, computing it with ``compute()`` if missing or stale.
+
+    See :py:func:`get_many_or_set`.
+    """
+    return get_many_or_set({key: None}, lambda args: [compute()], timeout, version)[key]
@@ -100,6 +100,26 @@ class BlogConfigForm(AppDataForm):
         initial=get_setting("PAGINATION"),
         help_text=_("When paginating list views, how many articles per page?"),
     )
+    #: Use cursor based pagination in list views (default: :ref:`KEYSET_PAGINATION <KEYSET_PAGINATION>`)
+    keyset_pagination = forms.BooleanField(
+        label=_("Use keyset pagination"),
+        required=False,
+        initial=get_setting("KEYSET_PAGINATION"),
+        help_text=_(
+            "Paginate list views with previous / next links based on the publishing date: "
+            "faster on large blogs, but pages are not numbered."
+        ),
+    )
+    #: Cache the post detail responses to anonymous users (default: :ref:`DETAIL_CACHE <DETAIL_CACHE>`)
+    detail_cache = forms.BooleanField(
+        label=_("Cache post detail pages"),
+        required=False,
+        initial=get_setting("DETAIL_CACHE"),
+        help_text=_(
+            "Cache the post pages served to anonymous users until the post, its related posts, categories, tags "
+            "or content change."
+        ),
+    )
     #: Alternative directory to load the blog templates from (default: "")
     template_prefix = forms.CharField(
         label=_("Template prefix"),
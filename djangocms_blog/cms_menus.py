@@ -2,15 +2,17 @@ import logging
 
 from cms.apphook_pool import apphook_pool
 from cms.menu_bases import CMSAttachMenu
+from cms.models import Page
 from django.contrib.sites.shortcuts import get_current_site
-from django.db.models.signals import post_delete, post_save
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
 from django.urls import resolve
 from django.utils.translation import get_language_from_request, gettext_lazy as _
 from menus.base import Modifier, NavigationNode
 from menus.menu_pool import menu_pool
 
 from .cms_appconfig import BlogConfig
-from .models import BlogCategory, Post
+from .models import BlogCategory, Post, PostUrlResolver
 from .settings import MENU_TYPE_CATEGORIES, MENU_TYPE_COMPLETE, MENU_TYPE_NONE, MENU_TYPE_POSTS, get_setting
 
 logger = logging.getLogger(__name__)
@@ -36,6 +38,7 @@ class BlogCategoryMenu(CMSAttachMenu):
         nodes = []
 
         language = get_language_from_request(request, check_path=True)
+        resolver = PostUrlResolver(language)
         current_site = get_current_site(request)
 
         page_site = self.instance.node.site
@@ -68,30 +71,31 @@ class BlogCategoryMenu(CMSAttachMenu):
         if config and config.menu_structure in (MENU_TYPE_NONE,):
             return nodes
 
-        used_categories = []
+        used_categories = set()
         if posts_menu:
             posts = Post.objects
             if hasattr(self, "instance") and self.instance:
                 posts = posts.namespace(self.instance.application_namespace).on_site()
-            posts = (
-                posts.active_translations(language)
-                .distinct()
-                .select_related("app_config")
-                .prefetch_related("translations", "categories")
-            )
+            posts = posts.active_translations(language).distinct()
+            # categories of the posts in a single query, the first one is the post parent and is used in the URL
+            post_categories = {}
+            for post_id, categories in resolver.get_categories(posts.values("pk")).items():
+                post_categories[post_id] = categories[0]
+                used_categories.update(categories)
+            posts = list(posts.select_related("app_config").prefetch_related("translations"))
+            urls = resolver.get_urls(posts, post_categories)
             for post in posts:
                 post_id = None
                 parent = None
-                used_categories.extend(post.categories.values_list("pk", flat=True))
+                category_id = post_categories.get(post.pk)
                 if categories_menu:
-                    category = post.categories.first()
-                    if category:
-                        parent = "{}-{}".format(category.__class__.__name__, category.pk)
+                    if category_id:
+                        parent = "{}-{}".format(BlogCategory.__name__, category_id)
                         post_id = ("{}-{}".format(post.__class__.__name__, post.pk),)
                 else:
                     post_id = ("{}-{}".format(post.__class__.__name__, post.pk),)
-                if post_id:
-                    node = NavigationNode(post.get_title(), post.get_absolute_url(language), post_id, parent)
+                if post_id and post.pk in urls:
+                    node = NavigationNode(post.get_title(), urls[post.pk], post_id, parent)
                     nodes.append(node)
 
         if categories_menu:
@@ -107,17 +111,21 @@ class BlogCategoryMenu(CMSAttachMenu):
                 .select_related("app_config")
                 .prefetch_related("translations")
             )
-            added_categories = []
+            added_categories = set()
             for category in categories:
                 if category.pk not in added_categories:
                     node = NavigationNode(
                         category.name,
-                        category.get_absolute_url(),
+                        resolver.get_category_url(category),
                         "{}-{}".format(category.__class__.__name__, category.pk),
-                        ("{}-{}".format(category.__class__.__name__, category.parent.id) if category.parent else None),
+                        (
+                            "{}-{}".format(category.__class__.__name__, category.parent_id)
+                            if category.parent_id
+                            else None
+                        ),
                     )
                     nodes.append(node)
-                    added_categories.append(category.pk)
+                    added_categories.add(category.pk)
 
         return nodes
 
@@ -177,13 +185,126 @@ menu_pool.register_modifier(BlogNavModifier)
 menu_pool.register_menu(BlogCategoryMenu)
 
 
+def get_namespace_sites(namespace):
+    """
+    Return the ids of the sites where the given blog namespace is attached to a page.
+    """
+    return set(Page.objects.filter(application_namespace=namespace).values_list("node__site_id", flat=True))
+
+
+def clear_blog_menu_cache(namespace, sites=None, languages=None):
+    """
+    Clear the menu cache of the sites and languages where the given blog namespace can be displayed.
+
+    :param namespace: blog namespace
+    :param sites: ids of the sites the changed objects are visible on (all the namespace sites if empty)
+    :param languages: languages of the changed objects (all languages if empty)
+    """
+    site_ids = get_namespace_sites(namespace)
+    if sites:
+        site_ids = site_ids.intersection(sites)
+    for site_id in site_ids:
+        for language in languages or [None]:
+            menu_pool.clear(site_id=site_id, language=language)
+
+
 def clear_menu_cache(**kwargs):
     """
-    Empty menu cache when saving categories
+    Empty the whole menu cache
     """
     menu_pool.clear(all=True)
 
 
-post_save.connect(clear_menu_cache, sender=BlogCategory)
-post_delete.connect(clear_menu_cache, sender=BlogCategory)
+def _get_post_sites(post):
+    return None if post.all_sites else set(post.sites.values_list("pk", flat=True))
+
+
+def _clear_post_menu_cache(post, languages=None):
+    if post.app_config_id:
+        clear_blog_menu_cache(post.app_config.namespace, _get_post_sites(post), languages)
+
+
+@receiver(post_save, sender=Post)
+def post_menu_post_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # previous state is stored by djangocms_blog.models.post_previous_state
+    previous = getattr(instance, "_previous_state", None)
+    if previous and previous.app_config_id and previous.app_config_id != instance.app_config_id:
+        clear_blog_menu_cache(previous.app_config.namespace)
+    _clear_post_menu_cache(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_menu_post_delete(sender, instance, **kwargs):
+    # sites and translations are already deleted
+    if instance.app_config_id:
+        clear_blog_menu_cache(instance.app_config.namespace)
+
+
+@receiver(post_save, sender=Post._parler_meta.root_model)
+@receiver(post_delete, sender=Post._parler_meta.root_model)
+def post_translation_menu_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    try:
+        post = instance.master
+    except Post.DoesNotExist:
+        # post is being deleted
+        return
+    _clear_post_menu_cache(post, [instance.language_code])
+
+
+@receiver(m2m_changed, sender=Post.categories.through)
+def post_categories_menu_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        _clear_post_menu_cache(instance)
+    elif instance.app_config_id:
+        clear_blog_menu_cache(instance.app_config.namespace)
+
+
+@receiver(m2m_changed, sender=Post.sites.through)
+def post_sites_menu_change(sender, instance, action, reverse, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        # post is removed from some sites: clear all the sites of the namespace
+        if instance.app_config_id:
+            clear_blog_menu_cache(instance.app_config.namespace)
+    else:
+        menu_pool.clear(site_id=instance.pk)
+
+
+@receiver(post_save, sender=BlogCategory)
+@receiver(post_delete, sender=BlogCategory)
+def category_menu_change(sender, instance, raw=False, **kwargs):
+    if not raw and instance.app_config_id:
+        clear_blog_menu_cache(instance.app_config.namespace)
+
+
+@receiver(post_save, sender=BlogCategory._parler_meta.root_model)
+@receiver(post_delete, sender=BlogCategory._parler_meta.root_model)
+def category_translation_menu_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    try:
+        category = instance.master
+    except BlogCategory.DoesNotExist:
+        # category is being deleted
+        return
+    if category.app_config_id:
+        clear_blog_menu_cache(category.app_config.namespace, languages=[instance.language_code])
+
+
+@receiver(post_save, sender=BlogConfig)
+def config_menu_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    BlogCategoryMenu._config.pop(instance.namespace, None)
+    BlogNavModifier._config.pop(instance.namespace, None)
+    clear_blog_menu_cache(instance.namespace)
+
+
 post_delete.connect(clear_menu_cache, sender=BlogConfig)
@@ -3,8 +3,8 @@ import os.path
 from cms.plugin_base import CMSPluginBase
 from cms.plugin_pool import plugin_pool
 from django.contrib.sites.shortcuts import get_current_site
-from django.db import models
 from django.template.loader import select_template
+from django.utils.translation import get_language
 
 from .forms import AuthorPostsForm, BlogPluginForm, LatestEntriesForm
 from .models import AuthorEntriesPlugin, BlogCategory, FeaturedPostsPlugin, GenericBlogPlugin, LatestPostsPlugin, Post
@@ -32,6 +32,26 @@ class BlogPlugin(CMSPluginBase):
         return selected.template.name
 
 
+class PublicationCacheMixin:
+    """
+    Expire the cached plugin content when one of the posts it can display is published or unpublished.
+    """
+
+    cache = True
+
+    def get_cache_expiration(self, request, instance, placeholder):
+        """
+        Cache the content until the next publication window boundary of the plugin posts (if any).
+        """
+        return instance.get_next_publication_change(request)
+
+    def get_vary_cache_on(self, request, instance, placeholder):
+        """
+        Content only depends on the current language and site, which are already part of the cache key.
+        """
+        return None
+
+
 @plugin_pool.register_plugin
 class BlogLatestEntriesPlugin(BlogPlugin):
     """
@@ -66,13 +86,12 @@ class BlogLatestEntriesPlugin(BlogPlugin):
 
 
 @plugin_pool.register_plugin
-class BlogLatestEntriesPluginCached(BlogLatestEntriesPlugin):
+class BlogLatestEntriesPluginCached(PublicationCacheMixin, BlogLatestEntriesPlugin):
     """
     Return the latest published posts caching the result.
     """
 
     name = get_setting("LATEST_ENTRIES_PLUGIN_NAME_CACHED")
-    cache = True
 
 
 @plugin_pool.register_plugin
@@ -108,13 +127,12 @@ class BlogFeaturedPostsPlugin(BlogPlugin):
 
 
 @plugin_pool.register_plugin
-class BlogFeaturedPostsPluginCached(BlogFeaturedPostsPlugin):
+class BlogFeaturedPostsPluginCached(PublicationCacheMixin, BlogFeaturedPostsPlugin):
     """
     Return the selected posts caching the result.
     """
 
     name = get_setting("FEATURED_POSTS_PLUGIN_NAME_CACHED")
-    cache = True
 
 
 @plugin_pool.register_plugin
@@ -188,8 +206,9 @@ class BlogTagsPlugin(BlogPlugin):
     def render(self, context, instance, placeholder):
         """Render the plugin."""
         context = super().render(context, instance, placeholder)
-        qs = instance.post_queryset(context["request"])
-        context["tags"] = Post.objects.tag_cloud(queryset=qs.published())
+        # publication and site filters are applied once, by tag_cloud_values
+        qs = instance.candidate_queryset(context["request"])
+        context["tags"] = Post.objects.tag_cloud_values(queryset=qs, current_site=False)
         return context
 
 
@@ -214,11 +233,11 @@ class BlogCategoryPlugin(BlogPlugin):
             qs = qs.namespace(instance.app_config.namespace)
         if instance.current_site:
             site = get_current_site(context["request"])
-            qs = qs.filter(models.Q(blog_posts__sites__isnull=True) | models.Q(blog_posts__sites=site.pk))
+            qs = qs.filter(blog_posts__in=Post.objects.on_site(site))
         categories = qs.distinct()
         if instance.app_config and not instance.app_config.menu_empty_categories:
             categories = qs.filter(blog_posts__isnull=False).distinct()
-        context["categories"] = categories
+        context["categories"] = categories.with_counts(get_current_site(context["request"]))
         return context
 
 
@@ -238,6 +257,13 @@ class BlogArchivePlugin(BlogPlugin):
     def render(self, context, instance, placeholder):
         """Render the plugin."""
         context = super().render(context, instance, placeholder)
-        qs = instance.post_queryset(context["request"])
-        context["dates"] = Post.objects.get_months(queryset=qs.published())
+        if instance.current_site:
+            context["dates"] = Post.objects.get_published_months(
+                namespace=instance.app_config.namespace if instance.app_config else None,
+                language=get_language(),
+                site=get_current_site(context["request"]),
+            )
+        else:
+            qs = instance.post_queryset(context["request"])
+            context["dates"] = Post.objects.get_months(queryset=qs.published())
         return context
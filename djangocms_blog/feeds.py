@@ -1,23 +1,85 @@
+import atexit
+import logging
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
 from html import unescape
-from io import BytesIO
 
 from aldryn_apphooks_config.utils import get_app_instance
 from django.contrib.sites.models import Site
+from django.contrib.sites.shortcuts import get_current_site
 from django.contrib.syndication.views import Feed
-from django.core.cache import cache
-from django.urls import reverse
+from django.db import connection
+from django.http import HttpResponse
+from django.urls import NoReverseMatch, reverse
+from django.utils.cache import get_conditional_response
 from django.utils.encoding import force_str
 from django.utils.feedgenerator import Rss201rev2Feed
 from django.utils.html import strip_tags
+from django.utils.http import parse_http_date_safe
 from django.utils.safestring import mark_safe
 from django.utils.text import normalize_newlines
-from django.utils.translation import get_language_from_request, gettext as _
+from django.utils.timezone import now
+from django.utils.translation import get_language_from_request, gettext as _, override
 from lxml import etree
+from parler.utils.context import switch_language
 
 from djangocms_blog.settings import get_setting
 from djangocms_blog.views import PostDetailView
 
+from . import caching
+from .managers import get_feed_version, get_published_version
 from .models import Post
+from .pregenerate import run_in_request
+
+logger = logging.getLogger(__name__)
+
+
+DOCTYPE = re.compile(rb"^\s*<!doctype[^>]*>", re.IGNORECASE)
+
+
+def _clean_instant_article_tree(root):
+    empty, headings = [], []
+    for element in root.iter("p", "h3", "h4", "h5", "h6"):
+        if element.tag == "p":
+            if len(element) == 0 and not (element.text and element.text.strip()):
+                empty.append(element)
+        elif "op-kicker" not in element.get("class", ""):
+            headings.append(element)
+    for element in headings:
+        element.tag = "h2"
+    for element in empty:
+        element.getparent().remove(element)
+
+
+def clean_instant_article(content):
+    """
+    Clean the rendered instant article page according to the Instant Articles markup rules:
+
+    * empty paragraphs are removed;
+    * ``h3`` to ``h6`` headings (but the ``op-kicker`` one) are converted to ``h2``.
+
+    Only the ``<article>`` element is parsed and cleaned, in a single pass which collects the elements to change: the
+    rest of the page is returned as is. Pages without ``<article>`` element, or with more than one (e.g.: sibling or
+    nested articles), are parsed and cleaned as a whole.
+
+    :param content: rendered page (bytes)
+    :return: cleaned page, without doctype (bytes)
+    """
+    start = content.find(b"<article")
+    end = content.rfind(b"</article>")
+    if start < 0 or end < start or content.find(b"<article", start + 1) >= 0:
+        root = etree.fromstring(content, etree.HTMLParser())
+        _clean_instant_article_tree(root)
+        return etree.tostring(root)
+    end += len(b"</article>")
+    article = etree.fromstring(content[start:end], etree.HTMLParser(encoding="utf-8")).find("body/article")
+    _clean_instant_article_tree(article)
+    return b"".join(
+        (DOCTYPE.sub(b"", content[:start], count=1).lstrip(), etree.tostring(article, with_tail=False), content[end:])
+    )
 
 
 class LatestEntriesFeed(Feed):
@@ -27,7 +89,64 @@ class LatestEntriesFeed(Feed):
     def __call__(self, request, *args, **kwargs):
         self.request = request
         self.namespace, self.config = get_app_instance(request)
-        return super().__call__(request, *args, **kwargs)
+        if get_setting("FEED_CACHE_TIMEOUT"):
+            cached = caching.get_or_set(
+                self.get_cache_key(request, *args, **kwargs),
+                partial(self.render_feed, request, *args, **kwargs),
+                timeout=self.get_cache_timeout,
+                version=self.get_cache_version(request),
+            )
+        else:
+            cached = self.render_feed(request, *args, **kwargs)
+        response = HttpResponse(cached["content"], content_type=cached["content_type"])
+        if cached["last_modified"]:
+            response["Last-Modified"] = cached["last_modified"]
+        last_modified = parse_http_date_safe(cached["last_modified"] or "")
+        return get_conditional_response(request, last_modified=last_modified, response=response)
+
+    def render_feed(self, request, *args, **kwargs):
+        """
+        Render the feed, as stored in the cache.
+        """
+        response = super().__call__(request, *args, **kwargs)
+        return {
+            "content": response.content,
+            "content_type": response["Content-Type"],
+            "last_modified": response.get("Last-Modified"),
+        }
+
+    def get_cache_key(self, request, *args, **kwargs):
+        """
+        Cache key of the whole feed response (see :py:meth:`get_cache_version`).
+        """
+        return "djangocms-blog:feed:{}:{}:{}:{}:{}:{}".format(
+            self.__class__.__name__,
+            self.namespace,
+            get_language_from_request(request, check_path=True),
+            get_current_site(request).pk,
+            request.scheme,
+            ":".join(force_str(value) for value in list(args) + list(kwargs.values())),
+        )
+
+    def get_cache_version(self, request):
+        """
+        Version of the cached feed response.
+
+        Feeds are versioned per app config and language, so that they are recomputed when the posts of the app config,
+        their translations, tags or categories change (see :py:mod:`djangocms_blog.caching`).
+        """
+        return get_feed_version(self.config and self.config.pk, get_language_from_request(request, check_path=True))
+
+    def get_cache_timeout(self):
+        """
+        Cache timeout of the whole feed response: ``BLOG_FEED_CACHE_TIMEOUT``, shortened to expire when the next post
+        is published or unpublished.
+        """
+        timeout = get_setting("FEED_CACHE_TIMEOUT")
+        next_change = Post.objects.next_publication_change()
+        if timeout and next_change:
+            timeout = min(timeout, max(int((next_change - now()).total_seconds()) + 1, 1))
+        return timeout
 
     def link(self):
         return reverse("%s:posts-latest" % self.namespace, current_app=self.namespace)
@@ -75,6 +194,13 @@ class TagFeed(LatestEntriesFeed):
     def get_object(self, request, tag):
         return tag  # pragma: no cover
 
+    def get_cache_version(self, request):
+        """
+        Version of the cached feed response: tagged posts are not filtered by app config, the published posts version
+        is used.
+        """
+        return get_published_version()
+
     def items(self, obj=None):
         return Post.objects.published().filter(tags__slug=obj)[: self.feed_items_number]
 
@@ -129,27 +255,70 @@ class FBInstantArticles(LatestEntriesFeed):
         return Post.objects.namespace(self.namespace).published().order_by("-date_modified")[: self.feed_items_number]
 
     def _clean_html(self, content):
-        body = BytesIO(content)
-        document = etree.iterparse(body, html=True)
-        for _a, element in document:
-            if not (element.text and element.text.strip()) and len(element) == 0 and element.tag == "p":
-                element.getparent().remove(element)
-            if element.tag in ("h3", "h4", "h5", "h6") and "op-kicker" not in element.attrib.get("class", ""):
-                element.tag = "h2"
-        return etree.tostring(document.root)
+        return clean_instant_article(content)
+
+    def render_content(self, request, item):
+        """
+        Render the instant article HTML of the given post.
+        """
+        view = PostDetailView.as_view(instant_article=True)
+        response = view(request, slug=item.safe_translation_getter("slug"))
+        response.render()
+        return self._clean_html(response.content)
+
+    def _render_content(self, request, language, item):
+        try:
+            with override(language), switch_language(item, language):
+                return run_in_request(
+                    request.path,
+                    get_current_site(request),
+                    lambda worker_request: self.render_content(worker_request, item),
+                    request.scheme,
+                )
+        finally:
+            # each thread opens its own connection
+            connection.close()
+
+    def render_contents(self, request, items):
+        """
+        Render the instant article HTML of the given posts by up to ``BLOG_FEED_INSTANT_RENDER_WORKERS`` threads.
+
+        Each thread renders the posts in its own anonymous request, processed by the middlewares (e.g.: with its own
+        toolbar and session), as the request objects can't be shared between threads.
+        """
+        workers = min(get_setting("FEED_INSTANT_RENDER_WORKERS"), len(items))
+        if workers > 1:
+            language = get_language_from_request(request, check_path=True)
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="djangocms-blog-feed") as executor:
+                return list(executor.map(partial(self._render_content, request, language), items))
+        return [self.render_content(request, item) for item in items]
+
+    def get_contents(self, request, items):
+        """
+        Return the instant article HTML of the given posts as a ``{post pk: content}`` dictionary.
+
+        Content missing from the cache (or stale) is rendered in parallel by :py:meth:`render_contents`, and stored
+        in the cache.
+        """
+        language = get_language_from_request(request, check_path=True)
+        keys = {item.get_cache_key(language, "feed"): item for item in items}
+        contents = caching.get_many_or_set(
+            keys, partial(self.render_contents, request), timeout=get_setting("FEED_CACHE_TIMEOUT")
+        )
+        return {item.pk: contents[key] for key, item in keys.items()}
+
+    def get_feed(self, obj, request):
+        # content is usually pre-rendered in the background when the post is saved, the rest is rendered in parallel
+        # before the feed is generated
+        self.contents = self.get_contents(request, self._get_dynamic_attr("items", obj))
+        return super().get_feed(obj, request)
 
     def item_extra_kwargs(self, item):
         if not item:
             return {}
-        language = get_language_from_request(self.request, check_path=True)
-        key = item.get_cache_key(language, "feed")
-        content = cache.get(key)
+        content = getattr(self, "contents", {}).get(item.pk)
         if not content:
-            view = PostDetailView.as_view(instant_article=True)
-            response = view(self.request, slug=item.safe_translation_getter("slug"))
-            response.render()
-            content = self._clean_html(response.content)
-            cache.set(key, content, timeout=get_setting("FEED_CACHE_TIMEOUT"))
+            content = self.get_contents(self.request, [item])[item.pk]
         if item.app_config.use_abstract:
             abstract = strip_tags(item.safe_translation_getter("abstract"))
         else:
@@ -177,3 +346,79 @@ class FBInstantArticles(LatestEntriesFeed):
 
     def item_pubdate(self, item):
         return None
+
+
+def prerender_instant_article(post_id, language):
+    """
+    Render and store the instant article content of the given post and language, as read by
+    :py:class:`FBInstantArticles`.
+
+    Posts not yet published are skipped, as the content is rendered by the post detail view.
+
+    :return: rendered content or ``None`` if the post can't be rendered
+    """
+    post = Post.objects.select_related("app_config").filter(pk=post_id).first()
+    if not post or not post.app_config_id or language not in post.get_available_languages():
+        return
+    try:
+        with override(language):
+            path = reverse("%s:posts-latest-feed-fb" % post.app_config.namespace)
+    except NoReverseMatch:
+        return
+    with switch_language(post, language):
+        content = run_in_request(
+            path, Site.objects.get_current(), lambda request: FBInstantArticles().render_content(request, post)
+        )
+    if content:
+        caching.store(post.get_cache_key(language, "feed"), content, timeout=None)
+    return content
+
+
+def _prerender_instant_article(post_id, language):
+    try:
+        prerender_instant_article(post_id, language)
+    except Exception as e:  # pragma: no cover
+        logger.exception(e)
+    finally:
+        # each thread opens its own connection
+        connection.close()
+
+
+@lru_cache(maxsize=None)
+def get_prerender_executor():
+    """
+    Return the thread pool pre-rendering the instant articles.
+
+    The pool is shut down at exit, and created again in forked processes (e.g.: preforking servers), as its threads
+    are not copied in the child process.
+    """
+    return ThreadPoolExecutor(
+        max_workers=get_setting("FEED_INSTANT_PRERENDER_WORKERS"), thread_name_prefix="djangocms-blog-instant"
+    )
+
+
+def shutdown_prerender_executor():
+    """
+    Shut down the thread pool pre-rendering the instant articles, if any, cancelling the pending renders.
+    """
+    if get_prerender_executor.cache_info().currsize:
+        executor = get_prerender_executor()
+        get_prerender_executor.cache_clear()
+        # pending renders can be cancelled since python 3.9
+        executor.shutdown(**({"cancel_futures": True} if sys.version_info >= (3, 9) else {}))
+
+
+atexit.register(shutdown_prerender_executor)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=get_prerender_executor.cache_clear)
+
+
+def schedule_instant_articles(post_ids):
+    """
+    Pre-render the instant article content of the given posts in all their languages in the background thread pool.
+    """
+    if not get_setting("FEED_INSTANT_PRERENDER_WORKERS"):
+        return
+    translations = Post._parler_meta.root_model.objects.filter(master__in=post_ids)
+    for post_id, language in translations.values_list("master_id", "language_code"):
+        get_prerender_executor().submit(_prerender_instant_article, post_id, language)
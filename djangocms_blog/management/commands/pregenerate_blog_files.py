@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from djangocms_blog.pregenerate import pregenerate
+
+
+class Command(BaseCommand):
+    help = "Render the blog sitemaps and feeds of the current site to static files"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--namespace", action="append", dest="namespaces", help="Only render the given apphook namespace"
+        )
+        parser.add_argument("--language", action="append", dest="languages", help="Only render the given language")
+        parser.add_argument(
+            "--changed", action="store_true", help="Only render the files outdated by posts or apphook changes"
+        )
+        parser.add_argument("--workers", type=int, default=1, help="Number of worker processes")
+        parser.add_argument("--protocol", default="https", help="Protocol of the URLs")
+
+    def handle(self, *args, **options):
+        written = pregenerate(
+            namespaces=options["namespaces"],
+            languages=options["languages"],
+            changed=options["changed"],
+            workers=options["workers"],
+            protocol=options["protocol"],
+        )
+        self.stdout.write("Pre-generated files: %s" % len(written))
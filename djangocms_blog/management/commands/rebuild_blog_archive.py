@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from djangocms_blog.models import ArchiveMonth
+
+
+class Command(BaseCommand):
+    help = "Rebuild the archive months counters"
+
+    def handle(self, *args, **options):
+        ArchiveMonth.objects.rebuild()
+        self.stdout.write("Archive months counters rebuilt: %s" % ArchiveMonth.objects.count())
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from djangocms_blog.models import Post, update_post_permalinks
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored permalinks of the blog posts"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--namespace", help="Only update the posts in the given apphook namespace")
+
+    def handle(self, *args, **options):
+        posts = Post.objects.all()
+        if options["namespace"]:
+            posts = posts.namespace(options["namespace"])
+        count = update_post_permalinks(posts)
+        self.stdout.write("Posts permalinks rebuilt: %s" % count)
@@ -1,10 +1,140 @@
+import logging
+import threading
 from collections import Counter
+from datetime import datetime, timedelta, timezone as dt_timezone
+from uuid import uuid4
 
 from aldryn_apphooks_config.managers.parler import AppHookConfigTranslatableManager, AppHookConfigTranslatableQueryset
+from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.sites.models import Site
-from django.db import models
-from django.utils.timezone import now
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models.functions import Coalesce, TruncMonth
+from django.utils.timezone import get_default_timezone, localtime, make_aware, now
+from django.utils.translation import get_language
+
+from . import caching
+from .settings import get_setting
+
+PUBLISHED_VERSION_CACHE_KEY = "djangocms-blog:published-version"
+PUBLISHED_CHANGED_CACHE_KEY = "djangocms-blog:published-changed"
+POST_VERSION_CACHE_KEY = "djangocms-blog:post-version:{}"
+FEED_VERSION_CACHE_KEY = "djangocms-blog:feed-version:{}:{}"
+
+logger = logging.getLogger(__name__)
+
+_pending_archive_months = threading.local()
+
+
+def get_reference_time():
+    """
+    Return the reference time used to filter posts according to their publication dates.
+
+    If :ref:`PUBLICATION_TIME_BUCKET <PUBLICATION_TIME_BUCKET>` is set, current time is truncated to the bucket size
+    so that queries are identical (and cacheable) within the same bucket.
+    """
+    current = now()
+    bucket = get_setting("PUBLICATION_TIME_BUCKET")
+    if not bucket:
+        return current
+    return datetime.fromtimestamp(int(current.timestamp()) // bucket * bucket, tz=dt_timezone.utc)
+
+
+def get_published_version():
+    """
+    Return the version of the published posts, to be used in the cache keys of published posts data.
+    """
+    version = cache.get(PUBLISHED_VERSION_CACHE_KEY)
+    if version is None:
+        version = 1
+        cache.add(PUBLISHED_VERSION_CACHE_KEY, version, timeout=None)
+    return version
+
+
+def bump_published_version():
+    """
+    Invalidate the published posts data cached using :py:func:`get_published_version`.
+    """
+    try:
+        cache.incr(PUBLISHED_VERSION_CACHE_KEY)
+    except ValueError:
+        cache.set(PUBLISHED_VERSION_CACHE_KEY, 1, timeout=None)
+    cache.set(PUBLISHED_CHANGED_CACHE_KEY, int(now().timestamp()), timeout=None)
+
+
+def get_published_changed():
+    """
+    Return the timestamp of the latest :py:func:`bump_published_version` call.
+
+    Deleted, unpublished or moved posts are not visible in the posts dates, the timestamp is used to move the
+    ``Last-Modified`` date of the lists when they change. If it's missing from the cache, current time is used.
+    """
+    changed = cache.get(PUBLISHED_CHANGED_CACHE_KEY)
+    if changed is None:
+        changed = int(now().timestamp())
+        if not cache.add(PUBLISHED_CHANGED_CACHE_KEY, changed, timeout=None):
+            changed = cache.get(PUBLISHED_CHANGED_CACHE_KEY, changed)
+    return changed
+
+
+def get_bucket_version():
+    """
+    Return the version of the data cached for the current publication time bucket (see
+    :ref:`PUBLICATION_TIME_BUCKET <PUBLICATION_TIME_BUCKET>`): it changes with the bucket and with the published posts.
+    """
+    return get_published_version(), int(get_reference_time().timestamp())
+
+
+def get_post_version(post_id):
+    """
+    Return the version of the given post, to be used in the cache keys of the post data (e.g.: detail page).
+    """
+    key = POST_VERSION_CACHE_KEY.format(post_id)
+    version = cache.get(key)
+    if version is None:
+        version = uuid4().hex
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_post_versions(post_ids):
+    """
+    Invalidate the data of the given posts cached using :py:func:`get_post_version`.
+    """
+    cache.delete_many([POST_VERSION_CACHE_KEY.format(post_id) for post_id in post_ids])
+
+
+def get_feed_version(app_config_id, language):
+    """
+    Return the version of the feeds of the given app config and language, to be used in the feeds cache keys.
+    """
+    key = FEED_VERSION_CACHE_KEY.format(app_config_id, language)
+    version = cache.get(key)
+    if version is None:
+        version = uuid4().hex
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_feed_versions(app_config_ids, languages=None):
+    """
+    Invalidate the feeds of the given app configs cached using :py:func:`get_feed_version`.
+
+    :param app_config_ids: ids of the app configs
+    :param languages: languages of the feeds to invalidate (default: all the languages)
+    """
+    if languages is None:
+        languages = [language for language, __ in settings.LANGUAGES]
+    cache.delete_many(
+        [
+            FEED_VERSION_CACHE_KEY.format(app_config_id, language)
+            for app_config_id in app_config_ids
+            for language in languages
+        ]
+    )
 
 
 class TaggedFilterItem:
@@ -25,10 +155,12 @@ class TaggedFilterItem:
 
         filters = None
         if queryset is not None:
-            filters = set()
-            for item in queryset.all():
-                filters.update(item.tags.all())
-            filters = {tag.id for tag in filters}
+            filters = set(
+                TaggedItem.objects.filter(
+                    content_type=ContentType.objects.get_for_model(queryset.model),
+                    object_id__in=queryset.values("pk"),
+                ).values_list("tag_id", flat=True)
+            )
         elif other_model is not None:
             filters = set(
                 TaggedItem.objects.filter(content_type__model=other_model.__name__.lower()).values_list(
@@ -79,6 +211,42 @@ class TaggedFilterItem:
             tag.count = counted_tags[tag.pk]
         return sorted(tags, key=lambda x: -x.count)
 
+    def tag_cloud_values(self, queryset=None, published=True, current_site=True, namespace=None, language=None):
+        """
+        Returns the tags attached to the posts in the queryset with the number of posts for each tag.
+
+        Tags and counts are computed in a single aggregate query and returned as lightweight dictionaries
+        with ``tag_id``, ``name``, ``slug`` and ``count`` keys, ordered by descending count.
+
+        :param queryset: posts queryset to compute the tags from (defaults to all the posts)
+        :param published: count only published posts
+        :param current_site: count only posts visible on the current site
+        :param namespace: restrict the posts to the given apphook namespace
+        :param language: restrict the posts to the ones translated in the given language
+        :return: list of dictionaries
+        """
+        from taggit.models import TaggedItem
+
+        if queryset is None:
+            queryset = self.get_queryset()
+        if namespace:
+            queryset = queryset.namespace(namespace)
+        if language:
+            queryset = queryset.active_translations(language_code=language)
+        if published:
+            queryset = queryset.published(current_site)
+        elif current_site:
+            queryset = queryset.on_site()
+        return list(
+            TaggedItem.objects.filter(
+                content_type=ContentType.objects.get_for_model(self.model),
+                object_id__in=queryset.values("pk"),
+            )
+            .values("tag_id", name=models.F("tag__name"), slug=models.F("tag__slug"))
+            .annotate(count=models.Count("object_id", distinct=True))
+            .order_by("-count", "name")
+        )
+
 
 class GenericDateQuerySet(AppHookConfigTranslatableQueryset):
     start_date_field = "date_published"
@@ -86,15 +254,28 @@ class GenericDateQuerySet(AppHookConfigTranslatableQueryset):
     end_date_field = "date_published_end"
     publish_field = "publish"
 
+    sites_field = "sites"
+    all_sites_field = "all_sites"
+
     def on_site(self, site=None):
+        """
+        Filter items visible on the given site (current site if empty).
+
+        Items are visible if not bound to any site (according to the ``all_sites_field`` flag) or if bound to the
+        given site: the latter is checked with a subquery to avoid the join on the sites table.
+        """
         if not site:
             site = Site.objects.get_current()
-        return self.filter(models.Q(sites__isnull=True) | models.Q(sites=site.pk))
+        sites_field = self.model._meta.get_field(self.sites_field)
+        through = sites_field.remote_field.through.objects.filter(
+            **{sites_field.m2m_field_name(): models.OuterRef("pk"), sites_field.m2m_reverse_field_name(): site.pk}
+        )
+        return self.filter(models.Exists(through) | models.Q(**{self.all_sites_field: True}))
 
     def published(self, current_site=True):
         queryset = self.published_future(current_site)
         if self.start_date_field:
-            return queryset.filter(**{"%s__lte" % self.start_date_field: now()})
+            return queryset.filter(**{"%s__lte" % self.start_date_field: get_reference_time()})
         else:
             return queryset
 
@@ -108,7 +289,7 @@ class GenericDateQuerySet(AppHookConfigTranslatableQueryset):
         else:
             queryset = self
         if self.end_date_field:
-            qfilter = models.Q(**{"%s__gte" % self.end_date_field: now()}) | models.Q(
+            qfilter = models.Q(**{"%s__gte" % self.end_date_field: get_reference_time()}) | models.Q(
                 **{"%s__isnull" % self.end_date_field: True}
             )
             queryset = queryset.filter(qfilter)
@@ -120,10 +301,47 @@ class GenericDateQuerySet(AppHookConfigTranslatableQueryset):
         else:
             queryset = self
         if self.end_date_field:
-            qfilter = models.Q(**{"%s__lte" % self.end_date_field: now()})
+            qfilter = models.Q(**{"%s__lte" % self.end_date_field: get_reference_time()})
             queryset = queryset.filter(qfilter)
         return queryset.filter(**{self.publish_field: True})
 
+    def next_publication_change(self):
+        """
+        Return the first date after the current reference time when any of the items enters or leaves the
+        publication window, or ``None`` if no change is scheduled.
+
+        If :ref:`PUBLICATION_TIME_BUCKET <PUBLICATION_TIME_BUCKET>` is set, the date is moved to the start of the
+        time bucket in which the change becomes visible.
+        """
+        current = get_reference_time()
+        aggregates = {}
+        if self.start_date_field:
+            aggregates["start"] = models.Min(
+                self.start_date_field, filter=models.Q(**{"%s__gt" % self.start_date_field: current})
+            )
+        if self.end_date_field:
+            aggregates["end"] = models.Min(
+                self.end_date_field, filter=models.Q(**{"%s__gte" % self.end_date_field: current})
+            )
+        if not aggregates:
+            return None
+        dates = self.filter(**{self.publish_field: True}).aggregate(**aggregates)
+        changes = []
+        bucket = get_setting("PUBLICATION_TIME_BUCKET")
+        if dates.get("start"):
+            # items are published when the reference time reaches the start date
+            change = dates["start"]
+            if bucket:
+                change = datetime.fromtimestamp(-(-change.timestamp() // bucket) * bucket, tz=dt_timezone.utc)
+            changes.append(change)
+        if dates.get("end"):
+            # items are unpublished when the reference time is past the end date
+            change = dates["end"] + timedelta(seconds=1)
+            if bucket:
+                change = datetime.fromtimestamp((dates["end"].timestamp() // bucket + 1) * bucket, tz=dt_timezone.utc)
+            changes.append(change)
+        return min(changes) if changes else None
+
     def available(self, current_site=True):
         if current_site:
             return self.on_site().filter(**{self.publish_field: True})
@@ -136,6 +354,50 @@ class GenericDateQuerySet(AppHookConfigTranslatableQueryset):
         else:
             return self.active_translations(language_code=language)
 
+    def get_urls(self, language=None):
+        """
+        Resolve the URLs of the posts in the queryset in bulk.
+
+        :param language: URLs language (default: current language)
+        :return: dictionary of post pk: URL
+        """
+        from .models import PostUrlResolver
+
+        return PostUrlResolver(language).get_urls(self)
+
+
+class BlogCategoryQuerySet(AppHookConfigTranslatableQueryset):
+    posts_field = "blog_posts"
+
+    def with_counts(self, site=None):
+        """
+        Annotate each category with the number of its published posts (``published_count``), as returned by
+        ``BlogCategory.count``.
+
+        Only the posts in the category namespace and visible on the given site (current site if empty) are counted;
+        counts are computed in the same query as the categories.
+
+        :param site: site instance
+        """
+        posts_field = self.model._meta.get_field(self.posts_field)
+        posts = (
+            posts_field.related_model.objects.on_site(site)
+            .published(current_site=False)
+            .filter(**{posts_field.field.name: models.OuterRef("pk"), "app_config": models.OuterRef("app_config")})
+            .order_by()
+            .values(posts_field.field.name)
+            .annotate(count=models.Count("pk", distinct=True))
+            .values("count")
+        )
+        return self.annotate(published_count=Coalesce(models.Subquery(posts), 0))
+
+
+class BlogCategoryManager(AppHookConfigTranslatableManager):
+    queryset_class = BlogCategoryQuerySet
+
+    def with_counts(self, site=None):
+        return self.get_queryset().with_counts(site)
+
 
 class GenericDateTaggedManager(TaggedFilterItem, AppHookConfigTranslatableManager):
     use_for_related_fields = True
@@ -166,15 +428,83 @@ class GenericDateTaggedManager(TaggedFilterItem, AppHookConfigTranslatableManage
     def on_site(self, site=None):
         return self.get_queryset().on_site(site)
 
+    def next_publication_change(self):
+        return self.get_queryset().next_publication_change()
+
+    def get_urls(self, language=None):
+        return self.get_queryset().get_urls(language)
+
+    def get_published_ids(self, namespace=None, language=None, site=None, limit=None):
+        """
+        Get the ids of the published posts for the given namespace, language and site, ordered as the posts.
+
+        If :ref:`PUBLICATION_TIME_BUCKET <PUBLICATION_TIME_BUCKET>` is set, the list is cached until the end of the
+        current time bucket (or until a post is changed).
+
+        :param namespace: apphook namespace (all namespaces if empty)
+        :param language: language code (current language if empty)
+        :param site: site instance (all sites if empty)
+        :param limit: maximum number of ids to return
+        :return: list of ids
+        """
+        language = language or get_language()
+
+        def get_ids():
+            queryset = self.get_queryset()
+            if namespace:
+                queryset = queryset.namespace(namespace)
+            if site:
+                queryset = queryset.on_site(site)
+            queryset = queryset.active_translations(language_code=language).published(current_site=False)
+            return list(queryset.values_list("pk", flat=True)[:limit])
+
+        bucket = get_setting("PUBLICATION_TIME_BUCKET")
+        if not bucket:
+            return get_ids()
+        key = "djangocms-blog:published-ids:{}:{}:{}:{}".format(
+            namespace or "", site.pk if site else "", language, limit or ""
+        )
+        # the previous list is served while a single request recomputes it
+        return caching.get_or_set(key, get_ids, timeout=bucket, version=get_bucket_version())
+
+    def get_published_months(self, namespace=None, language=None, site=None):
+        """
+        Get months with the count of published posts for the given namespace, language and site.
+
+        If :ref:`ARCHIVE_COUNTERS <ARCHIVE_COUNTERS>` is set, data is read from the
+        :py:class:`djangocms_blog.models.ArchiveMonth` counters instead of the posts table.
+
+        :param namespace: apphook namespace (all namespaces if empty)
+        :param language: language code (current language if empty)
+        :param site: site instance (current site if empty)
+        :return: list of dictionaries with ``date`` and ``count`` keys
+        """
+        from .models import ArchiveMonth
+
+        language = language or get_language()
+        site = site or Site.objects.get_current()
+        if get_setting("ARCHIVE_COUNTERS"):
+            return ArchiveMonth.objects.get_months(language, site, namespace)
+        queryset = self.get_queryset()
+        if namespace:
+            queryset = queryset.namespace(namespace)
+        queryset = queryset.on_site(site).active_translations(language_code=language).published(current_site=False)
+        return self.get_months(queryset=queryset, current_site=False)
+
     def get_months(self, queryset=None, current_site=True):
         """
         Get months with aggregate count (how much posts is in the month).
         Results are ordered by date.
+
+        If :ref:`ARCHIVE_DB_AGGREGATION <ARCHIVE_DB_AGGREGATION>` is set, months are grouped and counted
+        by the database.
         """
         if queryset is None:
             queryset = self.get_queryset()
         if current_site:
             queryset = queryset.on_site()
+        if get_setting("ARCHIVE_DB_AGGREGATION"):
+            return self._get_months_db(queryset)
         dates_qs = queryset.values_list(queryset.start_date_field, queryset.fallback_date_field)
         dates = []
         for blog_dates in dates_qs:
@@ -195,3 +525,225 @@ class GenericDateTaggedManager(TaggedFilterItem, AppHookConfigTranslatableManage
             {"date": now().replace(year=year, month=month, day=1), "count": date_counter[year, month]}
             for year, month in dates
         ]
+
+    def _get_months_db(self, queryset):
+        """
+        Group and count posts by month in the database.
+
+        Month is computed on the start date field (or the fallback date field if empty) in the current timezone.
+        """
+        months = (
+            queryset.order_by()
+            .annotate(archive_month=TruncMonth(Coalesce(queryset.start_date_field, queryset.fallback_date_field)))
+            .values("archive_month")
+            .annotate(count=models.Count("pk", distinct=True))
+            .order_by("-archive_month")
+        )
+        return [{"date": month["archive_month"], "count": month["count"]} for month in months]
+
+
+class ArchiveMonthManager(models.Manager):
+    """
+    Manager to read and maintain the :py:class:`djangocms_blog.models.ArchiveMonth` counters.
+
+    Counters store the number of published posts per app config, site, language and month; months are computed in the
+    default timezone.
+    Posts visible in all the sites are counted in the rows without a site.
+
+    As changes in the publication status due to ``date_published`` / ``date_published_end`` do not trigger any
+    signal, the next publication boundary is stored in the cache and the affected months are rebuilt on the first read
+    after the boundary. Reads never rebuild all the counters: if the boundary information is lost from the cache, the
+    boundaries passed meanwhile are only applied by the ``rebuild_blog_archive`` management command.
+    """
+
+    transition_cache_key = "djangocms-blog:archive-months:transition"
+
+    def _get_posts(self, published=True):
+        from .models import Post
+
+        if published:
+            return Post.objects.published(current_site=False)
+        return Post.objects.filter(publish=True)
+
+    def _month_start(self, year, month):
+        return make_aware(datetime(year, month, 1), get_default_timezone())
+
+    def get_post_months(self, post):
+        """
+        Return the (app_config_id, year, month) tuple the given post is counted in.
+
+        :param post: post instance
+        :return: tuple
+        """
+        current_date = post.date_published or post.date_modified
+        current_date = localtime(current_date, get_default_timezone())
+        return post.app_config_id, current_date.year, current_date.month
+
+    def rebuild(self, months=None):
+        """
+        Recompute the counters.
+
+        :param months: list of (app_config_id, year, month) tuples to recompute (all the counters if ``None``)
+        """
+        if months is not None:
+            months = set(months)
+            if not months:
+                return
+        with transaction.atomic():
+            # concurrent rebuilds of the same app configs are serialized
+            app_configs = self.model._meta.get_field("app_config").related_model.objects.select_for_update()
+            if months is not None:
+                app_configs = app_configs.filter(pk__in={app_config_id for app_config_id, __, __ in months})
+            list(app_configs.order_by("pk").values_list("pk", flat=True))
+            self._rebuild(months)
+        if months is None:
+            self.set_next_transition()
+
+    def rebuild_on_commit(self, months):
+        """
+        Recompute the counters of the given months once the current transaction is committed.
+
+        Months changed by several signals of the same transaction (e.g.: post, translation and sites saved by the
+        admin) are collected and rebuilt by a single :py:meth:`rebuild`.
+
+        :param months: list of (app_config_id, year, month) tuples to recompute
+        """
+        months = set(months)
+        if not months:
+            return
+        pending = _pending_archive_months.__dict__.setdefault("months", set())
+        pending.update(months)
+        # the first callback rebuilds all the pending months, the following ones are no-op; months left pending by a
+        # rolled back transaction are rebuilt after the next commit
+        transaction.on_commit(self._rebuild_pending)
+
+    def _rebuild_pending(self):
+        months = _pending_archive_months.__dict__.pop("months", None)
+        if months:
+            self.rebuild(months)
+
+    def _rebuild(self, months):
+        posts = self._get_posts().order_by()
+        counters = self.all()
+        if months is not None:
+            post_filter = models.Q()
+            counter_filter = models.Q()
+            for app_config_id, year, month in months:
+                post_filter |= models.Q(app_config_id=app_config_id, archive_month=self._month_start(year, month))
+                counter_filter |= models.Q(app_config_id=app_config_id, year=year, month=month)
+            counters = counters.filter(counter_filter)
+        posts = posts.annotate(
+            archive_month=TruncMonth(
+                Coalesce(posts.start_date_field, posts.fallback_date_field), tzinfo=get_default_timezone()
+            )
+        )
+        if months is not None:
+            posts = posts.filter(post_filter)
+        rows = []
+        for language, __ in settings.LANGUAGES:
+            values = (
+                posts.active_translations(language_code=language)
+                .values("app_config_id", "sites", "archive_month")
+                .annotate(count=models.Count("pk", distinct=True))
+            )
+            for row in values:
+                archive_month = localtime(row["archive_month"], get_default_timezone())
+                rows.append(
+                    self.model(
+                        app_config_id=row["app_config_id"],
+                        site_id=row["sites"],
+                        language=language,
+                        year=archive_month.year,
+                        month=archive_month.month,
+                        count=row["count"],
+                    )
+                )
+        counters.delete()
+        self.bulk_create(rows)
+
+    def get_next_transition(self):
+        """
+        Return the next date in which a post enters or exits its publication window.
+        """
+        current = get_reference_time()
+        posts = self._get_posts(published=False)
+        dates = posts.aggregate(
+            start=models.Min("date_published", filter=models.Q(date_published__gt=current)),
+            end=models.Min("date_published_end", filter=models.Q(date_published_end__gt=current)),
+        )
+        dates = [date for date in dates.values() if date]
+        return min(dates) if dates else None
+
+    def set_next_transition(self, checked=None):
+        """
+        Store the next publication boundary in the cache.
+
+        :param checked: date up to which publication boundaries have been applied to the counters
+        """
+        cache.set(
+            self.transition_cache_key, (checked or get_reference_time(), self.get_next_transition()), timeout=None
+        )
+
+    def update_next_transition(self, *dates):
+        """
+        Anticipate the stored publication boundary if any of the given dates comes earlier.
+        """
+        stored = cache.get(self.transition_cache_key)
+        if stored is None:
+            return
+        checked, transition = stored
+        dates = [date for date in dates if date and date > checked]
+        if dates and (transition is None or min(dates) < transition):
+            cache.set(self.transition_cache_key, (checked, min(dates)), timeout=None)
+
+    def apply_transitions(self):
+        """
+        Rebuild the months affected by the publication boundaries passed since the last check.
+
+        Boundaries are applied by a single request at a time, the other ones read the current counters meanwhile.
+        If the boundary information is missing from the cache, it's stored again starting from the current time.
+        """
+        stored = cache.get(self.transition_cache_key)
+        if stored is None:
+            logger.warning("Archive months publication boundaries lost, run rebuild_blog_archive to update them")
+            return self.set_next_transition()
+        checked, transition = stored
+        current = get_reference_time()
+        if not transition or transition > current:
+            return
+        lock_key = caching.LOCK_CACHE_KEY.format(self.transition_cache_key)
+        if not cache.add(lock_key, True, timeout=get_setting("CACHE_LOCK_TIMEOUT")):
+            return
+        try:
+            posts = self._get_posts(published=False).filter(
+                models.Q(date_published__gt=checked, date_published__lte=current)
+                | models.Q(date_published_end__gt=checked, date_published_end__lte=current)
+            )
+            self.rebuild(
+                self.get_post_months(post) for post in posts.only("app_config", "date_published", "date_modified")
+            )
+            self.set_next_transition(current)
+        finally:
+            cache.delete(lock_key)
+
+    def get_months(self, language, site, namespace=None):
+        """
+        Get months with aggregate count of the published posts from the counters.
+
+        Results are ordered by date.
+
+        :param language: language code
+        :param site: site instance
+        :param namespace: apphook namespace (all namespaces if empty)
+        :return: list of dictionaries with ``date`` and ``count`` keys
+        """
+        self.apply_transitions()
+        counters = self.filter(language=language).filter(models.Q(site__isnull=True) | models.Q(site=site.pk))
+        if namespace:
+            counters = counters.filter(app_config__namespace=namespace)
+        months = counters.values("year", "month").annotate(total=models.Sum("count")).order_by("-year", "-month")
+        return [
+            {"date": self._month_start(month["year"], month["month"]), "count": month["total"]}
+            for month in months
+            if month["total"]
+        ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sites", "0002_alter_domain_unique"),
+        ("djangocms_blog", "0042_alter_authorentriesplugin_cmsplugin_ptr_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchiveMonth",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("language", models.CharField(max_length=15, verbose_name="language")),
+                ("year", models.PositiveIntegerField(verbose_name="year")),
+                ("month", models.PositiveSmallIntegerField(verbose_name="month")),
+                ("count", models.PositiveIntegerField(default=0, verbose_name="count")),
+                (
+                    "app_config",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archive_months",
+                        to="djangocms_blog.blogconfig",
+                        verbose_name="app. config",
+                    ),
+                ),
+                (
+                    "site",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="sites.site",
+                        verbose_name="site",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "archive month",
+                "verbose_name_plural": "archive months",
+                "unique_together": {("app_config", "site", "language", "year", "month")},
+            },
+        ),
+    ]
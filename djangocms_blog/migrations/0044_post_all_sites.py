@@ -0,0 +1,32 @@
+from django.db import migrations, models
+
+
+def forwards(apps, schema_editor):
+    Post = apps.get_model("djangocms_blog", "Post")
+    Post.objects.filter(sites__isnull=False).update(all_sites=False)
+
+
+def backwards(apps, schema_editor):
+    # No need for backward data migration
+    pass
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("djangocms_blog", "0043_archivemonth"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="all_sites",
+            field=models.BooleanField(
+                db_index=True,
+                default=True,
+                editable=False,
+                help_text="Automatically set if no site is selected.",
+                verbose_name="visible on all sites",
+            ),
+        ),
+        migrations.RunPython(forwards, backwards),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("djangocms_blog", "0044_post_all_sites"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="posttranslation",
+            name="permalink",
+            field=models.TextField(
+                blank=True,
+                default="",
+                editable=False,
+                help_text="Post path relative to the blog root, automatically computed.",
+                verbose_name="permalink",
+            ),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 21:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("djangocms_blog", "0045_posttranslation_permalink"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(fields=["date_published", "id"], name="djangocms_blog_post_keyset"),
+        ),
+    ]
@@ -1,43 +1,103 @@
 import hashlib
+import re
+from functools import lru_cache, partial
+from urllib.parse import quote
+from weakref import WeakKeyDictionary
 
+import django
 from aldryn_apphooks_config.fields import AppHookConfigField
-from aldryn_apphooks_config.managers.parler import AppHookConfigTranslatableManager
-from cms.models import CMSPlugin, PlaceholderField
+from cms.models import CMSPlugin, Placeholder, PlaceholderField
+from cms.signals import post_placeholder_operation
 from django.conf import settings as dj_settings
 from django.contrib.auth import get_user_model
+from django.contrib.sites.models import Site
 from django.contrib.sites.shortcuts import get_current_site
 from django.core.cache import cache
-from django.db import models
-from django.db.models.signals import post_save, pre_delete
+from django.db import models, transaction
+from django.db.models.functions import RowNumber
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
-from django.urls import reverse
+from django.urls import NoReverseMatch, get_resolver, get_urlconf, reverse
 from django.utils import timezone
 from django.utils.encoding import force_bytes, force_str
 from django.utils.functional import cached_property
 from django.utils.html import strip_tags
-from django.utils.translation import get_language, gettext, gettext_lazy as _
+from django.utils.http import RFC3986_SUBDELIMS
+from django.utils.translation import get_language, gettext, gettext_lazy as _, override
 from djangocms_text_ckeditor.fields import HTMLField
 from easy_thumbnails.files import get_thumbnailer
 from filer.fields.image import FilerImageField
 from filer.models import ThumbnailOption
 from meta.models import ModelMeta
+from parler.cache import MISSING, _delete_cached_translation
 from parler.models import TranslatableModel, TranslatedFields
+from parler.signals import post_translation_save, pre_translation_save
 from parler.utils.context import switch_language
+from parler.utils.i18n import get_active_language_choices
 from sortedm2m.fields import SortedManyToManyField
+from taggit.models import Tag
 from taggit_autosuggest.managers import TaggableManager
 
+from . import caching
 from .cms_appconfig import BlogConfig
 from .fields import slugify
-from .managers import GenericDateTaggedManager
+from .managers import (
+    ArchiveMonthManager,
+    BlogCategoryManager,
+    GenericDateTaggedManager,
+    bump_feed_versions,
+    bump_post_versions,
+    bump_published_version,
+    get_bucket_version,
+)
+from .pregenerate import mark_changed as mark_pregenerated_changed
 from .settings import get_setting
 
 BLOG_CURRENT_POST_IDENTIFIER = get_setting("CURRENT_POST_IDENTIFIER")
+PERMALINK_PARAMETER = re.compile(r"<(?:\w+:)?(\w+)>")
 BLOG_CURRENT_NAMESPACE = get_setting("CURRENT_NAMESPACE")
 BLOG_PLUGIN_TEMPLATE_FOLDERS = get_setting("PLUGIN_TEMPLATE_FOLDERS")
 
 
 thumbnail_model = "{}.{}".format(ThumbnailOption._meta.app_label, ThumbnailOption.__name__)
 
+_LIST_PREFETCH = (
+    "translations",
+    "categories",
+    "categories__translations",
+    "categories__app_config",
+    "tags",
+)
+#: Default optimization profiles, see :ref:`OPTIMIZE_PROFILES <OPTIMIZE_PROFILES>`
+OPTIMIZE_PROFILES = {
+    "list": {
+        "select_related": ("app_config", "author", "main_image", "main_image_thumbnail", "media"),
+        "prefetch_related": _LIST_PREFETCH,
+    },
+    "plugin": {
+        "select_related": ("app_config", "author", "main_image", "main_image_thumbnail", "media"),
+        "prefetch_related": _LIST_PREFETCH,
+    },
+    "detail": {
+        # all the translations are needed by the language menu
+        "select_related": ("app_config", "author", "main_image", "main_image_full", "content", "media"),
+        "prefetch_related": (
+            "translations",
+            "categories",
+            "categories__translations",
+            "categories__app_config",
+            "tags",
+            "related",
+            "related__app_config",
+            "related__author",
+            "related__main_image",
+            "related__main_image_thumbnail",
+            "related__media",
+        )
+        + tuple("related__%s" % lookup for lookup in _LIST_PREFETCH),
+    },
+}
+
 
 try:
     from knocker.mixins import KnockerModel
@@ -51,21 +111,58 @@ except ImportError:  # pragma: no cover
         pass
 
 
+@lru_cache(maxsize=None)
+def get_permalink_regex(urlconf):
+    """
+    Return the regular expression matching the paths generated by the given permalink pattern.
+    """
+    regex = ""
+    position = 0
+    for match in PERMALINK_PARAMETER.finditer(urlconf):
+        regex += re.escape(urlconf[position : match.start()])
+        regex += "[0-9]+" if match.group(0).startswith("<int:") else "[^/]+"
+        position = match.end()
+    return re.compile(regex + re.escape(urlconf[position:]))
+
+
+#: Blog roots and permalink regular expressions, per URL resolver (new resolvers are created when URLs are reloaded)
+_permalink_roots = WeakKeyDictionary()
+
+
+def get_permalink_root(app_config, language):
+    """
+    Return the blog root of the given app config and language, and the regular expression matching its permalinks.
+
+    Result is stored until the URLs are reloaded or a blog config is saved.
+
+    :return: (root, regex) tuple, ``(None, None)`` if the app config is not attached to any page or has no
+             permalink pattern
+    """
+    roots = _permalink_roots.setdefault(get_resolver(get_urlconf()), {})
+    key = (app_config.pk, language)
+    if key not in roots:
+        root, regex = None, None
+        urlconf = get_setting("PERMALINK_URLS").get(app_config.url_patterns)
+        if urlconf:
+            try:
+                with override(language):
+                    root = reverse("%s:posts-latest" % app_config.namespace, current_app=app_config.namespace)
+                regex = get_permalink_regex(urlconf)
+            except NoReverseMatch:
+                pass
+        roots[key] = root, regex
+    return roots[key]
+
+
 def _get_language(instance, language):
-    available_languages = instance.get_available_languages()
-    if language and language in available_languages:
-        return language
-    language = get_language()
-    if language and language in available_languages:
-        return language
-    language = instance.get_current_language()
-    if language and language in available_languages:
-        return language
+    candidates = [language, get_language(), instance.get_current_language()]
     if get_setting("USE_FALLBACK_LANGUAGE_IN_URL"):
-        for fallback_language in instance.get_fallback_languages():
-            if fallback_language in available_languages:
-                return fallback_language
-    return language
+        candidates.extend(instance.get_fallback_languages())
+    # has_translation only queries the languages missing from the translations cache
+    for candidate in candidates:
+        if candidate and instance.has_translation(candidate):
+            return candidate
+    return instance.get_current_language()
 
 
 class BlogMetaMixin(ModelMeta):
@@ -85,6 +182,29 @@ class BlogMetaMixin(ModelMeta):
         """
         return self.build_absolute_uri(self.get_absolute_url())
 
+    @property
+    def active_translations_prefetch(self):
+        try:
+            return self.__dict__["_active_translations_prefetch"]
+        except KeyError:
+            raise AttributeError("active_translations_prefetch")
+
+    @active_translations_prefetch.setter
+    def active_translations_prefetch(self, translations):
+        """
+        Store the translations fetched by the ``:active`` profile lookups in parler translations cache.
+
+        Fetched languages without a translation are marked as missing; other languages are not known and are loaded
+        on demand by parler.
+        """
+        self.__dict__["_active_translations_prefetch"] = translations
+        local_cache = self._translations_cache[self._parler_meta.root_model]
+        for translation in translations:
+            local_cache.setdefault(translation.language_code, translation)
+        if translations:
+            for language in translations[0].prefetched_languages.split(","):
+                local_cache.setdefault(language, MISSING)
+
 
 class BlogCategory(BlogMetaMixin, TranslatableModel):
     """
@@ -105,7 +225,7 @@ class BlogCategory(BlogMetaMixin, TranslatableModel):
         meta={"unique_together": (("language_code", "slug"),)},
     )
 
-    objects = AppHookConfigTranslatableManager()
+    objects = BlogCategoryManager()
 
     _metadata = {
         "title": "get_title",
@@ -146,6 +266,8 @@ class BlogCategory(BlogMetaMixin, TranslatableModel):
 
     @cached_property
     def count(self):
+        if hasattr(self, "published_count"):
+            return self.published_count
         return self.linked_posts.published().count()
 
     @cached_property
@@ -246,6 +368,13 @@ class Post(KnockerModel, BlogMetaMixin, TranslatableModel):
             "visible in all the configured sites."
         ),
     )
+    all_sites = models.BooleanField(
+        _("visible on all sites"),
+        default=True,
+        db_index=True,
+        editable=False,
+        help_text=_("Automatically set if no site is selected."),
+    )
     app_config = AppHookConfigField(BlogConfig, null=True, verbose_name=_("app. config"))
 
     translations = TranslatedFields(
@@ -265,6 +394,13 @@ class Post(KnockerModel, BlogMetaMixin, TranslatableModel):
             default="",
         ),
         post_text=HTMLField(_("text"), default="", blank=True, configuration="BLOG_POST_TEXT_CKEDITOR"),
+        permalink=models.TextField(
+            _("permalink"),
+            blank=True,
+            default="",
+            editable=False,
+            help_text=_("Post path relative to the blog root, automatically computed."),
+        ),
         meta={"unique_together": (("language_code", "slug"),)},
     )
     media = PlaceholderField("media", related_name="media")
@@ -315,6 +451,10 @@ class Post(KnockerModel, BlogMetaMixin, TranslatableModel):
         verbose_name_plural = _("blog articles")
         ordering = ("-date_published", "-date_created")
         get_latest_by = "date_published"
+        indexes = [
+            # keyset pagination
+            models.Index(fields=["date_published", "id"], name="djangocms_blog_post_keyset"),
+        ]
 
     def __str__(self):
         default = gettext("Post (no translation)")
@@ -353,10 +493,68 @@ class Post(KnockerModel, BlogMetaMixin, TranslatableModel):
         """
         if not translation.slug and translation.title:
             translation.slug = slugify(translation.title)
+        translation.permalink = self.get_permalink(translation.language_code, slug=translation.slug)
         super().save_translation(translation, *args, **kwargs)
 
+    def get_permalink(self, lang, slug=None):
+        """
+        Compute the post path relative to the blog root according to the app config permalink style.
+
+        :param lang: language of the path
+        :param slug: post slug (if empty, the slug in the given language is used)
+        :return: path or empty string if it can't be computed
+        """
+        if not self.app_config_id:
+            return ""
+        urlconf = get_setting("PERMALINK_URLS").get(self.app_config.url_patterns)
+        if not urlconf:
+            return ""
+        current_date = self.date_published or self.date_created
+        values = {
+            "year": current_date.year if current_date else None,
+            "month": "%02d" % current_date.month if current_date else None,
+            "day": "%02d" % current_date.day if current_date else None,
+            "slug": slug or self.safe_translation_getter("slug", language_code=lang, any_language=True),
+        }
+        if "category>" in urlconf and self.pk:
+            category = self.categories.first()
+            if category:
+                values["category"] = category.safe_translation_getter("slug", language_code=lang, any_language=True)
+
+        def replace(match):
+            if not values.get(match.group(1)):
+                raise KeyError(match.group(1))
+            return str(values[match.group(1)])
+
+        try:
+            path = PERMALINK_PARAMETER.sub(replace, urlconf)
+        except KeyError:
+            return ""
+        return quote(path, safe=RFC3986_SUBDELIMS + "/~:@")
+
+    def update_permalinks(self):
+        """
+        Recompute and store the permalinks of the saved post translations.
+        """
+        for language in self.get_available_languages():
+            translation = self.get_translation(language)
+            permalink = self.get_permalink(language)
+            if translation.permalink != permalink:
+                translation.permalink = permalink
+                translation.__class__.objects.filter(pk=translation.pk).update(permalink=permalink)
+                # queryset update skips parler cache invalidation
+                _delete_cached_translation(translation)
+
     def get_absolute_url(self, lang=None):
         lang = _get_language(self, lang)
+        if self.app_config_id and self.has_translation(lang):
+            # stored permalink is computed on post / category / config changes, it's used if it matches the
+            # current permalink style
+            permalink = self.safe_translation_getter("permalink", language_code=lang)
+            if permalink:
+                root, regex = get_permalink_root(self.app_config, lang)
+                if root is not None and regex.fullmatch(permalink):
+                    return root + permalink
         with switch_language(self, lang):
             category = self.categories.first()
             kwargs = {}
@@ -487,6 +685,91 @@ class Post(KnockerModel, BlogMetaMixin, TranslatableModel):
         )
 
 
+class ArchiveMonth(models.Model):
+    """
+    Number of published posts per app config, site, language and month.
+
+    Rows without a site count the posts visible in all the sites.
+    Enabled by :ref:`ARCHIVE_COUNTERS <ARCHIVE_COUNTERS>`.
+    """
+
+    app_config = models.ForeignKey(
+        BlogConfig, verbose_name=_("app. config"), null=True, related_name="archive_months", on_delete=models.CASCADE
+    )
+    site = models.ForeignKey(
+        "sites.Site", verbose_name=_("site"), null=True, related_name="+", on_delete=models.CASCADE
+    )
+    language = models.CharField(_("language"), max_length=15)
+    year = models.PositiveIntegerField(_("year"))
+    month = models.PositiveSmallIntegerField(_("month"))
+    count = models.PositiveIntegerField(_("count"), default=0)
+
+    objects = ArchiveMonthManager()
+
+    class Meta:
+        verbose_name = _("archive month")
+        verbose_name_plural = _("archive months")
+        unique_together = (("app_config", "site", "language", "year", "month"),)
+
+    def __str__(self):
+        return "{}/{:02d} ({})".format(self.year, self.month, self.language)
+
+
+def get_optimize_profile(profile, template_folder=None):
+    """
+    Return the optimization profile with the given name, as configured in
+    :ref:`OPTIMIZE_PROFILES <OPTIMIZE_PROFILES>`.
+
+    ``<profile>:<template_folder>`` profiles take precedence over the generic ones.
+    """
+    profiles = {**OPTIMIZE_PROFILES, **get_setting("OPTIMIZE_PROFILES")}
+    if template_folder and "{}:{}".format(profile, template_folder) in profiles:
+        return profiles["{}:{}".format(profile, template_folder)]
+    return profiles[profile]
+
+
+def get_prefetch(model, lookup):
+    """
+    Return the ``prefetch_related`` lookup of the given profile lookup.
+
+    Lookups with the ``:counts`` suffix annotate the categories with their posts count (see
+    :py:meth:`djangocms_blog.managers.BlogCategoryQuerySet.with_counts`); lookups with the ``:active`` suffix only
+    fetch the translations in the current language and its fallbacks (see
+    :py:meth:`parler.managers.TranslatableQuerySet.active_translations`), other languages are loaded on demand.
+    """
+    path, __, modifier = lookup.partition(":")
+    related_model = model
+    for name in path.split("__"):
+        related_model = related_model._meta.get_field(name).related_model
+    if modifier == "active":
+        languages = get_active_language_choices()
+        queryset = related_model.objects.filter(language_code__in=languages).annotate(
+            prefetched_languages=models.Value(",".join(languages), output_field=models.CharField())
+        )
+        return models.Prefetch(path, queryset=queryset, to_attr="active_translations_prefetch")
+    if modifier == "counts":
+        return models.Prefetch(path, queryset=related_model.objects.with_counts())
+    return path
+
+
+def optimize_queryset(qs, profile, template_folder=None):
+    """
+    Apply the select_related / prefetch_related lookups of the given optimization profile to the posts queryset.
+
+    :param qs: queryset to optimize
+    :param profile: profile name (``list``, ``detail``, ``plugin``)
+    :param template_folder: template folder of the view / plugin, used to select template specific profiles
+    :return: optimized queryset
+    """
+    options = get_optimize_profile(profile, template_folder)
+    if options.get("select_related"):
+        qs = qs.select_related(*options["select_related"])
+    # reset the lookups, as the categories prefetch can't be applied twice
+    return qs.prefetch_related(None).prefetch_related(
+        *(get_prefetch(qs.model, lookup) for lookup in options.get("prefetch_related", ()))
+    )
+
+
 class BasePostPlugin(CMSPlugin):
     app_config = AppHookConfigField(BlogConfig, null=True, verbose_name=_("app. config"), blank=True)
     current_site = models.BooleanField(
@@ -500,6 +783,9 @@ class BasePostPlugin(CMSPlugin):
         choices=BLOG_PLUGIN_TEMPLATE_FOLDERS,
     )
 
+    #: Name of the optimization profile of the plugin posts (see :py:func:`optimize_queryset`)
+    optimize_profile = "plugin"
+
     class Meta:
         abstract = True
 
@@ -509,26 +795,44 @@ class BasePostPlugin(CMSPlugin):
         :param qs: queryset to optimize
         :return: optimized queryset
         """
-        return qs.select_related("app_config").prefetch_related(
-            "translations", "categories", "categories__translations", "categories__app_config"
-        )
+        return optimize_queryset(qs, self.optimize_profile, self.template_folder)
 
-    def post_queryset(self, request=None, published_only=True, selected_posts=None):
+    def candidate_queryset(self, request=None, selected_posts=None):
+        """
+        Return the posts the plugin can display, regardless of their publication status.
+        """
         language = get_language()
         posts = Post.objects if not selected_posts else selected_posts
         if self.app_config:
             posts = posts.namespace(self.app_config.namespace)
         if self.current_site:
             posts = posts.on_site(get_current_site(request))
-        posts = posts.active_translations(language_code=language)
-        if (
+        return posts.active_translations(language_code=language)
+
+    def post_queryset(self, request=None, published_only=True, selected_posts=None):
+        posts = self.candidate_queryset(request, selected_posts)
+        if self.show_published_only(request, published_only):
+            posts = posts.published(current_site=self.current_site)
+        return self.optimize(posts.all())
+
+    def show_published_only(self, request=None, published_only=True):
+        """
+        Check whether only published posts must be displayed (i.e.: unless the toolbar is in edit mode).
+        """
+        return (
             published_only
             or not request
             or not getattr(request, "toolbar", False)
             or not request.toolbar.edit_mode_active
-        ):
-            posts = posts.published(current_site=self.current_site)
-        return self.optimize(posts.all())
+        )
+
+    def get_next_publication_change(self, request=None):
+        """
+        Return the date when one of the posts the plugin can display enters or leaves the publication window.
+
+        :return: datetime or ``None`` if no change is scheduled
+        """
+        return self.candidate_queryset(request).next_publication_change()
 
 
 class LatestPostsPlugin(BasePostPlugin):
@@ -560,12 +864,45 @@ class LatestPostsPlugin(BasePostPlugin):
             self.categories.add(category)
 
     def get_posts(self, request, published_only=True):
+        bucket = get_setting("PUBLICATION_TIME_BUCKET")
+        if bucket and self.show_published_only(request, published_only) and not self.has_filters(bucket):
+            ids = Post.objects.get_published_ids(
+                namespace=self.app_config.namespace if self.app_config else None,
+                language=get_language(),
+                site=get_current_site(request) if self.current_site else None,
+                limit=self.latest_posts,
+            )
+            if not ids:
+                return Post.objects.none()
+            # posts are returned in the cached ids order
+            order = models.Case(*[models.When(pk=pk, then=index) for index, pk in enumerate(ids)])
+            return self.optimize(Post.objects.filter(pk__in=ids)).order_by(order)
         posts = self.post_queryset(request, published_only)
+        return self.optimize(posts.distinct())[: self.latest_posts]
+
+    def has_filters(self, bucket):
+        """
+        Check whether the posts are filtered by tags or categories, once per publication time bucket.
+        """
+
+        def get_filters():
+            return self.tags.exists() or self.categories.exists()
+
+        key = "djangocms-blog:latest-filters:{}".format(self.pk)
+        return caching.get_or_set(key, get_filters, timeout=bucket, version=get_bucket_version())
+
+    def filter_posts(self, posts):
+        """
+        Filter the posts according to the selected tags and categories.
+        """
         if self.tags.exists():
             posts = posts.filter(tags__in=list(self.tags.all()))
         if self.categories.exists():
             posts = posts.filter(categories__in=list(self.categories.all()))
-        return self.optimize(posts.distinct())[: self.latest_posts]
+        return posts
+
+    def candidate_queryset(self, request=None, selected_posts=None):
+        return self.filter_posts(super().candidate_queryset(request, selected_posts))
 
 
 class AuthorEntriesPlugin(BasePostPlugin):
@@ -591,13 +928,50 @@ class AuthorEntriesPlugin(BasePostPlugin):
         return posts
 
     def get_authors(self, request):
-        authors = self.authors.all()
+        """
+        Return the selected authors, each with the total number of posts (``count``) and the latest posts
+        (``posts``).
+
+        Counts are fetched with a single grouped query, latest posts with a single query ranking the posts of each
+        author by a window function.
+        """
+        authors = list(self.authors.all())
+        if not authors:
+            return authors
+        posts = self.get_posts(request).filter(author__in=authors)
+        counts = dict(
+            posts.prefetch_related(None)
+            .order_by()
+            .values("author")
+            .annotate(count=models.Count("pk", distinct=True))
+            .values_list("author", "count")
+        )
+        # rank the posts without the translations join of the plugin queryset, which yields a row per language
+        ranked = self.optimize(Post.objects.filter(pk__in=posts.values("pk"))).annotate(
+            author_position=models.Window(
+                expression=RowNumber(),
+                partition_by=[models.F("author")],
+                order_by=[
+                    models.F(field[1:]).desc() if field.startswith("-") else models.F(field).asc()
+                    for field in Post._meta.ordering
+                ],
+            )
+        )
+        if django.VERSION >= (4, 2):
+            latest = list(ranked.filter(author_position__lte=self.latest_posts))
+        else:
+            # filtering on window functions is only supported since Django 4.2
+            latest_ids = [
+                pk
+                for pk, position in ranked.prefetch_related(None).values_list("pk", "author_position")
+                if position <= self.latest_posts
+            ]
+            latest = list(posts.filter(pk__in=latest_ids))
         for author in authors:
-            qs = self.get_posts(request).filter(author=author)
             # total nb of articles
-            author.count = qs.count()
+            author.count = counts.get(author.pk, 0)
             # "the number of author articles to be displayed"
-            author.posts = qs[: self.latest_posts]
+            author.posts = [post for post in latest if post.author_id == author.pk]
         return authors
 
 
@@ -611,9 +985,12 @@ class FeaturedPostsPlugin(BasePostPlugin):
         self.posts.set(oldinstance.posts.all())
 
     def get_posts(self, request, published_only=True):
-        posts = self.post_queryset(request, published_only, selected_posts=self.posts.all())
+        posts = self.post_queryset(request, published_only)
         return posts
 
+    def candidate_queryset(self, request=None, selected_posts=None):
+        return super().candidate_queryset(request, selected_posts=self.posts.all())
+
 
 class GenericBlogPlugin(BasePostPlugin):
     class Meta:
@@ -632,6 +1009,493 @@ def pre_delete_post(sender, instance, **kwargs):
 
 @receiver(post_save, sender=Post)
 def post_save_post(sender, instance, **kwargs):
-    for language in instance.get_available_languages():
-        key = instance.get_cache_key(language, "feed")
-        cache.delete(key)
+    # stale content is served by the feeds until it's rendered again
+    caching.expire([instance.get_cache_key(language, "feed") for language in instance.get_available_languages()])
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Post._parler_meta.root_model)
+@receiver(post_delete, sender=Post._parler_meta.root_model)
+def post_published_changed(sender, **kwargs):
+    bump_published_version()
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+@receiver(m2m_changed, sender=Post.categories.through)
+def post_relations_changed(sender, instance, action, model, **kwargs):
+    # tags through model is shared with the other tagged models
+    if action in ("post_add", "post_remove", "post_clear") and (isinstance(instance, Post) or model is Post):
+        bump_published_version()
+
+
+@receiver(pre_save, sender=Post)
+@receiver(pre_delete, sender=Post)
+def post_previous_state(sender, instance, raw=False, **kwargs):
+    """
+    Store the saved state of the post in ``instance._previous_state``, for the receivers invalidating the feeds, the
+    menus and the archive months the post was in before the change.
+    """
+    instance._previous_state = None
+    if not raw and instance.pk:
+        instance._previous_state = (
+            Post.objects.filter(pk=instance.pk).only("app_config", "date_published", "date_modified").first()
+        )
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_feeds_change(sender, instance, **kwargs):
+    # feeds of the previous app config must be invalidated too
+    previous = getattr(instance, "_previous_state", None)
+    bump_feed_versions({instance.app_config_id, previous.app_config_id if previous else None} - {None})
+
+
+@receiver(post_save, sender=Post._parler_meta.root_model)
+@receiver(post_delete, sender=Post._parler_meta.root_model)
+def post_translation_feeds_change(sender, instance, **kwargs):
+    app_config_id = Post.objects.filter(pk=instance.master_id).values_list("app_config_id", flat=True).first()
+    if app_config_id:
+        # the translation is also used as fallback in the languages the post is not translated in
+        translated = set(
+            sender.objects.filter(master_id=instance.master_id)
+            .exclude(pk=instance.pk)
+            .values_list("language_code", flat=True)
+        )
+        bump_feed_versions(
+            [app_config_id], [language for language, __ in dj_settings.LANGUAGES if language not in translated]
+        )
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+@receiver(m2m_changed, sender=Post.categories.through)
+@receiver(m2m_changed, sender=Post.sites.through)
+def post_feeds_relations_change(sender, instance, action, model, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if isinstance(instance, Post):
+        bump_feed_versions([instance.app_config_id])
+    elif model is Post:
+        # posts removed by clear() are not known
+        if pk_set is None:
+            app_config_ids = BlogConfig.objects.values_list("pk", flat=True)
+        else:
+            app_config_ids = Post.objects.filter(pk__in=pk_set).values_list("app_config_id", flat=True).distinct()
+        bump_feed_versions(set(app_config_ids))
+
+
+def update_all_sites(post_ids):
+    """
+    Update the :py:attr:`Post.all_sites` flag of the given posts according to their sites.
+    """
+    sites_through = Post.sites.through.objects.filter(post_id=models.OuterRef("pk"))
+    Post.objects.filter(pk__in=post_ids).update(all_sites=~models.Exists(sites_through))
+
+
+@receiver(m2m_changed, sender=Post.sites.through)
+def post_sites_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == "pre_clear":
+        instance._cleared_posts = list(instance.post_set.values_list("pk", flat=True))
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    bump_published_version()
+    if not reverse:
+        update_all_sites([instance.pk])
+        instance.all_sites = not instance.sites.exists()
+    elif action == "post_clear":
+        update_all_sites(getattr(instance, "_cleared_posts", []))
+    else:
+        update_all_sites(pk_set)
+
+
+@receiver(pre_delete, sender=Site)
+def pre_delete_site(sender, instance, **kwargs):
+    instance._deleted_posts = list(instance.post_set.values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=Site)
+def post_delete_site(sender, instance, **kwargs):
+    update_all_sites(getattr(instance, "_deleted_posts", []))
+
+
+def _update_archive_months(*posts):
+    months = set()
+    for post in posts:
+        if post:
+            months.add(ArchiveMonth.objects.get_post_months(post))
+            # the post is removed from the month it was counted in before the change
+            if getattr(post, "_previous_state", None):
+                months.add(ArchiveMonth.objects.get_post_months(post._previous_state))
+    ArchiveMonth.objects.rebuild_on_commit(months)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def archive_months_post_change(sender, instance, **kwargs):
+    if not get_setting("ARCHIVE_COUNTERS"):
+        return
+    _update_archive_months(instance)
+    ArchiveMonth.objects.update_next_transition(instance.date_published, instance.date_published_end)
+
+
+@receiver(post_save, sender=Post._parler_meta.root_model)
+@receiver(post_delete, sender=Post._parler_meta.root_model)
+def archive_months_translation_change(sender, instance, **kwargs):
+    if not get_setting("ARCHIVE_COUNTERS"):
+        return
+    _update_archive_months(Post.objects.filter(pk=instance.master_id).first())
+
+
+@receiver(m2m_changed, sender=Post.sites.through)
+def archive_months_sites_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if not get_setting("ARCHIVE_COUNTERS") or action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if reverse:
+        _update_archive_months(*Post.objects.filter(pk__in=pk_set or ()))
+    else:
+        _update_archive_months(instance)
+
+
+class PostUrlResolver:
+    """
+    Resolve the URLs of many posts at once.
+
+    The permalink pattern of each app config is compiled once into a format template (the blog root is reversed
+    once per app config and language) and the first categories of the posts are fetched in a single query, so
+    resolving each URL requires neither queries nor ``reverse`` calls.
+
+    URLs are the same as returned by :py:meth:`Post.get_absolute_url`.
+    """
+
+    category_placeholder = "djangocms-blog-category-placeholder"
+
+    def __init__(self, language=None):
+        self.language = language
+        self._templates = {}
+        self._categories = {}
+
+    @staticmethod
+    def _escape(url):
+        return url.replace("{", "{{").replace("}", "}}")
+
+    @staticmethod
+    def _quote(value):
+        return quote(str(value), safe=RFC3986_SUBDELIMS + "/~:@")
+
+    def get_post_template(self, app_config, language):
+        """
+        Return the URL fields and template of the posts of the given app config and language.
+
+        Result is stored per app config, as reading app config options is costly.
+
+        :return: (fields, template) tuple, template is ``None`` if the app config is not attached to any page
+        """
+        key = ("post-detail", app_config.pk, language)
+        if key not in self._templates:
+            urlconf = get_setting("PERMALINK_URLS").get(app_config.url_patterns)
+            fields, template = set(), None
+            if urlconf:
+                fields = set(PERMALINK_PARAMETER.findall(urlconf))
+                root, __ = get_permalink_root(app_config, language)
+                if root is not None:
+                    template = self._escape(root) + PERMALINK_PARAMETER.sub(
+                        lambda match: "{%s}" % match.group(1), self._escape(urlconf)
+                    )
+            self._templates[key] = fields, template
+        return self._templates[key]
+
+    def get_categories(self, posts):
+        """
+        Return the categories of the given posts, ordered by pk.
+
+        :param posts: posts queryset or list of post ids
+        :return: dictionary of post pk: list of category pks
+        """
+        through = Post.categories.through.objects.filter(post__in=posts).order_by("blogcategory_id")
+        categories = {}
+        for post_id, category_id in through.values_list("post_id", "blogcategory_id"):
+            categories.setdefault(post_id, []).append(category_id)
+        return categories
+
+    def get_first_categories(self, posts):
+        """
+        Return the first category (as returned by ``post.categories.first()``) of the given posts.
+
+        :param posts: posts queryset or list of post ids
+        :return: dictionary of post pk: category pk
+        """
+        return {post_id: categories[0] for post_id, categories in self.get_categories(posts).items()}
+
+    def fetch_categories(self, category_ids):
+        """
+        Load the given categories (with their translations) to be used by :py:meth:`get_category_slug`.
+        """
+        missing = set(category_ids) - set(self._categories)
+        if missing:
+            self._categories.update(
+                (category.pk, category)
+                for category in BlogCategory.objects.filter(pk__in=missing).prefetch_related("translations")
+            )
+
+    def get_category_slug(self, category_id, language):
+        """
+        Return the slug of a category loaded by :py:meth:`fetch_categories`.
+        """
+        category = self._categories.get(category_id)
+        if category:
+            return category.safe_translation_getter("slug", language_code=language, any_language=True)
+
+    def format_url(self, fields, template, current_date, slug, category_slug=None):
+        """
+        Build a post URL from the template returned by :py:meth:`get_post_template`.
+
+        :return: URL or ``None`` if any of the URL fields is empty
+        """
+        values = {}
+        for field in fields:
+            if field == "year":
+                values[field] = current_date.year
+            elif field in ("month", "day"):
+                values[field] = "%02d" % getattr(current_date, field)
+            elif field == "slug":
+                values[field] = slug
+            elif field == "category":
+                values[field] = category_slug
+        if all(values.values()):
+            return template.format(**{field: self._quote(value) for field, value in values.items()})
+
+    def get_urls(self, posts, first_categories=None):
+        """
+        Return the URLs of the given posts.
+
+        :param posts: posts queryset or list of posts (``app_config`` and ``translations`` should be prefetched)
+        :param first_categories: first category of each post, as returned by :py:meth:`get_first_categories`
+                                 (fetched if not provided)
+        :return: dictionary of post pk: URL, posts whose URL can't be resolved are skipped
+        """
+        if isinstance(posts, models.QuerySet):
+            posts = posts.select_related("app_config").prefetch_related("translations")
+        posts = list(posts)
+        resolved = []
+        for post in posts:
+            if post.app_config_id:
+                language = _get_language(post, self.language)
+                fields, template = self.get_post_template(post.app_config, language)
+                if template:
+                    resolved.append((post, language, fields, template))
+        with_category = [post.pk for post, __, fields, __ in resolved if "category" in fields]
+        if with_category:
+            if first_categories is None:
+                first_categories = self.get_first_categories(with_category)
+            self.fetch_categories(first_categories[pk] for pk in with_category if pk in first_categories)
+        urls = {}
+        for post, language, fields, template in resolved:
+            url = self.format_url(
+                fields,
+                template,
+                post.date_published or post.date_created,
+                post.safe_translation_getter("slug", language_code=language, any_language=True),
+                self.get_category_slug(first_categories.get(post.pk), language) if "category" in fields else None,
+            )
+            if url:
+                urls[post.pk] = url
+        return urls
+
+    def get_category_url(self, category):
+        """
+        Return the URL of the given category, as ``BlogCategory.get_absolute_url`` does.
+        """
+        language = _get_language(category, self.language)
+        if not category.has_translation(language):
+            return category.get_absolute_url(language)
+        key = ("posts-category", category.app_config_id, language)
+        if key not in self._templates:
+            with override(language):
+                url = reverse(
+                    "%s:posts-category" % category.app_config.namespace,
+                    kwargs={"category": self.category_placeholder},
+                    current_app=category.app_config.namespace,
+                )
+            self._templates[key] = self._escape(url).replace(self.category_placeholder, "{category}")
+        slug = category.safe_translation_getter("slug", language_code=language)
+        return self._templates[key].format(category=self._quote(slug))
+
+
+def update_post_permalinks(posts):
+    """
+    Recompute and store the permalinks of the given posts.
+
+    To be called when permalinks inputs are changed bypassing the ORM signals or when ``BLOG_PERMALINK_URLS``
+    setting is changed.
+
+    :param posts: posts queryset
+    :return: number of posts
+    """
+    count = 0
+    for post in posts.select_related("app_config").prefetch_related("translations"):
+        post.update_permalinks()
+        count += 1
+    return count
+
+
+@receiver(post_save, sender=Post)
+def post_permalinks_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance.update_permalinks()
+
+
+@receiver(m2m_changed, sender=Post.categories.through)
+def post_categories_permalinks_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == "pre_clear":
+        instance._permalink_posts = list(instance.blog_posts.values_list("pk", flat=True))
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        instance.update_permalinks()
+    elif action == "post_clear":
+        update_post_permalinks(Post.objects.filter(pk__in=getattr(instance, "_permalink_posts", [])))
+    else:
+        update_post_permalinks(Post.objects.filter(pk__in=pk_set))
+
+
+@receiver(pre_translation_save, sender=BlogCategory)
+def category_slug_pre_change(sender, instance, raw=False, **kwargs):
+    if not raw and instance.pk:
+        instance._old_slug = instance.__class__.objects.filter(pk=instance.pk).values_list("slug", flat=True).first()
+
+
+# parler translation signals are sent after the translation cache is updated
+@receiver(post_translation_save, sender=BlogCategory)
+def category_slug_permalinks_change(sender, instance, raw=False, created=False, **kwargs):
+    if not raw and not created and getattr(instance, "_old_slug", instance.slug) != instance.slug:
+        update_post_permalinks(Post.objects.filter(categories=instance.master_id))
+
+
+@receiver(pre_save, sender=BlogConfig)
+def config_permalinks_pre_change(sender, instance, raw=False, **kwargs):
+    if not raw and instance.pk:
+        old_config = BlogConfig.objects.filter(pk=instance.pk).first()
+        instance._old_url_patterns = old_config.url_patterns if old_config else None
+
+
+@receiver(post_save, sender=BlogConfig)
+@receiver(post_delete, sender=BlogConfig)
+def config_permalink_roots_change(sender, instance, **kwargs):
+    _permalink_roots.clear()
+
+
+@receiver(post_save, sender=BlogConfig)
+def config_permalinks_change(sender, instance, raw=False, created=False, **kwargs):
+    if not raw and not created and getattr(instance, "_old_url_patterns", None) != instance.url_patterns:
+        update_post_permalinks(Post.objects.filter(app_config=instance))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=BlogConfig)
+def pregenerated_files_change(sender, instance, raw=False, **kwargs):
+    if not raw and get_setting("PREGENERATE_ON_CHANGE"):
+        namespace = instance.namespace if sender is BlogConfig else getattr(instance.app_config, "namespace", None)
+        if namespace:
+            mark_pregenerated_changed(namespace)
+
+
+@receiver(post_save, sender=Post)
+def post_instant_article_change(sender, instance, raw=False, **kwargs):
+    if not raw and get_setting("FEED_INSTANT_PRERENDER_WORKERS"):
+        from .feeds import schedule_instant_articles
+
+        # translations are saved after the post
+        transaction.on_commit(partial(schedule_instant_articles, [instance.pk]))
+
+
+@receiver(post_placeholder_operation)
+def post_content_instant_article_change(sender, **kwargs):
+    if get_setting("FEED_INSTANT_PRERENDER_WORKERS"):
+        from .feeds import schedule_instant_articles
+
+        placeholders = [value.pk for value in kwargs.values() if isinstance(value, Placeholder)]
+        post_ids = list(Post.objects.filter(content__in=placeholders).values_list("pk", flat=True))
+        if post_ids:
+            transaction.on_commit(partial(schedule_instant_articles, post_ids))
+
+
+def bump_post_detail_versions(post_ids):
+    """
+    Invalidate the cached detail pages of the given posts and of the posts listing them as related posts.
+    """
+    related = Post.related.through.objects.filter(to_post__in=post_ids).values_list("from_post", flat=True)
+    bump_post_versions(set(post_ids).union(related))
+
+
+@receiver(post_save, sender=Post)
+@receiver(pre_delete, sender=Post)
+@receiver(post_save, sender=Post._parler_meta.root_model)
+@receiver(post_delete, sender=Post._parler_meta.root_model)
+def post_detail_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        post_id = instance.master_id if sender is Post._parler_meta.root_model else instance.pk
+        bump_post_detail_versions([post_id])
+
+
+#: post fields of the relations displayed in the post detail page
+DETAIL_RELATIONS = {
+    Post.related.through: "related",
+    Post.tags.through: "tags",
+    Post.categories.through: "categories",
+}
+
+
+@receiver(m2m_changed, sender=Post.related.through)
+@receiver(m2m_changed, sender=Post.tags.through)
+@receiver(m2m_changed, sender=Post.categories.through)
+def post_detail_relations_change(sender, instance, action, reverse, model, pk_set, **kwargs):
+    # tags through model is shared with the other tagged models
+    if not (isinstance(instance, Post) or model is Post):
+        return
+    if reverse and action == "pre_clear":
+        instance._cleared_detail_posts = list(
+            Post.objects.filter(**{DETAIL_RELATIONS[sender]: instance}).values_list("pk", flat=True)
+        )
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        post_ids = [instance.pk]
+    elif action == "post_clear":
+        post_ids = getattr(instance, "_cleared_detail_posts", [])
+    else:
+        post_ids = pk_set
+    bump_post_versions(post_ids)
+
+
+@receiver(post_save, sender=BlogCategory)
+@receiver(post_save, sender=BlogCategory._parler_meta.root_model)
+@receiver(post_save, sender=Tag)
+def post_detail_labels_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if sender is BlogCategory._parler_meta.root_model:
+        bump_post_versions(Post.objects.filter(categories=instance.master_id).values_list("pk", flat=True))
+    elif sender is BlogCategory:
+        bump_post_versions(Post.objects.filter(categories=instance).values_list("pk", flat=True))
+    else:
+        bump_post_versions(Post.objects.filter(tags=instance).values_list("pk", flat=True))
+
+
+@receiver(post_save, sender=BlogConfig)
+def config_detail_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump_post_versions(Post.objects.filter(app_config=instance).values_list("pk", flat=True))
+
+
+@receiver(post_placeholder_operation)
+def post_detail_content_change(sender, **kwargs):
+    placeholders = [value.pk for value in kwargs.values() if isinstance(value, Placeholder)]
+    if placeholders:
+        bump_post_versions(
+            Post.objects.filter(
+                models.Q(content__in=placeholders)
+                | models.Q(media__in=placeholders)
+                | models.Q(liveblog__in=placeholders)
+            ).values_list("pk", flat=True)
+        )
@@ -0,0 +1,222 @@
+from collections.abc import Sequence
+
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, InvalidPage, PageNotAnInteger
+from django.db import models
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_bytes, force_str
+from django.utils.functional import cached_property
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+from django.utils.translation import gettext_lazy as _
+
+from . import caching
+
+
+class KeysetPage(Sequence):
+    """
+    Page of a :py:class:`KeysetPaginator`.
+
+    Instead of the page number, the page is identified by the cursor of its first / last item.
+    """
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.next_url = None
+        self.previous_url = None
+
+    def __repr__(self):
+        return "<Keyset page of %s items>" % len(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self.has_previous() or self.has_next()
+
+    @property
+    def next_cursor(self):
+        if self.has_next():
+            return self.paginator.get_cursor(self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if self.has_previous():
+            return self.paginator.get_cursor(self.object_list[0])
+
+
+class KeysetPaginator:
+    """
+    Paginate a post queryset using a ``(date_published, pk)`` cursor.
+
+    Each page is fetched with an indexed range filter on the cursor, so the cost of loading a page does
+    not depend on its position.
+    Total count is not needed to build the pages: it's only computed when requested, and cached if
+    ``count_cache_key`` is provided.
+    """
+
+    keyset = True
+    date_field = "date_published"
+
+    def __init__(self, object_list, per_page, count_cache_key=None, count_timeout=None):
+        # items without date (only visible in edit mode) are sorted last
+        self.object_list = object_list.order_by(models.F(self.date_field).desc(nulls_last=True), "-pk")
+        self.per_page = int(per_page)
+        self.count_cache_key = count_cache_key
+        self.count_timeout = count_timeout
+
+    def get_cursor(self, item):
+        """
+        Encode the cursor of the given item.
+        """
+        date = getattr(item, self.date_field)
+        return force_str(urlsafe_base64_encode(force_bytes("{}|{}".format(date.isoformat() if date else "", item.pk))))
+
+    def parse_cursor(self, cursor):
+        """
+        Decode the given cursor.
+
+        :raise InvalidPage: if the cursor is not valid
+        """
+        try:
+            date, pk = force_str(urlsafe_base64_decode(cursor)).split("|")
+            parsed_date = parse_datetime(date) if date else None
+            pk = int(pk)
+        except (TypeError, ValueError):
+            raise InvalidPage(_("Invalid cursor"))
+        if date and not parsed_date:
+            raise InvalidPage(_("Invalid cursor"))
+        return parsed_date, pk
+
+    def get_seek_filter(self, date, pk, lookup):
+        """
+        Return the filter on the ``(date, pk)`` columns selecting the items after (``lookup="lt"``) or before
+        (``lookup="gt"``) the given cursor.
+        """
+        field = self.date_field
+        if date is None:
+            seek = models.Q(**{"%s__isnull" % field: True, "pk__%s" % lookup: pk})
+            if lookup == "gt":
+                seek |= models.Q(**{"%s__isnull" % field: False})
+            return seek
+        seek = models.Q(**{"{}__{}".format(field, lookup): date}) | models.Q(**{field: date, "pk__%s" % lookup: pk})
+        if lookup == "lt":
+            seek |= models.Q(**{"%s__isnull" % field: True})
+        return seek
+
+    def page(self, after=None, before=None):
+        """
+        Return the page following the ``after`` cursor or preceding the ``before`` cursor (the first page if none
+        is provided).
+        """
+        queryset = self.object_list
+        if before:
+            queryset = queryset.filter(self.get_seek_filter(*self.parse_cursor(before), lookup="gt")).order_by(
+                models.F(self.date_field).asc(nulls_first=True), "pk"
+            )
+        elif after:
+            queryset = queryset.filter(self.get_seek_filter(*self.parse_cursor(after), lookup="lt"))
+        items = list(queryset[: self.per_page + 1])
+        has_more = len(items) > self.per_page
+        items = items[: self.per_page]
+        if before:
+            items.reverse()
+            return KeysetPage(items, self, has_next=True, has_previous=has_more)
+        return KeysetPage(items, self, has_next=has_more, has_previous=bool(after))
+
+    @cached_property
+    def count(self):
+        """
+        Return the total number of objects (cached if ``count_cache_key`` is set).
+        """
+        if not self.count_cache_key:
+            return self.object_list.count()
+        count = cache.get(self.count_cache_key)
+        if count is None:
+            count = self.object_list.count()
+            cache.set(self.count_cache_key, count, timeout=self.count_timeout)
+        return count
+
+
+class IdRangePaginator:
+    """
+    Paginate a queryset by primary key ranges.
+
+    Page boundaries are computed by streaming the primary keys only, then each page is fetched with an indexed
+    range filter, so that neither the items nor their ids are held in memory.
+    Boundaries are cached if ``boundaries_cache_key`` is provided.
+    """
+
+    def __init__(
+        self, object_list, per_page, boundaries_cache_key=None, boundaries_timeout=None, boundaries_version=None
+    ):
+        self.object_list = object_list.order_by("pk")
+        self.per_page = int(per_page)
+        self.boundaries_cache_key = boundaries_cache_key
+        self.boundaries_timeout = boundaries_timeout
+        self.boundaries_version = boundaries_version
+
+    def get_boundaries(self):
+        """
+        Compute the first primary key of each page.
+        """
+        boundaries = []
+        for index, pk in enumerate(self.object_list.values_list("pk", flat=True).iterator()):
+            if not index % self.per_page:
+                boundaries.append(pk)
+        return boundaries
+
+    @cached_property
+    def boundaries(self):
+        """
+        First primary key of each page (cached if ``boundaries_cache_key`` is set).
+
+        See :py:func:`djangocms_blog.caching.get_or_set` for ``boundaries_timeout`` and ``boundaries_version``.
+        """
+        if not self.boundaries_cache_key:
+            return self.get_boundaries()
+        return caching.get_or_set(
+            self.boundaries_cache_key, self.get_boundaries, self.boundaries_timeout, self.boundaries_version
+        )
+
+    @property
+    def num_pages(self):
+        return len(self.boundaries) or 1
+
+    def validate_number(self, number):
+        """
+        Validate the given 1-based page number.
+
+        :raise PageNotAnInteger: if the number is not an integer
+        :raise EmptyPage: if the page does not exist
+        """
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(_("That page number is not an integer"))
+        if number < 1 or number > self.num_pages:
+            raise EmptyPage(_("That page contains no results"))
+        return number
+
+    def page(self, number):
+        """
+        Return the queryset of the given 1-based page.
+        """
+        number = self.validate_number(number)
+        if not self.boundaries:
+            return self.object_list.none()
+        queryset = self.object_list.filter(pk__gte=self.boundaries[number - 1])
+        if number < len(self.boundaries):
+            queryset = queryset.filter(pk__lt=self.boundaries[number])
+        return queryset
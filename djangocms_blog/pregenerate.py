@@ -0,0 +1,301 @@
+import gzip
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from io import BytesIO
+from uuid import uuid4
+
+import django
+from cms.utils import get_language_list
+from django.conf import settings
+from django.contrib.sites.models import Site
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.handlers.base import BaseHandler
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import connections
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.urls import NoReverseMatch, reverse
+from django.utils.module_loading import import_string
+from django.utils.translation import override
+
+from .cms_appconfig import BlogConfig
+from .settings import get_setting
+
+try:
+    from django.contrib.sitemaps.views import SitemapIndexItem
+except ImportError:  # pragma: no cover
+    SitemapIndexItem = None
+
+#: Feed files rendered for each apphook config and language, and the corresponding url names
+FEEDS = {
+    "feed.xml": "posts-latest-feed",
+    "instant-articles.xml": "posts-latest-feed-fb",
+}
+SITEMAP_INDEX = "sitemap.xml"
+SITEMAP_PAGE = re.compile(r"^sitemap-(\d+)\.xml$")
+CHANGED_CACHE_KEY = "djangocms-blog:pregenerate-changed:{}:{}"
+
+
+def get_storage():
+    """
+    Return the storage of the pre-generated files.
+    """
+    if get_setting("PREGENERATED_STORAGE"):
+        return import_string(get_setting("PREGENERATED_STORAGE"))()
+    return default_storage
+
+
+def get_file_name(site_id, path):
+    """
+    Return the storage name of the given pre-generated file.
+
+    :param site_id: site id
+    :param path: file path relative to the site directory
+    """
+    return "{}/{}/{}".format(get_setting("PREGENERATED_ROOT"), site_id, path)
+
+
+def get_targets(namespaces=None, languages=None, site_id=None):
+    """
+    Return the ``(namespace, language)`` pairs of the apphook configs attached to a page.
+    """
+    targets = []
+    for app_config in BlogConfig.objects.order_by("namespace"):
+        if namespaces and app_config.namespace not in namespaces:
+            continue
+        for language in get_language_list(site_id):
+            if languages and language not in languages:
+                continue
+            try:
+                with override(language):
+                    reverse("%s:posts-latest" % app_config.namespace)
+            except NoReverseMatch:
+                continue
+            targets.append((app_config.namespace, language))
+    return targets
+
+
+def mark_changed(namespace):
+    """
+    Mark the pre-generated files of the given namespace as outdated in all the languages.
+    """
+    # each change stores a new mark, so that changes made while the files are generated are not cleared
+    mark = uuid4().hex
+    cache.set_many(
+        {CHANGED_CACHE_KEY.format(namespace, language): mark for language, __ in settings.LANGUAGES}, timeout=None
+    )
+
+
+def get_changed(targets):
+    """
+    Return the outdated targets out of the given ones.
+
+    :return: dictionary of target: outdated mark, to be passed to :py:func:`clear_changed`
+    """
+    keys = {CHANGED_CACHE_KEY.format(*target): target for target in targets}
+    return {keys[key]: mark for key, mark in cache.get_many(keys.keys()).items()}
+
+
+def clear_changed(changed):
+    """
+    Clear the outdated status of the given targets, unless they have been marked as outdated again meanwhile.
+
+    :param changed: dictionary of target: outdated mark, as returned by :py:func:`get_changed`
+    """
+    keys = {CHANGED_CACHE_KEY.format(*target): mark for target, mark in changed.items()}
+    current = cache.get_many(keys.keys())
+    cache.delete_many([key for key, mark in keys.items() if current.get(key) == mark])
+
+
+class CallbackHandler(BaseHandler):
+    """
+    Request handler calling the request ``callback`` instead of the view resolved from the urlconf.
+    """
+
+    def _get_response(self, request):
+        request.callback_result = request.callback(request)
+        return HttpResponse()
+
+
+@lru_cache(maxsize=None)
+def _get_handler(handler_class=BaseHandler):
+    handler = handler_class()
+    handler.load_middleware()
+    return handler
+
+
+def get_request(path, site, protocol="https"):
+    """
+    Build a GET request of an anonymous user for the given URL path.
+    """
+    return WSGIRequest(
+        {
+            "REQUEST_METHOD": "GET",
+            "PATH_INFO": path,
+            "SCRIPT_NAME": "",
+            "SERVER_NAME": site.domain,
+            "SERVER_PORT": "443" if protocol == "https" else "80",
+            "HTTP_HOST": site.domain,
+            "wsgi.url_scheme": protocol,
+            "wsgi.input": BytesIO(),
+        }
+    )
+
+
+def render_url(path, site, protocol="https"):
+    """
+    Render the given URL path through the whole middleware stack, as a GET request of an anonymous user.
+
+    :return: response content or ``None`` if the response is not successful
+    """
+    response = _get_handler().get_response(get_request(path, site, protocol))
+    if response.status_code == 200:
+        return response.content
+
+
+def run_in_request(path, site, callback, protocol="https"):
+    """
+    Call ``callback(request)`` with a GET request of an anonymous user for the given URL path, once processed by
+    the middlewares (e.g.: to render a view which is not in the urlconf).
+
+    :return: callback result or ``None`` if the callback fails
+    """
+    request = get_request(path, site, protocol)
+    request.callback = callback
+    _get_handler(CallbackHandler).get_response(request)
+    return getattr(request, "callback_result", None)
+
+
+def write_file(storage, name, content):
+    """
+    Write the given content and its gzipped variant (``.gz`` suffix) to the storage.
+
+    Files are written to a temporary name, then renamed to replace the previous version, so that they are never
+    served missing or partially written. Storages without local paths don't support renames: the previous version is
+    deleted before the new one is saved.
+    """
+    for file_name, data in ((name, content), (name + ".gz", gzip.compress(content, mtime=0))):
+        try:
+            path = storage.path(file_name)
+        except NotImplementedError:
+            if storage.exists(file_name):
+                storage.delete(file_name)
+            storage.save(file_name, ContentFile(data))
+        else:
+            temp_name = storage.save("{}.{}.tmp".format(file_name, uuid4().hex), ContentFile(data))
+            os.replace(storage.path(temp_name), path)
+
+
+def get_file_url(storage, site, path, protocol="https"):
+    """
+    Return the absolute URL of a pre-generated file.
+
+    Files are served by the ``djangocms_blog-pregenerated`` view if available in the urlconf, by the storage
+    otherwise.
+    """
+    try:
+        url = reverse("djangocms_blog-pregenerated", kwargs={"path": path})
+    except NoReverseMatch:
+        url = storage.url(get_file_name(site.pk, path))
+    if url.startswith("/"):
+        url = "{}://{}{}".format(protocol, site.domain, url)
+    return url
+
+
+def generate_target(namespace, language, site_id, protocol="https"):
+    """
+    Render the feeds and the sitemap pages of the given namespace and language.
+
+    :return: list of the written file paths (relative to the site directory)
+    """
+    from .sitemaps import BlogConfigSitemap
+
+    storage = get_storage()
+    site = Site.objects.get(pk=site_id)
+    directory = "{}/{}".format(namespace, language)
+    written = []
+    with override(language):
+        for name, url_name in FEEDS.items():
+            content = render_url(reverse("{}:{}".format(namespace, url_name)), site, protocol)
+            if content is not None:
+                write_file(storage, get_file_name(site_id, "{}/{}".format(directory, name)), content)
+                written.append("{}/{}".format(directory, name))
+        sitemap = BlogConfigSitemap(BlogConfig.objects.get(namespace=namespace), language)
+        for page in range(1, sitemap.paginator.num_pages + 1):
+            content = render_to_string("sitemap.xml", {"urlset": sitemap.get_urls(page, site, protocol)})
+            path = "{}/sitemap-{}.xml".format(directory, page)
+            write_file(storage, get_file_name(site_id, path), content.encode("utf-8"))
+            written.append(path)
+    # remove pages left over by previous runs
+    if storage.exists(get_file_name(site_id, directory)):
+        for name in storage.listdir(get_file_name(site_id, directory))[1]:
+            match = SITEMAP_PAGE.match(name.replace(".gz", ""))
+            if match and int(match.group(1)) > sitemap.paginator.num_pages:
+                storage.delete(get_file_name(site_id, "{}/{}".format(directory, name)))
+    return written
+
+
+def _generate_target(args):
+    return generate_target(*args)
+
+
+def generate_index(site_id, protocol="https"):
+    """
+    Render the sitemap index of the pre-generated sitemap pages of all the targets.
+
+    :return: the sitemap index path (relative to the site directory)
+    """
+    storage = get_storage()
+    site = Site.objects.get(pk=site_id)
+    sitemaps = []
+    for namespace, language in get_targets(site_id=site_id):
+        directory = "{}/{}".format(namespace, language)
+        if not storage.exists(get_file_name(site_id, directory)):
+            continue
+        pages = []
+        for name in storage.listdir(get_file_name(site_id, directory))[1]:
+            match = SITEMAP_PAGE.match(name)
+            if match:
+                pages.append(int(match.group(1)))
+        for page in sorted(pages):
+            url = get_file_url(storage, site, "{}/sitemap-{}.xml".format(directory, page), protocol)
+            sitemaps.append(SitemapIndexItem(url, None) if SitemapIndexItem else url)
+    content = render_to_string("sitemap_index.xml", {"sitemaps": sitemaps})
+    write_file(storage, get_file_name(site_id, SITEMAP_INDEX), content.encode("utf-8"))
+    return SITEMAP_INDEX
+
+
+def pregenerate(namespaces=None, languages=None, changed=False, workers=1, protocol="https"):
+    """
+    Render the sitemaps and the feeds of the current site to the storage.
+
+    :param namespaces: only render the given apphook namespaces
+    :param languages: only render the given languages
+    :param changed: only render the namespaces and languages marked as outdated (see :py:func:`mark_changed`)
+    :param workers: number of worker processes (namespaces and languages are rendered in parallel)
+    :param protocol: protocol of the URLs
+    :return: list of the written file paths (relative to the site directory)
+    """
+    site_id = Site.objects.get_current().pk
+    targets = get_targets(namespaces, languages, site_id)
+    if changed:
+        marks = get_changed(targets)
+        targets = [target for target in targets if target in marks]
+    jobs = [(namespace, language, site_id, protocol) for namespace, language in targets]
+    if workers > 1 and len(jobs) > 1:
+        # database connections can't be shared with the worker processes
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as executor:
+            results = list(executor.map(_generate_target, jobs))
+    else:
+        results = [_generate_target(job) for job in jobs]
+    written = [path for paths in results for path in paths]
+    written.append(generate_index(site_id, protocol))
+    if changed:
+        # outdated status is kept if the generation fails
+        clear_changed(marks)
+    return written
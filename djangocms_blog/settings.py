@@ -122,6 +122,64 @@ BLOG_PAGINATION = 10
 Number of post per page.
 """
 
+BLOG_KEYSET_PAGINATION = False
+"""
+.. _KEYSET_PAGINATION:
+
+Default value for the per-apphook keyset pagination: if enabled list views are paginated using a
+``(date_published, pk)`` cursor instead of the page number.
+"""
+
+BLOG_PAGINATION_COUNT_CACHE_TIMEOUT = 300
+"""
+.. _PAGINATION_COUNT_CACHE_TIMEOUT:
+
+Cache timeout for the total number of items in list views when using keyset pagination.
+"""
+
+BLOG_LIST_CONDITIONAL_GET = False
+"""
+.. _LIST_CONDITIONAL_GET:
+
+Add ``ETag`` and ``Last-Modified`` headers to the post list views (latest, category, tag, author and archive)
+served to anonymous users, and answer conditional requests with ``304 Not Modified`` before the page queries are run.
+
+Validators only depend on the posts in the list: other content of the page (e.g.: static placeholders) is not
+taken into account.
+"""
+
+BLOG_DETAIL_CACHE = False
+"""
+.. _DETAIL_CACHE:
+
+Default value for the per-apphook post detail cache: if enabled, post detail responses to anonymous users are cached
+until the post, its related posts, categories, tags or placeholders content change.
+"""
+
+BLOG_DETAIL_CACHE_TIMEOUT = 3600
+"""
+.. _DETAIL_CACHE_TIMEOUT:
+
+Cache timeout for the post detail responses (see :ref:`DETAIL_CACHE <DETAIL_CACHE>`).
+"""
+
+BLOG_OPTIMIZE_PROFILES = {}
+"""
+.. _OPTIMIZE_PROFILES:
+
+``select_related`` / ``prefetch_related`` lookups applied to the posts loaded by the views and the plugins, to be
+merged with the default profiles (see ``djangocms_blog.models.OPTIMIZE_PROFILES``).
+
+Keys are the profile names (``list`` for the list views, ``detail`` for the post detail view, ``plugin`` for the
+plugins), optionally followed by the template folder (e.g.: ``plugin:plugins``, ``list:djangocms_blog``) to
+target custom templates; values are dictionaries with the ``select_related`` and ``prefetch_related`` lookups.
+
+In ``prefetch_related``, the ``:counts`` suffix annotates the categories with their published posts count, to avoid
+a query per category in templates using ``category.count`` (e.g.: ``categories:counts``), the ``:active`` suffix
+restricts the translations to the current language and its fallbacks (e.g.: ``translations:active``), and a relation
+must come before its nested lookups (e.g.: ``categories`` before ``categories__translations``).
+"""
+
 BLOG_LATEST_POSTS = 5
 """
 .. _LATEST_POSTS:
@@ -431,6 +489,16 @@ BLOG_SITEMAP_CHANGEFREQ_DEFAULT = "monthly"
 Default changefreq for sitemap items.
 """
 
+BLOG_SITEMAP_CACHE_TIMEOUT = 3600
+"""
+.. _SITEMAP_CACHE_TIMEOUT:
+
+Cache timeout for the page boundaries of the paginated sitemap sections.
+
+Boundaries are cached per namespace, language and site: cache is invalidated when posts change and expires when the
+next post is published or unpublished. Set to ``0`` to compute them on each request.
+"""
+
 BLOG_ABSTRACT_CKEDITOR = True
 """
 .. _ABSTRACT_CKEDITOR:
@@ -553,11 +621,73 @@ BLOG_FEATURED_POSTS_PLUGIN_NAME_CACHED = _("Featured Posts - Cache")
 Name of the plugin showing the selected posts (cached version).
 """
 
+BLOG_PUBLICATION_TIME_BUCKET = 0
+"""
+.. _PUBLICATION_TIME_BUCKET:
+
+Size (in seconds) of the time buckets used as reference time when filtering published posts.
+
+If set (e.g.: to ``60``), the current time is truncated to the bucket size, so that the queries on published posts
+are identical within the same bucket and can be cached; posts are then published / unpublished with a delay up to
+the bucket size.
+The list of the latest published posts is cached for the duration of the bucket.
+"""
+
+BLOG_ARCHIVE_DB_AGGREGATION = False
+"""
+.. _ARCHIVE_DB_AGGREGATION:
+
+Group and count posts by month in the database when building the archive (e.g.: in the archive plugin).
+
+Months are computed in the current timezone: on MySQL this requires the timezone definitions to be loaded
+in the database.
+"""
+
+BLOG_ARCHIVE_COUNTERS = False
+"""
+.. _ARCHIVE_COUNTERS:
+
+Read the archive months (e.g.: in the archive plugin) from the :py:class:`djangocms_blog.models.ArchiveMonth`
+counters instead of scanning the posts table.
+
+Counters are updated when posts are saved or deleted; run the ``rebuild_blog_archive`` management command
+when enabling it on an existing database, and after a cache flush if posts are scheduled to be published or
+unpublished.
+"""
+
+BLOG_CACHE_STALE_TIMEOUT = 60
+"""
+.. _CACHE_STALE_TIMEOUT:
+
+Time (in seconds) expired or invalidated cache entries (feeds, feed items content, latest posts) are kept and served
+by concurrent requests while a single request recomputes them.
+"""
+
+BLOG_CACHE_LOCK_TIMEOUT = 10
+"""
+.. _CACHE_LOCK_TIMEOUT:
+
+Maximum time (in seconds) a request holds the lock to recompute a cache entry; concurrent requests wait up to the
+same time for an entry missing from the cache before computing it themselves.
+"""
+
+BLOG_CACHE_XFETCH_BETA = 1.0
+"""
+.. _CACHE_XFETCH_BETA:
+
+Scaling factor of the probabilistic early recomputation of cache entries: entries are recomputed before they expire
+with a probability increasing with the time needed to compute them. Higher values recompute earlier, ``0``
+disables early recomputation.
+"""
+
 BLOG_FEED_CACHE_TIMEOUT = 3600
 """
 .. _FEED_CACHE_TIMEOUT:
 
 Cache timeout for RSS feeds.
+
+Whole feed responses are cached per namespace, language, site and tag: cache is invalidated when posts change and
+expires when the next post is published or unpublished. Set to ``0`` to disable the feeds cache.
 """
 
 BLOG_FEED_INSTANT_ITEMS = 50
@@ -567,6 +697,27 @@ BLOG_FEED_INSTANT_ITEMS = 50
 Number of items in Instant Article feed.
 """
 
+BLOG_FEED_INSTANT_PRERENDER_WORKERS = 0
+"""
+.. _FEED_INSTANT_PRERENDER_WORKERS:
+
+Number of background threads rendering the Instant Article content of the posts when they are saved, so that the
+Instant Article feed does not have to render them.
+
+Set to ``0`` to disable the pre-rendering: content is then rendered by the feed and cached for
+``BLOG_FEED_CACHE_TIMEOUT``.
+"""
+
+BLOG_FEED_INSTANT_RENDER_WORKERS = 1
+"""
+.. _FEED_INSTANT_RENDER_WORKERS:
+
+Maximum number of threads rendering the Instant Article content of the feed items missing from the cache.
+
+By default items are rendered sequentially; threads (each with its own database connection and anonymous request)
+only speed up the rendering when it's dominated by database or cache latency, not by template rendering.
+"""
+
 BLOG_FEED_LATEST_ITEMS = 10
 """
 .. _FEED_LATEST_ITEMS:
@@ -581,6 +732,29 @@ BLOG_FEED_TAGS_ITEMS = 10
 Number of items in per tags feed.
 """
 
+BLOG_PREGENERATED_STORAGE = None
+"""
+.. _PREGENERATED_STORAGE:
+
+Dotted path of the storage class where the ``pregenerate_blog_files`` management command writes sitemaps and feeds
+(default: the ``default`` storage).
+"""
+
+BLOG_PREGENERATED_ROOT = "djangocms_blog"
+"""
+.. _PREGENERATED_ROOT:
+
+Storage directory of the pre-generated sitemaps and feeds.
+"""
+
+BLOG_PREGENERATE_ON_CHANGE = False
+"""
+.. _PREGENERATE_ON_CHANGE:
+
+Track the apphook configs and languages whose pre-generated files are outdated when posts are changed, so that
+``pregenerate_blog_files --changed`` only renders them.
+"""
+
 BLOG_LIVEBLOG_PLUGINS = ("LiveblogPlugin",)
 """
 .. _LIVEBLOG_PLUGINS:
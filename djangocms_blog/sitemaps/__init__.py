@@ -1,9 +1,17 @@
+from collections.abc import Mapping
+
 from cms.utils import get_language_list
 from django.contrib.sitemaps import Sitemap
-from django.urls.exceptions import NoReverseMatch
+from django.contrib.sites.models import Site
+from django.db.models import Max
+from django.utils.functional import cached_property
+from django.utils.timezone import now
 from parler.utils.context import smart_override
 
-from ..models import Post
+from ..cms_appconfig import BlogConfig
+from ..managers import get_published_version
+from ..models import Post, PostUrlResolver
+from ..pagination import IdRangePaginator
 from ..settings import get_setting
 
 
@@ -31,21 +39,150 @@ class BlogSitemap(Sitemap):
         self.url_cache.clear()
         for lang in get_language_list():
             self.url_cache[lang] = {}
-            posts = Post.objects.translated(lang).language(lang).published()
+            posts = list(
+                Post.objects.translated(lang)
+                .language(lang)
+                .published()
+                .select_related("app_config")
+                .prefetch_related("translations")
+            )
+            # posts without a url (e.g. published in an app config not attached to any page) are skipped
+            urls = PostUrlResolver(lang).get_urls(posts)
             for post in posts:
-                # check if the post actually has a url before appending
-                # if a post is published but the associated app config is not
-                # then this post will not have a url
-                try:
-                    with smart_override(post.get_current_language()):
-                        self.url_cache[lang][post] = post.get_absolute_url()
-                except NoReverseMatch:
-                    # couldn't determine the url of the post so pass on it
-                    continue
-
-                items.append(post)
+                if post.pk in urls:
+                    self.url_cache[lang][post] = urls[post.pk]
+                    items.append(post)
 
         return items
 
     def lastmod(self, obj):
         return obj.date_modified
+
+
+class BlogConfigSitemap(Sitemap):
+    """
+    Sitemap of the published posts of a single apphook config in a single language.
+
+    Posts are paginated by id range and streamed as ``values()`` rows, so memory usage only depends on the
+    page size (``limit``), not on the number of posts.
+    """
+
+    def __init__(self, app_config, language):
+        self.app_config = app_config
+        self.language = language
+        self.priority = app_config.sitemap_priority
+        self.changefreq = app_config.sitemap_changefreq
+        self.resolver = PostUrlResolver(language)
+
+    def get_queryset(self):
+        return Post.objects.namespace(self.app_config.namespace).translated(self.language).published()
+
+    def items(self):
+        return self.get_queryset()
+
+    @cached_property
+    def paginator(self):
+        if not get_setting("SITEMAP_CACHE_TIMEOUT"):
+            return IdRangePaginator(self.items(), self.limit)
+        return IdRangePaginator(
+            self.items(),
+            self.limit,
+            boundaries_cache_key=self.get_boundaries_cache_key(),
+            boundaries_timeout=self.get_cache_timeout,
+            boundaries_version=get_published_version(),
+        )
+
+    def get_boundaries_cache_key(self):
+        """
+        Cache key of the page boundaries of the section.
+        """
+        return "djangocms-blog:sitemap-boundaries:{}:{}:{}:{}".format(
+            self.app_config.namespace, self.language, Site.objects.get_current().pk, self.limit
+        )
+
+    def get_cache_timeout(self):
+        """
+        Cache timeout of the page boundaries: ``BLOG_SITEMAP_CACHE_TIMEOUT``, shortened to expire when the next post
+        is published or unpublished.
+        """
+        timeout = get_setting("SITEMAP_CACHE_TIMEOUT")
+        next_change = Post.objects.next_publication_change()
+        if timeout and next_change:
+            timeout = min(timeout, max(int((next_change - now()).total_seconds()) + 1, 1))
+        return timeout
+
+    def get_latest_lastmod(self):
+        return self.items().aggregate(lastmod=Max("date_modified"))["lastmod"]
+
+    def get_urls(self, page=1, site=None, protocol=None):
+        protocol = self.get_protocol(protocol)
+        domain = self.get_domain(site)
+        urls = []
+        latest_lastmod = None
+        fields, template = self.resolver.get_post_template(self.app_config, self.language)
+        posts = self.paginator.page(page)
+        if not template:
+            return urls
+        first_categories = {}
+        if "category" in fields:
+            first_categories = self.resolver.get_first_categories(posts.values("pk"))
+            self.resolver.fetch_categories(first_categories.values())
+        rows = posts.values_list("pk", "date_published", "date_created", "date_modified", "translations__slug")
+        for pk, date_published, date_created, date_modified, slug in rows.iterator():
+            category_slug = self.resolver.get_category_slug(first_categories.get(pk), self.language)
+            location = self.resolver.format_url(fields, template, date_published or date_created, slug, category_slug)
+            if not location:
+                continue
+            if not latest_lastmod or date_modified > latest_lastmod:
+                latest_lastmod = date_modified
+            urls.append(
+                {
+                    "item": pk,
+                    "location": "{}://{}{}".format(protocol, domain, location),
+                    "lastmod": date_modified,
+                    "changefreq": self.changefreq,
+                    "priority": str(self.priority if self.priority is not None else ""),
+                    "alternates": [],
+                }
+            )
+        if latest_lastmod:
+            self.latest_lastmod = latest_lastmod
+        return urls
+
+
+class BlogSitemaps(Mapping):
+    """
+    Sitemap sections for the ``django.contrib.sitemaps`` views: a :py:class:`BlogConfigSitemap` for each
+    apphook config attached to a page and each language.
+
+    Sections are computed when the mapping is accessed, so it can be safely used in the urlconf; other sitemaps can
+    be passed as keyword arguments to be included in the same sitemap index.
+    """
+
+    def __init__(self, **sitemaps):
+        self.sitemaps = sitemaps
+
+    def get_sections(self):
+        sections = dict(self.sitemaps)
+        for app_config in BlogConfig.objects.all():
+            for language in get_language_list():
+                sitemap = BlogConfigSitemap(app_config, language)
+                if sitemap.resolver.get_post_template(app_config, language)[1]:
+                    sections["blog-{}-{}".format(app_config.namespace, language)] = sitemap
+        return sections
+
+    def __getitem__(self, key):
+        return self.get_sections()[key]
+
+    def items(self):
+        return self.get_sections().items()
+
+    def __iter__(self):
+        return iter(self.get_sections())
+
+    def __len__(self):
+        return len(self.get_sections())
+
+    def __eq__(self, other):
+        # urlconf defaults are compared when reversing URLs: avoid computing the sections
+        return self is other
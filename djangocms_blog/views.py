@@ -1,18 +1,29 @@
+import hashlib
 import os.path
+from functools import partial
 
 from aldryn_apphooks_config.mixins import AppConfigMixin
 from django.apps import apps
 from django.contrib.auth import get_user_model
+from django.contrib.sites.shortcuts import get_current_site
+from django.core.cache import cache
 from django.core.exceptions import ImproperlyConfigured
-from django.http import Http404
+from django.core.paginator import InvalidPage
+from django.db.models import Count, Max
+from django.http import Http404, HttpResponse
 from django.shortcuts import get_object_or_404
 from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
 from django.utils.timezone import now
-from django.utils.translation import get_language
-from django.views.generic import DetailView, ListView
+from django.utils.translation import get_language, gettext as _
+from django.views.generic import DetailView, ListView, View
 from parler.views import TranslatableSlugMixin, ViewUrlMixin
 
-from .models import BlogCategory, Post
+from .managers import get_post_version, get_published_changed, get_published_version, get_reference_time
+from .models import BlogCategory, Post, optimize_queryset
+from .pagination import KeysetPaginator
+from .pregenerate import get_file_name, get_storage
 from .settings import get_setting
 
 User = get_user_model()
@@ -20,6 +31,8 @@ User = get_user_model()
 
 class BaseBlogView(AppConfigMixin, ViewUrlMixin):
     model = Post
+    #: Name of the optimization profile of the view posts (see :py:func:`djangocms_blog.models.optimize_queryset`)
+    optimize_profile = "list"
 
     def optimize(self, qs):
         """
@@ -27,9 +40,8 @@ class BaseBlogView(AppConfigMixin, ViewUrlMixin):
         :param qs: queryset to optimize
         :return: optimized queryset
         """
-        return qs.select_related("app_config").prefetch_related(
-            "translations", "categories", "categories__translations", "categories__app_config"
-        )
+        template_folder = (getattr(self, "config", None) and self.config.template_prefix) or "djangocms_blog"
+        return optimize_queryset(qs, self.optimize_profile, template_folder)
 
     def get_view_url(self):
         if not self.view_url_name:
@@ -50,6 +62,19 @@ class BaseBlogView(AppConfigMixin, ViewUrlMixin):
         template_path = (self.config and self.config.template_prefix) or "djangocms_blog"
         return os.path.join(template_path, self.base_template_name)
 
+    def is_public_request(self):
+        """
+        Check if the current request is a ``GET`` / ``HEAD`` request of an anonymous user without the toolbar, whose
+        response only depends on the blog content.
+        """
+        toolbar = getattr(self.request, "toolbar", None)
+        user = getattr(self.request, "user", None)
+        return (
+            self.request.method in ("GET", "HEAD")
+            and not (user and user.is_authenticated)
+            and not (toolbar and (toolbar.show_toolbar or toolbar.edit_mode_active))
+        )
+
 
 class BaseBlogListView(BaseBlogView):
     context_object_name = "post_list"
@@ -63,6 +88,95 @@ class BaseBlogListView(BaseBlogView):
     def get_paginate_by(self, queryset):
         return (self.config and self.config.paginate_by) or get_setting("PAGINATION")
 
+    def get_validators(self):
+        """
+        Return the ``ETag`` and the ``Last-Modified`` timestamp of the current list page.
+
+        They are computed from the number of posts in the list and their latest modification and publication dates
+        (plus the latest unpublication date in the namespace), with two aggregate queries. The published posts
+        version is included in both, as deleted or removed posts do not change the dates.
+        """
+        data = (
+            self.get_queryset()
+            .order_by()
+            .aggregate(
+                count=Count("pk", distinct=True), modified=Max("date_modified"), published=Max("date_published")
+            )
+        )
+        data["unpublished"] = (
+            self.model._default_manager.namespace(self.namespace)
+            .filter(date_published_end__lte=get_reference_time())
+            .aggregate(unpublished=Max("date_published_end"))["unpublished"]
+        )
+        dates = [date for date in (data["modified"], data["published"], data["unpublished"]) if date]
+        last_modified = max([int(date.timestamp()) for date in dates] + [get_published_changed()])
+        key = "{}:{}:{}:{}:{}".format(
+            get_published_version(),
+            get_language(),
+            self.request.build_absolute_uri(),
+            data["count"],
+            ":".join(str(date.timestamp()) for date in dates),
+        )
+        return quote_etag(hashlib.sha1(key.encode("utf-8")).hexdigest()), last_modified
+
+    def get(self, request, *args, **kwargs):
+        conditional = get_setting("LIST_CONDITIONAL_GET") and self.is_public_request()
+        if conditional:
+            # validators are checked before the page queries
+            etag, last_modified = self.get_validators()
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = super().get(request, *args, **kwargs)
+            if response.status_code in (200, 304):
+                response["ETag"] = etag
+                response["Last-Modified"] = http_date(last_modified)
+            return response
+        return super().get(request, *args, **kwargs)
+
+    def get_count_cache_key(self):
+        """
+        Cache key of the total number of items in the list used by keyset pagination.
+        """
+        edit_mode = getattr(self.request, "toolbar", None) and self.request.toolbar.edit_mode_active
+        return "djangocms-blog:count:{}:{}:{}:{}:{}:{}".format(
+            self.view_url_name,
+            self.namespace,
+            get_language(),
+            get_current_site(self.request).pk,
+            ",".join("{}={}".format(key, value) for key, value in sorted(self.kwargs.items())),
+            "edit" if edit_mode else "live",
+        )
+
+    def paginate_queryset(self, queryset, page_size):
+        """
+        Paginate the queryset using a :py:class:`djangocms_blog.pagination.KeysetPaginator` if enabled in the
+        apphook config, standard django pagination otherwise.
+        """
+        if not (self.config and self.config.keyset_pagination):
+            return super().paginate_queryset(queryset, page_size)
+        paginator = KeysetPaginator(
+            queryset,
+            page_size,
+            count_cache_key=self.get_count_cache_key(),
+            count_timeout=get_setting("PAGINATION_COUNT_CACHE_TIMEOUT"),
+        )
+        try:
+            page = paginator.page(after=self.request.GET.get("after"), before=self.request.GET.get("before"))
+        except InvalidPage as e:
+            raise Http404(_("Invalid page: %(message)s") % {"message": e})
+        if page.has_next():
+            page.next_url = self._get_cursor_url("after", page.next_cursor)
+        if page.has_previous():
+            page.previous_url = self._get_cursor_url("before", page.previous_cursor)
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    def _get_cursor_url(self, direction, cursor):
+        params = self.request.GET.copy()
+        params.pop("after", None)
+        params.pop("before", None)
+        params[direction] = cursor
+        return "?{}".format(params.urlencode())
+
 
 class PostDetailView(TranslatableSlugMixin, BaseBlogView, DetailView):
     context_object_name = "post"
@@ -70,6 +184,7 @@ class PostDetailView(TranslatableSlugMixin, BaseBlogView, DetailView):
     slug_field = "slug"
     view_url_name = "djangocms_blog:post-detail"
     instant_article = False
+    optimize_profile = "detail"
 
     def liveblog_enabled(self):
         return self.object.enable_liveblog and apps.is_installed("djangocms_blog.liveblog")
@@ -87,18 +202,122 @@ class PostDetailView(TranslatableSlugMixin, BaseBlogView, DetailView):
             queryset = queryset.published()
         return self.optimize(queryset.on_site())
 
+    def use_detail_cache(self):
+        """
+        Check if the response can be served from the detail cache: cache must be enabled in the apphook config and
+        the request must be a public one (see :py:meth:`BaseBlogView.is_public_request`) without query string.
+        """
+        return bool(
+            not self.instant_article
+            and self.config
+            and self.config.detail_cache
+            and not self.request.META.get("QUERY_STRING")
+            and self.is_public_request()
+        )
+
+    def get_detail_path_cache_key(self):
+        """
+        Cache key of the id and version of the post served at the current request path.
+        """
+        return "djangocms-blog:detail-path:{}:{}".format(
+            get_current_site(self.request).pk, hashlib.sha1(self.request.path.encode("utf-8")).hexdigest()
+        )
+
+    def get_detail_cache_key(self, post_id, version):
+        """
+        Cache key of the post detail response for the given post and post version.
+        """
+        return "djangocms-blog:detail:{}:{}:{}:{}".format(
+            post_id, get_language(), get_current_site(self.request).pk, version
+        )
+
+    def get_detail_cache_timeout(self):
+        """
+        Cache timeout of the post detail response: ``BLOG_DETAIL_CACHE_TIMEOUT``, shortened to expire when the post
+        is unpublished.
+        """
+        timeout = get_setting("DETAIL_CACHE_TIMEOUT")
+        end = self.object.date_published_end
+        if end and end > now():
+            timeout = min(timeout, int((end - now()).total_seconds()) + 1)
+        return timeout
+
+    def get_cached_response(self):
+        """
+        Return the cached response if still valid for the current post version, ``None`` otherwise.
+
+        Conditional requests are answered with ``304 Not Modified``.
+        """
+        entry = cache.get(self.get_detail_path_cache_key())
+        if entry is None:
+            return
+        post_id, version = entry
+        # the path is resolved again once the post changes, as it may no longer match its slug or permalink
+        if version != get_post_version(post_id):
+            return
+        cached = cache.get(self.get_detail_cache_key(post_id, version))
+        if not cached:
+            return
+        response = get_conditional_response(self.request, etag=cached["etag"], last_modified=cached["last_modified"])
+        if response is None:
+            response = HttpResponse(cached["content"], content_type=cached["content_type"])
+        response["ETag"] = cached["etag"]
+        response["Last-Modified"] = http_date(cached["last_modified"])
+        return response
+
+    def cache_response(self, version, response):
+        """
+        Store the rendered response in the detail cache, unless it depends on the user session.
+        """
+        if response.status_code != 200 or response.cookies or self.request.META.get("CSRF_COOKIE_USED"):
+            return
+        cached = {
+            "content": response.content,
+            "content_type": response["Content-Type"],
+            "etag": quote_etag(hashlib.sha1(response.content).hexdigest()),
+            "last_modified": int(self.object.date_modified.timestamp()),
+        }
+        cache.set_many(
+            {
+                self.get_detail_path_cache_key(): (self.object.pk, version),
+                self.get_detail_cache_key(self.object.pk, version): cached,
+            },
+            timeout=self.get_detail_cache_timeout(),
+        )
+        response["ETag"] = cached["etag"]
+        response["Last-Modified"] = http_date(cached["last_modified"])
+
     def get(self, *args, **kwargs):
+        use_cache = self.use_detail_cache()
+        if use_cache:
+            response = self.get_cached_response()
+            if response:
+                return response
         # submit object to cms to get corrent language switcher and selected category behavior
         if hasattr(self.request, "toolbar"):
             self.request.toolbar.set_object(self.get_object())
-        return super().get(*args, **kwargs)
+        response = super().get(*args, **kwargs)
+        if use_cache:
+            # version is read before rendering, so that changes made meanwhile invalidate the response
+            response.add_post_render_callback(partial(self.cache_response, get_post_version(self.object.pk)))
+        return response
+
+    def get_object(self, queryset=None):
+        """
+        Return the post of the current request, resolved only once for the toolbar, the view and the context.
+        """
+        if queryset is not None:
+            return super().get_object(queryset)
+        if getattr(self, "_object", None) is None:
+            self._object = super().get_object()
+        return self._object
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context["meta"] = self.get_object().as_meta()
+        context["meta"] = self.object.as_meta()
         context["instant_article"] = self.instant_article
         context["use_placeholder"] = get_setting("USE_PLACEHOLDER")
-        setattr(self.request, get_setting("CURRENT_POST_IDENTIFIER"), self.get_object())
+        setattr(self.request, get_setting("CURRENT_POST_IDENTIFIER"), self.object)
         return context
 
 
@@ -189,3 +408,39 @@ class CategoryEntriesView(BaseBlogListView, ListView):
         context = super().get_context_data(**kwargs)
         context["meta"] = self.category.as_meta()
         return context
+
+
+class PregeneratedFileView(View):
+    """
+    Serve the sitemaps and feeds written by the ``pregenerate_blog_files`` management command.
+
+    The gzipped variant is served to clients accepting it; ``ETag`` and ``Last-Modified`` headers are set, and
+    conditional requests are answered with ``304 Not Modified``.
+    """
+
+    def get_content_type(self, path):
+        if os.path.basename(path).startswith("sitemap"):
+            return "application/xml"
+        return "application/rss+xml; charset=utf-8"
+
+    def get(self, request, path):
+        storage = get_storage()
+        name = get_file_name(get_current_site(request).pk, path)
+        if ".." in path.split("/") or not storage.exists(name):
+            raise Http404(_("File not found"))
+        gzipped = "gzip" in request.META.get("HTTP_ACCEPT_ENCODING", "") and storage.exists(name + ".gz")
+        if gzipped:
+            name += ".gz"
+        with storage.open(name) as file:
+            content = file.read()
+        etag = quote_etag(hashlib.sha1(content).hexdigest())
+        last_modified = int(storage.get_modified_time(name).timestamp())
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = HttpResponse(content, content_type=self.get_content_type(path))
+            if gzipped:
+                response["Content-Encoding"] = "gzip"
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+        patch_vary_headers(response, ("Accept-Encoding",))
+        return response
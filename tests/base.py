@@ -1,11 +1,16 @@
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from copy import deepcopy
+from functools import partial
+from unittest.mock import patch
 
 from app_helper.base_test import BaseTestCase
 from django.contrib.auth import get_user_model
 from django.contrib.sites.models import Site
 from django.core.cache import cache
+from django.db import connections
 from menus.menu_pool import menu_pool
 from parler.utils.context import smart_override
 
@@ -20,6 +25,29 @@ def _get_cat_pk(lang, name):
     return lambda: BlogCategory.objects.language(lang).translated(lang, name=name).get().pk
 
 
+@contextmanager
+def shared_connection(target):
+    """
+    Share the test database connection with the threads of the ``ThreadPoolExecutor`` used by ``target``, so that
+    they can read the data created in the test transaction.
+
+    Test-only helper: test cases run in a transaction which is never committed, so the connections opened by the
+    threads (as they would in production) can't see the test data. The connection is used by several threads at once,
+    which the in-memory SQLite test database allows; it's not meant for other database backends.
+    """
+
+    def initializer(connection):
+        connections["default"] = connection
+
+    connection = connections["default"]
+    connection.inc_thread_sharing()
+    try:
+        with patch(target, partial(ThreadPoolExecutor, initializer=initializer, initargs=(connection,))):
+            yield
+    finally:
+        connection.dec_thread_sharing()
+
+
 class BaseTest(BaseTestCase):
     """
     Base class with utility function
@@ -4,8 +4,17 @@ from menus.menu_pool import menu_pool
 from parler.utils.context import smart_override, switch_language
 
 from djangocms_blog.cms_appconfig import BlogConfig
-from djangocms_blog.models import BlogCategory
-from djangocms_blog.settings import MENU_TYPE_CATEGORIES, MENU_TYPE_COMPLETE, MENU_TYPE_NONE, MENU_TYPE_POSTS
+from djangocms_blog.models import BlogCategory, Post
+from djangocms_blog.settings import (
+    MENU_TYPE_CATEGORIES,
+    MENU_TYPE_COMPLETE,
+    MENU_TYPE_NONE,
+    MENU_TYPE_POSTS,
+    PERMALINK_TYPE_CATEGORY,
+    PERMALINK_TYPE_FULL_DATE,
+    PERMALINK_TYPE_SHORT_DATE,
+    PERMALINK_TYPE_SLUG,
+)
 from djangocms_blog.views import CategoryEntriesView, PostDetailView
 
 from .base import BaseTest
@@ -84,6 +93,71 @@ class MenuTest(BaseTest):
             keys = CacheKey.objects.get_keys().distinct().values_list("key", flat=True)
             self.assertFalse(keys)
 
+    def test_menu_cache_invalidation(self):
+        """
+        Tests if only the affected menu caches are cleared on posts / categories changes
+        """
+        from django.core.cache import cache
+        from menus.models import CacheKey
+
+        pages = self.get_pages()
+        posts = self.get_posts()
+        self.reload_urlconf()
+
+        def build_menus():
+            for lang in ("en", "it"):
+                with smart_override(lang):
+                    request = self.get_page_request(pages[1], self.user, pages[1].get_absolute_url(lang), edit=True)
+                    self.get_nodes(menu_pool, request)
+
+        def cached(lang):
+            keys = CacheKey.objects.get_keys(language=lang).values_list("key", flat=True)
+            return bool(keys) and len(cache.get_many(keys)) == len(keys)
+
+        self._reset_menus()
+        build_menus()
+        self.assertTrue(cached("en"))
+        self.assertTrue(cached("it"))
+
+        # translation changes only clear their language
+        posts[0].set_current_language("it")
+        posts[0].title = "nuovo titolo"
+        posts[0].save_translations()
+        self.assertTrue(cached("en"))
+        self.assertFalse(cached("it"))
+
+        build_menus()
+        posts[0].save()
+        self.assertFalse(cached("en"))
+        self.assertFalse(cached("it"))
+
+        build_menus()
+        posts[0].categories.add(self.cats[1])
+        self.assertFalse(cached("en"))
+
+        build_menus()
+        self.cats[1].blog_posts.remove(posts[0])
+        self.assertFalse(cached("en"))
+
+        # posts visible on other sites only do not clear the current site menu
+        build_menus()
+        posts[1].sites.add(self.site_2)
+        self.assertFalse(cached("en"))
+        build_menus()
+        posts[1].save()
+        self.assertTrue(cached("en"))
+
+        # namespaces not attached to any page do not clear any menu
+        app_config_test = BlogConfig.objects.create(namespace="test_config")
+        build_menus()
+        Post.objects.language("en").create(title="Post in test config", app_config=app_config_test)
+        self.assertTrue(cached("en"))
+
+        # moving a post out of the namespace clears its menus
+        posts[0].app_config = app_config_test
+        posts[0].save()
+        self.assertFalse(cached("en"))
+
     def test_menu_nodes(self):
         """
         Tests if all categories are present in the menu
@@ -220,6 +294,65 @@ class MenuTest(BaseTest):
         self.app_config_2.save()
         self._reset_menus()
 
+    def test_menu_used_categories(self):
+        """
+        Tests if all the categories of the posts are used categories, not only the first one
+        """
+        self.get_pages()
+        posts = self.get_posts()
+        self.cats[1].blog_posts.add(posts[0])
+
+        self.app_config_1.app_data.config.menu_structure = MENU_TYPE_COMPLETE
+        self.app_config_1.app_data.config.menu_empty_categories = False
+        self.app_config_1.save()
+        request = self.get_page_request(None, self.user, r"/en/page-two/")
+        with smart_override("en"):
+            self._reset_menus()
+            nodes = self.get_nodes(menu_pool, request)
+            nodes_url = {node.url for node in nodes}
+            self.assertIn(self.cats[0].get_absolute_url(), nodes_url)
+            self.assertIn(self.cats[1].get_absolute_url(), nodes_url)
+            self.assertNotIn(self.cats[2].get_absolute_url(), nodes_url)
+            # the post is still a child of its first category only
+            post_node = [node for node in nodes if node.id == ("Post-%s" % posts[0].pk,)][0]
+            self.assertEqual(post_node.parent_id, "BlogCategory-%s" % self.cats[0].pk)
+        self.app_config_1.app_data.config.menu_empty_categories = True
+        self.app_config_1.save()
+        self._reset_menus()
+
+    def test_menu_nodes_urls(self):
+        """
+        Tests if nodes URLs match the posts and categories absolute URLs for all permalink styles
+        """
+        self.get_pages()
+        posts = self.get_posts()
+        self.cats[1].blog_posts.add(posts[1])
+
+        self.app_config_1.app_data.config.menu_structure = MENU_TYPE_COMPLETE
+        for permalink_type in (
+            PERMALINK_TYPE_FULL_DATE,
+            PERMALINK_TYPE_SHORT_DATE,
+            PERMALINK_TYPE_CATEGORY,
+            PERMALINK_TYPE_SLUG,
+        ):
+            self.app_config_1.app_data.config.url_patterns = permalink_type
+            self.app_config_1.save()
+            self.reload_urlconf()
+            for lang in ("en", "it"):
+                request = self.get_page_request(None, self.user, r"/%s/page-two/" % lang)
+                with smart_override(lang):
+                    self._reset_menus()
+                    nodes = self.get_nodes(menu_pool, request)
+                    nodes_url = {node.url for node in nodes}
+                    posts_url = {
+                        post.get_absolute_url(lang)
+                        for post in posts
+                        if post.has_translation(lang) and post.app_config == self.app_config_1
+                    }
+                    cats_url = {cat.get_absolute_url() for cat in self.cats if cat.has_translation(lang)}
+                    self.assertTrue(posts_url.issubset(nodes_url))
+                    self.assertTrue(cats_url.issubset(nodes_url))
+
     def test_modifier(self):
         """
         Tests if correct category is selected in the menu
@@ -1,8 +1,11 @@
 import re
+import time
 from contextlib import contextmanager
 from copy import deepcopy
 from datetime import timedelta
+from io import StringIO
 from unittest import SkipTest
+from unittest.mock import Mock, patch
 from urllib.parse import quote
 
 import parler
@@ -13,9 +16,13 @@ from django.contrib import admin
 from django.contrib.auth.models import AnonymousUser
 from django.contrib.messages.middleware import MessageMiddleware
 from django.contrib.sites.models import Site
+from django.core.cache import cache
 from django.core.handlers.base import BaseHandler
+from django.core.management import call_command
+from django.db import connection
 from django.http import QueryDict
 from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils.encoding import force_str
 from django.utils.html import strip_tags
@@ -29,9 +36,11 @@ from parler.utils.conf import add_default_language_settings
 from parler.utils.context import smart_override
 from taggit.models import Tag
 
+from djangocms_blog import caching
 from djangocms_blog.cms_appconfig import BlogConfig, BlogConfigForm
 from djangocms_blog.forms import CategoryAdminForm, PostAdminForm
-from djangocms_blog.models import BlogCategory, Post
+from djangocms_blog.managers import get_reference_time
+from djangocms_blog.models import ArchiveMonth, BlogCategory, Post, optimize_queryset
 from djangocms_blog.settings import MENU_TYPE_NONE, PERMALINK_TYPE_CATEGORY, PERMALINK_TYPE_FULL_DATE, get_setting
 
 from .base import BaseTest
@@ -870,6 +879,9 @@ class ModelsTest(BaseTest):
             self.assertEqual(self.category_1.count, 2)
             self.assertEqual(new_category.count_all_sites, 1)
             self.assertEqual(self.category_1.count_all_sites, 2)
+            with self.assertNumQueries(1):
+                counts = {category.pk: category.count for category in BlogCategory.objects.with_counts()}
+            self.assertEqual(counts, {self.category_1.pk: 2, new_category.pk: 1})
 
         # needed to clear cached properties
         new_category = self.reload_model(new_category)
@@ -879,6 +891,15 @@ class ModelsTest(BaseTest):
             self.assertEqual(self.category_1.count, 1)
             self.assertEqual(new_category.count_all_sites, 1)
             self.assertEqual(self.category_1.count_all_sites, 2)
+            counts = {category.pk: category.count for category in BlogCategory.objects.with_counts()}
+            self.assertEqual(counts, {self.category_1.pk: 1, new_category.pk: 0})
+            counts = {category.pk: category.count for category in BlogCategory.objects.with_counts(self.site_2)}
+            self.assertEqual(counts, {self.category_1.pk: 2, new_category.pk: 1})
+
+        # posts in other namespaces are not counted
+        posts[3].categories.add(new_category)
+        counts = {category.pk: category.count for category in BlogCategory.objects.with_counts()}
+        self.assertEqual(counts[new_category.pk], 0)
 
     def test_slug(self):
         post = Post.objects.language("en").create(title="I am a title")
@@ -1060,6 +1081,98 @@ class ModelsTest(BaseTest):
                 get_thumbnailer(post.main_image).get_thumbnail(get_setting("META_IMAGE_SIZE")).height,
             )
 
+    def test_stored_permalinks(self):
+        self.get_pages()
+        posts = self.get_posts()
+        post = Post.objects.get(pk=posts[0].pk)
+
+        def computed_url(post, lang="en"):
+            # URL computed without the stored permalink
+            post = Post.objects.get(pk=post.pk)
+            post.get_translation(lang).permalink = ""
+            return post.get_absolute_url(lang)
+
+        date = post.date_published
+        self.assertEqual(
+            post.safe_translation_getter("permalink", language_code="en"),
+            "{}/{:02d}/{:02d}/{}/".format(date.year, date.month, date.day, post.slug),
+        )
+        for lang in ("en", "it"):
+            self.assertEqual(post.get_absolute_url(lang), computed_url(post, lang))
+        post = Post.objects.select_related("app_config").prefetch_related("translations").get(pk=post.pk)
+        post.app_config.url_patterns
+        with self.assertNumQueries(0):
+            post.get_absolute_url("en")
+        # blog root is reversed once per app config and language
+        url = computed_url(post)
+        with patch("djangocms_blog.models.reverse") as reverse_mock:
+            self.assertEqual(post.get_absolute_url("en"), url)
+        reverse_mock.assert_not_called()
+
+        # slug change
+        post.slug = "new-slug"
+        post.save()
+        post = Post.objects.get(pk=post.pk)
+        self.assertTrue(post.get_absolute_url().endswith("/new-slug/"))
+        self.assertEqual(post.get_absolute_url(), computed_url(post))
+
+        # permalink style change
+        self.app_config_1.app_data.config.url_patterns = PERMALINK_TYPE_CATEGORY
+        self.app_config_1.save()
+        post = Post.objects.get(pk=post.pk)
+        self.assertEqual(
+            post.safe_translation_getter("permalink", language_code="en"),
+            "{}/new-slug/".format(self.category_1.safe_translation_getter("slug", language_code="en")),
+        )
+        self.assertEqual(post.get_absolute_url(), computed_url(post))
+
+        # category changes
+        post.categories.clear()
+        self.assertEqual(Post.objects.get(pk=post.pk).safe_translation_getter("permalink", language_code="en"), "")
+        self.category_1.blog_posts.add(post)
+        post = Post.objects.get(pk=post.pk)
+        self.assertEqual(post.get_absolute_url(), computed_url(post))
+        self.category_1.set_current_language("en")
+        self.category_1.slug = "new-category"
+        self.category_1.save()
+        post = Post.objects.get(pk=post.pk)
+        self.assertTrue(post.get_absolute_url().endswith("/new-category/new-slug/"))
+        self.assertEqual(post.get_absolute_url(), computed_url(post))
+
+        # stale permalinks are ignored and rebuilt by the command
+        post.get_translation("en").__class__.objects.update(permalink="stale/")
+        post = Post.objects.get(pk=post.pk)
+        self.assertEqual(post.get_absolute_url(), computed_url(post))
+        output = StringIO()
+        call_command("rebuild_blog_permalinks", stdout=output)
+        self.assertEqual(output.getvalue().strip(), "Posts permalinks rebuilt: %s" % len(posts))
+        post = Post.objects.get(pk=post.pk)
+        self.assertEqual(post.safe_translation_getter("permalink", language_code="en"), "new-category/new-slug/")
+        self.app_config_1.app_data.config.url_patterns = PERMALINK_TYPE_FULL_DATE
+        self.app_config_1.save()
+
+    def test_bulk_urls(self):
+        self.get_pages()
+        posts = self.get_posts()
+        for permalink_type in get_setting("PERMALINK_URLS").keys():
+            self.app_config_1.app_data.config.url_patterns = permalink_type
+            self.app_config_1.save()
+            for lang in ("en", "it"):
+                expected = {post.pk: Post.objects.get(pk=post.pk).get_absolute_url(lang) for post in posts}
+                queries = 5 if permalink_type == PERMALINK_TYPE_CATEGORY else 2
+                with self.assertNumQueries(queries):
+                    self.assertEqual(Post.objects.all().get_urls(lang), expected)
+                with smart_override(lang):
+                    self.assertEqual(Post.objects.get_urls(), expected)
+
+        # posts without category have no url in category permalink style
+        self.app_config_1.app_data.config.url_patterns = PERMALINK_TYPE_CATEGORY
+        self.app_config_1.save()
+        posts[0].categories.clear()
+        self.assertEqual(set(Post.objects.get_urls("en")), {post.pk for post in posts[1:]})
+        self.app_config_1.app_data.config.url_patterns = PERMALINK_TYPE_FULL_DATE
+        self.app_config_1.save()
+
     def test_urls(self):
         self.get_pages()
         post = self._get_post(self._post_data[0]["en"])
@@ -1168,6 +1281,95 @@ class ModelsTest(BaseTest):
                     post.set_current_language("it")
                     self.assertEqual(post.get_absolute_url(), post.get_absolute_url("en"))
 
+    def test_active_translations_prefetch(self):
+        self.get_pages()
+        posts = self.get_posts()
+        posts[0].create_translation("fr", title="Premier post", abstract="<p>première ligne</p>")
+        cache.clear()
+
+        profiles = {
+            "list": {
+                "select_related": ("app_config",),
+                "prefetch_related": (
+                    "translations:active",
+                    "categories",
+                    "categories__translations:active",
+                    "categories__app_config",
+                ),
+            }
+        }
+
+        with override("fr"), override_settings(BLOG_OPTIMIZE_PROFILES=profiles):
+            queryset = optimize_queryset(Post.objects.published().active_translations("fr"), "list")
+            post = {post.pk: post for post in queryset}[posts[0].pk]
+            # load the apphook urls
+            reverse("sample_app:posts-latest")
+            with self.assertNumQueries(0):
+                # translations are fetched in the current language and its fallback only
+                self.assertEqual(
+                    {translation.language_code for translation in post.active_translations_prefetch}, {"fr", "en"}
+                )
+                category = post.categories.all()[0]
+                self.assertEqual(
+                    {translation.language_code for translation in category.active_translations_prefetch}, {"en"}
+                )
+                self.assertEqual(post.title, "Premier post")
+                self.assertEqual(post.safe_translation_getter("title", any_language=True), "Premier post")
+                self.assertEqual(post.safe_translation_getter("title", language_code="en"), "First post")
+                self.assertEqual(category.name, "category 1")
+                self.assertEqual(category.safe_translation_getter("name", any_language=True), "category 1")
+                self.assertEqual(str(category), "category 1")
+                post.get_absolute_url()
+                category.get_absolute_url()
+
+            # other languages are loaded on demand, and not reported as missing in parler cache
+            with self.assertNumQueries(1):
+                self.assertEqual(post.safe_translation_getter("title", language_code="it"), "Primo post")
+            self.assertEqual(category.safe_translation_getter("name", language_code="it"), "categoria 1")
+            self.assertEqual(set(post.get_available_languages()), {"en", "fr", "it"})
+        with override("it"):
+            post = Post.objects.get(pk=posts[0].pk)
+            self.assertEqual(post.title, "Primo post")
+            self.assertEqual(post.categories.get().name, "categoria 1")
+
+    def test_profiles_other_language_translations(self):
+        self.get_pages()
+        posts = self.get_posts()
+        active_profiles = {
+            "list": {
+                "select_related": (),
+                "prefetch_related": ("translations:active", "categories__translations:active"),
+            }
+        }
+
+        for profiles in ({}, active_profiles):
+            cache.clear()
+            with override_settings(BLOG_OPTIMIZE_PROFILES=profiles):
+                with override("fr"):
+                    queryset = optimize_queryset(Post.objects.published().active_translations("fr"), "list")
+                    post = {post.pk: post for post in queryset}[posts[0].pk]
+                    self.assertEqual(post.title, "First post")
+                    self.assertEqual(post.safe_translation_getter("title", language_code="it"), "Primo post")
+                    self.assertEqual(
+                        post.categories.all()[0].safe_translation_getter("name", language_code="it"), "categoria 1"
+                    )
+                with override("it"):
+                    post = Post.objects.get(pk=posts[0].pk)
+                    self.assertEqual(post.title, "Primo post")
+                    self.assertEqual(post.categories.get().name, "categoria 1")
+
+    def test_post_previous_state(self):
+        self.get_pages()
+        posts = self.get_posts()
+        post = Post.objects.get(pk=posts[0].pk)
+        post.app_config = self.app_config_2
+        with CaptureQueriesContext(connection) as queries:
+            post.save()
+        # previous state is read once for the feeds, menus and archive months invalidation
+        previous = [query for query in queries if query["sql"].startswith('SELECT "djangocms_blog_post"."id"')]
+        self.assertEqual(len(previous), 1)
+        self.assertEqual(post._previous_state.app_config_id, self.app_config_1.pk)
+
     def test_manager(self):
         self.get_pages()
         post1 = self._get_post(self._post_data[0]["en"])
@@ -1254,6 +1456,164 @@ class ModelsTest(BaseTest):
         for index, _lang in enumerate(parler.appsettings.PARLER_LANGUAGES[Site.objects.get_current().pk]):
             parler.appsettings.PARLER_LANGUAGES[Site.objects.get_current().pk][index]["hide_untranslated"] = False
 
+    def test_manager_months_db(self):
+        self.get_pages()
+        post1 = self._get_post(self._post_data[0]["en"])
+        post2 = self._get_post(self._post_data[1]["en"])
+        post3 = self._get_post(self._post_data[2]["en"])
+        post1.date_published = now().replace(year=2020, month=3, day=15, hour=12)
+        post1.save()
+        post2.date_published = now().replace(year=2020, month=3, day=31, hour=23)
+        post2.save()
+        # no date_published: date_modified is used
+        post3.date_published = None
+        post3.save()
+
+        months_python = Post.objects.get_months()
+        with override_settings(BLOG_ARCHIVE_DB_AGGREGATION=True):
+            months_db = Post.objects.get_months()
+            self.assertEqual(
+                [(data["date"].year, data["date"].month, data["count"]) for data in months_db],
+                [(data["date"].year, data["date"].month, data["count"]) for data in months_python],
+            )
+            self.assertEqual(months_db[-1]["date"].day, 1)
+            self.assertEqual(months_db[-1]["count"], 2)
+
+            # months are computed in the current timezone
+            with self.settings(TIME_ZONE="Europe/Rome"):
+                months_db = Post.objects.get_months()
+            self.assertEqual(
+                [(data["date"].year, data["date"].month, data["count"]) for data in months_db[1:]],
+                [(2020, 4, 1), (2020, 3, 1)],
+            )
+
+            post2.sites.add(self.site_2)
+            self.assertEqual(Post.objects.get_months()[-1]["count"], 1)
+            self.assertEqual(Post.objects.get_months(current_site=False)[-1]["count"], 2)
+
+    def test_all_sites_flag(self):
+        post = self._get_post(self._post_data[0]["en"])
+        self.assertTrue(post.all_sites)
+
+        post.sites.add(self.site_2, Site.objects.get_current())
+        self.assertFalse(post.all_sites)
+        self.assertFalse(Post.objects.get(pk=post.pk).all_sites)
+        # no duplicated rows even if the post is bound to multiple sites
+        self.assertEqual(list(Post.objects.on_site()), [post])
+        self.assertEqual(list(Post.objects.on_site(self.site_2)), [post])
+        self.assertEqual(list(Post.objects.on_site(self.site_3)), [])
+
+        post.sites.clear()
+        self.assertTrue(post.all_sites)
+        self.assertEqual(list(Post.objects.on_site(self.site_3)), [post])
+
+        self.site_3.post_set.add(post)
+        self.assertFalse(Post.objects.get(pk=post.pk).all_sites)
+        self.assertEqual(list(Post.objects.on_site(self.site_2)), [])
+        self.site_3.post_set.clear()
+        self.assertTrue(Post.objects.get(pk=post.pk).all_sites)
+
+        site = Site.objects.create(domain="http://example4.com", name="example 4")
+        post.sites.add(site)
+        self.assertFalse(Post.objects.get(pk=post.pk).all_sites)
+        site.delete()
+        self.assertTrue(Post.objects.get(pk=post.pk).all_sites)
+
+    def test_publication_time_bucket(self):
+        current = now().replace(minute=10, second=30, microsecond=0)
+        with patch("djangocms_blog.managers.now", return_value=current):
+            self.assertEqual(get_reference_time(), current)
+            with override_settings(BLOG_PUBLICATION_TIME_BUCKET=60):
+                self.assertEqual(get_reference_time(), current.replace(second=0))
+            with override_settings(BLOG_PUBLICATION_TIME_BUCKET=3600):
+                self.assertEqual(get_reference_time(), current.replace(minute=0, second=0))
+
+    @override_settings(BLOG_PUBLICATION_TIME_BUCKET=60)
+    def test_published_ids_cache(self):
+        posts = self.get_posts()
+        namespace = self.app_config_1.namespace
+        # posts published in the current time bucket are not visible yet
+        with patch("djangocms_blog.managers.now", return_value=now() + timedelta(minutes=2)):
+            with self.assertNumQueries(1):
+                self.assertEqual(Post.objects.get_published_ids(namespace=namespace, language="en"), [posts[0].pk])
+            with self.assertNumQueries(0):
+                self.assertEqual(Post.objects.get_published_ids(namespace=namespace, language="en"), [posts[0].pk])
+            self.assertEqual(
+                Post.objects.get_published_ids(language="en", limit=1),
+                list(Post.objects.published().values_list("pk", flat=True)[:1]),
+            )
+
+            # saving a post invalidates the cache
+            posts[1].publish = True
+            posts[1].save()
+            with self.assertNumQueries(1):
+                self.assertEqual(
+                    set(Post.objects.get_published_ids(namespace=namespace, language="en")), {posts[0].pk, posts[1].pk}
+                )
+
+            # changing post sites invalidates the cache
+            current_site = Site.objects.get_current()
+            self.assertEqual(
+                set(Post.objects.get_published_ids(namespace=namespace, language="en", site=current_site)),
+                {posts[0].pk, posts[1].pk},
+            )
+            posts[1].sites.add(self.site_2)
+            self.assertEqual(
+                Post.objects.get_published_ids(namespace=namespace, language="en", site=current_site), [posts[0].pk]
+            )
+            self.assertEqual(
+                Post.objects.get_published_ids(namespace=namespace, language="en", site=self.site_2),
+                [posts[1].pk, posts[0].pk],
+            )
+
+    def test_cache_stampede(self):
+        compute = Mock(side_effect=lambda: compute.call_count)
+        self.assertEqual(caching.get_or_set("key", compute, timeout=60, version=1), 1)
+        self.assertEqual(caching.get_or_set("key", compute, timeout=60, version=1), 1)
+        self.assertEqual(compute.call_count, 1)
+
+        # stale values are served while another worker holds the lock
+        cache.add(caching.LOCK_CACHE_KEY.format("key"), True)
+        self.assertEqual(caching.get_or_set("key", compute, timeout=60, version=2), 1)
+        caching.expire(["key"])
+        self.assertEqual(caching.get_or_set("key", compute, timeout=60, version=1), 1)
+        self.assertEqual(compute.call_count, 1)
+
+        # missing values are computed once the lock wait is over
+        with override_settings(BLOG_CACHE_LOCK_TIMEOUT=0):
+            self.assertEqual(caching.get_or_set("other", compute, timeout=60), 2)
+
+        # the lock owner recomputes the stale value and releases the lock
+        cache.delete(caching.LOCK_CACHE_KEY.format("key"))
+        self.assertEqual(caching.get_or_set("key", compute, timeout=60, version=1), 3)
+        self.assertIsNone(cache.get(caching.LOCK_CACHE_KEY.format("key")))
+        self.assertEqual(caching.get_or_set("key", compute, timeout=60, version=1), 3)
+
+        # values are recomputed early with a probability depending on the time spent to compute them
+        entry = {"value": 1, "expires": time.time() + 10, "delta": 1, "version": None}
+        with patch("djangocms_blog.caching.random.random", return_value=0.5):
+            self.assertTrue(caching.is_fresh(entry))
+        with patch("djangocms_blog.caching.random.random", return_value=0.99999999):
+            self.assertFalse(caching.is_fresh(entry))
+            with override_settings(BLOG_CACHE_XFETCH_BETA=0):
+                self.assertTrue(caching.is_fresh(entry))
+        self.assertTrue(caching.is_fresh(dict(entry, expires=None)))
+
+    def test_cache_unpacked_values(self):
+        # values stored by previous releases under the same keys are handled as missing
+        cache.set("key", b"<rss></rss>")
+        self.assertIsNone(caching.get("key"))
+        self.assertFalse(caching.is_fresh(cache.get("key")))
+        caching.expire(["key"])
+        self.assertEqual(cache.get("key"), b"<rss></rss>")
+        self.assertEqual(caching.get_or_set("key", lambda: "value", timeout=60), "value")
+        self.assertEqual(caching.get("key"), "value")
+        cache.set_many({"key": {"value": 1}, "other": 2})
+        self.assertEqual(
+            caching.get_many_or_set({"key": 1, "other": 2}, lambda args: [-arg for arg in args], timeout=60),
+            {"key": -1, "other": -2},
+        )
+
     def test_tag_cloud(self):
         post1 = self._get_post(self._post_data[0]["en"])
         post2 = self._get_post(self._post_data[1]["en"])
@@ -1289,6 +1649,21 @@ class ModelsTest(BaseTest):
         self.assertEqual(set(Post.objects.tag_cloud()), set(tags_1))
         self.assertEqual(set(Post.objects.tag_cloud(published=False)), set(tags))
 
+        self.assertEqual(
+            [(tag["slug"], tag["count"]) for tag in Post.objects.tag_cloud_values()],
+            [("tag-1", 1), ("tag-2", 1), ("tag-3", 1), ("tag-4", 1)],
+        )
+        self.assertEqual(
+            [(tag["slug"], tag["count"]) for tag in Post.objects.tag_cloud_values(published=False)][0], ("tag-2", 2)
+        )
+        self.assertEqual(len(Post.objects.tag_cloud_values(published=False)), 7)
+        self.assertEqual(Post.objects.tag_cloud_values(namespace=self.app_config_2.namespace), [])
+
+        post2.sites.add(self.site_2)
+        self.assertEqual(len(Post.objects.tag_cloud_values(published=False)), 4)
+        self.assertEqual(len(Post.objects.tag_cloud_values(published=False, current_site=False)), 7)
+        post2.sites.clear()
+
         tags1 = set(Post.objects.tag_list(Post))
         tags2 = set(Tag.objects.all())
         self.assertEqual(tags1, tags2)
@@ -1438,6 +1813,129 @@ class ModelsTest2(BaseTest):
         self.assertEqual(force_str(no_translation_post), no_translation_default_title)
 
 
+@override_settings(BLOG_ARCHIVE_COUNTERS=True)
+class ArchiveMonthTest(BaseTest):
+    def _months(self, site=None, namespace="sample_app", language="en"):
+        site = site or Site.objects.get_current()
+        months = Post.objects.get_published_months(namespace=namespace, language=language, site=site)
+        return [(data["date"].year, data["date"].month, data["count"]) for data in months]
+
+    def get_posts(self):
+        # counters are rebuilt once the transaction is committed
+        with self.captureOnCommitCallbacks(execute=True):
+            return super().get_posts()
+
+    def test_counters_update(self):
+        posts = self.get_posts()
+        current = now()
+        self.assertEqual(self._months(), [(current.year, current.month, 1)])
+        self.assertEqual(self._months(namespace=None), [(current.year, current.month, 2)])
+
+        posts[1].publish = True
+        with self.captureOnCommitCallbacks(execute=True):
+            posts[1].save()
+        self.assertEqual(self._months(), [(current.year, current.month, 2)])
+
+        posts[1].date_published = current.replace(year=2020, month=3, day=10)
+        with self.captureOnCommitCallbacks(execute=True):
+            posts[1].save()
+        self.assertEqual(self._months(), [(current.year, current.month, 1), (2020, 3, 1)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            posts[1].sites.add(self.site_2)
+        self.assertEqual(self._months(), [(current.year, current.month, 1)])
+        self.assertEqual(self._months(site=self.site_2), [(current.year, current.month, 1), (2020, 3, 1)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            posts[1].sites.clear()
+        self.assertEqual(self._months(), [(current.year, current.month, 1), (2020, 3, 1)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            posts[1].delete()
+        self.assertEqual(self._months(), [(current.year, current.month, 1)])
+
+        with override_settings(BLOG_ARCHIVE_COUNTERS=False):
+            self.assertEqual(self._months(), [(current.year, current.month, 1)])
+            self.assertEqual(self._months(namespace=None), [(current.year, current.month, 2)])
+
+    def test_counters_rebuilt_once(self):
+        posts = self.get_posts()
+        current = now()
+        rebuild = ArchiveMonth.objects.rebuild
+        with patch.object(ArchiveMonth.objects, "rebuild", side_effect=rebuild) as mock:
+            with self.captureOnCommitCallbacks(execute=True):
+                posts[1].publish = True
+                posts[1].save()
+                posts[1].sites.add(self.site_2)
+                posts[1].create_translation("fr", title="Deuxième post", abstract="<p>deuxième ligne</p>")
+                mock.assert_not_called()
+        mock.assert_called_once()
+        self.assertEqual(self._months(site=self.site_2), [(current.year, current.month, 2)])
+
+    def test_counters_transitions(self):
+        posts = self.get_posts()
+        current = now()
+        posts[2].publish = True
+        posts[2].date_published = current + timedelta(hours=1)
+        posts[0].date_published_end = current + timedelta(hours=2)
+        with self.captureOnCommitCallbacks(execute=True):
+            posts[2].save()
+            posts[0].save()
+        self.assertEqual(self._months(), [(current.year, current.month, 1)])
+
+        with patch("djangocms_blog.managers.now", return_value=current + timedelta(minutes=90)):
+            self.assertEqual(self._months(), [(current.year, current.month, 2)])
+            self.assertEqual(ArchiveMonth.objects.get_next_transition(), posts[0].date_published_end)
+        with patch("djangocms_blog.managers.now", return_value=current + timedelta(hours=3)):
+            self.assertEqual(self._months(), [(current.year, current.month, 1)])
+            self.assertIsNone(ArchiveMonth.objects.get_next_transition())
+
+    def test_counters_cache_flush(self):
+        posts = self.get_posts()
+        current = now()
+        posts[2].publish = True
+        posts[2].date_published = current + timedelta(hours=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            posts[2].save()
+        cache.clear()
+        # counters are not rebuilt on read
+        with patch.object(ArchiveMonth.objects, "rebuild") as rebuild:
+            with self.assertLogs("djangocms_blog.managers", level="WARNING"):
+                self.assertEqual(self._months(), [(current.year, current.month, 1)])
+            rebuild.assert_not_called()
+        # boundaries after the flush are still applied
+        with patch("djangocms_blog.managers.now", return_value=current + timedelta(minutes=90)):
+            self.assertEqual(self._months(), [(current.year, current.month, 2)])
+
+    def test_rebuild_command(self):
+        self.get_posts()
+        current = now()
+        counters = ArchiveMonth.objects.count()
+        self.assertTrue(counters)
+        ArchiveMonth.objects.all().delete()
+        out = StringIO()
+        call_command("rebuild_blog_archive", stdout=out)
+        self.assertEqual(ArchiveMonth.objects.count(), counters)
+        self.assertEqual(self._months(), [(current.year, current.month, 1)])
+        self.assertEqual(self._months(language="it"), [(current.year, current.month, 1)])
+
+    def test_archive_plugin(self):
+        pages = self.get_pages()
+        posts = self.get_posts()
+        posts[1].publish = True
+        with self.captureOnCommitCallbacks(execute=True):
+            posts[1].save()
+        ph = pages[0].placeholders.get(slot="content")
+        plugin = add_plugin(ph, "BlogArchivePlugin", language="en", app_config=self.app_config_1)
+        plugin_class = plugin.get_plugin_class_instance()
+        context = self.get_plugin_context(pages[0], "en", plugin)
+        # first read after a cache flush stores the next publication boundary
+        plugin_class.render(context, plugin, ph)
+        with self.assertNumQueries(1):
+            context = plugin_class.render(context, plugin, ph)
+        self.assertEqual(context["dates"][0]["count"], 2)
+
+
 class KnockerTest(BaseTest):
     @classmethod
     def setUpClass(cls):
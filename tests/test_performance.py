@@ -0,0 +1,444 @@
+import os
+import time
+import tracemalloc
+from functools import partial
+from io import BytesIO
+from unittest import skipUnless
+
+from cms.api import add_plugin
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sites.models import Site
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
+from lxml import etree
+from menus.menu_pool import menu_pool
+from parler.utils.context import smart_override
+
+from djangocms_blog.feeds import FBInstantArticles, clean_instant_article
+from djangocms_blog.models import BlogCategory, Post, optimize_queryset
+from djangocms_blog.settings import MENU_TYPE_COMPLETE, PERMALINK_TYPE_CATEGORY
+from djangocms_blog.sitemaps import BlogConfigSitemap, BlogSitemap
+from djangocms_blog.views import PostDetailView
+
+from .base import BaseTest, shared_connection
+
+BENCHMARK = os.environ.get("BLOG_BENCHMARK", False)
+BENCHMARK_SIZES = [int(size) for size in os.environ.get("BLOG_BENCHMARK_SIZES", "10,100,1000").split(",")]
+
+
+class PerformanceMixin:
+    """
+    Utility functions to measure the number of queries and the execution time of a callable.
+
+    Scaling tests are always run and check that the number of queries does not depend on the number of posts;
+    timing benchmarks are only run if ``BLOG_BENCHMARK`` environment variable is set (use ``-s`` to see the report).
+    """
+
+    def _create_posts(self, count, app_config=None, tags=("tag 1", "tag 2", "tag 3"), **kwargs):
+        """
+        Create ``count`` published posts in the given app_config
+
+        :param count: number of posts to create
+        :param app_config: app_config of the posts (default: ``app_config_1``)
+        :param tags: tags attached to each post
+        :param kwargs: extra post fields
+        :return: list of posts
+        """
+        app_config = app_config or self.app_config_1
+        offset = Post.objects.count()
+        posts = []
+        for index in range(offset, offset + count):
+            data = {
+                "title": "Post %s" % index,
+                "abstract": "<p>abstract %s</p>" % index,
+                "app_config": app_config,
+                "publish": True,
+                "date_published": now(),
+                "author": self.user,
+            }
+            data.update(kwargs)
+            post = Post.objects.create(**data)
+            post.categories.add(self.category_1)
+            if tags:
+                post.tags.add(*tags)
+            posts.append(post)
+        return posts
+
+    def _count_queries(self, func):
+        """
+        Return the number of queries executed by ``func``.
+        """
+        with CaptureQueriesContext(connection) as context:
+            func()
+        return len(context.captured_queries)
+
+    def _timeit(self, func, repeat=3):
+        """
+        Return the best execution time of ``func`` out of ``repeat`` runs.
+        """
+        timings = []
+        for __ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    def _benchmark(self, label, implementations, sizes=None, create_posts=None):
+        """
+        Run the implementations on increasing post volumes and print number of queries and best timing.
+
+        :param label: benchmark title
+        :param implementations: dictionary of label: callable
+        :param sizes: list of post volumes (default: ``BLOG_BENCHMARK_SIZES`` environment variable)
+        :param create_posts: callable creating the given number of posts (default: ``_create_posts``)
+        :return: list of (size, implementation, queries, timing) tuples
+        """
+        create_posts = create_posts or self._create_posts
+        results = []
+        created = 0
+        for size in sizes or BENCHMARK_SIZES:
+            create_posts(size - created)
+            created = size
+            for name, func in implementations.items():
+                results.append((size, name, self._count_queries(func), self._timeit(func)))
+        print("\n{}".format(label))
+        print("{:>8} {:<30} {:>8} {:>12}".format("posts", "implementation", "queries", "time (ms)"))
+        for size, name, queries, timing in results:
+            print("{:>8} {:<30} {:>8} {:>12.2f}".format(size, name, queries, timing * 1000))
+        return results
+
+
+class TagCloudPerformanceTest(PerformanceMixin, BaseTest):
+    def _render_tags(self, pages):
+        ph = pages[0].placeholders.get(slot="content")
+        plugin = add_plugin(ph, "BlogTagsPlugin", language="en", app_config=self.app_config_1)
+        plugin_class = plugin.get_plugin_class_instance()
+        context = self.get_plugin_context(pages[0], "en", plugin)
+        return lambda: plugin_class.render(context, plugin, ph)
+
+    def test_tag_cloud_queries(self):
+        pages = self.get_pages()
+        render = self._render_tags(pages)
+        self._create_posts(3)
+        render()
+        queries = self._count_queries(render)
+        self.assertEqual(queries, 1)
+        self._create_posts(10, tags=("tag 4", "tag 5"))
+        self.assertEqual(self._count_queries(render), queries)
+
+    @skipUnless(BENCHMARK, "BLOG_BENCHMARK not set")
+    def test_tag_cloud_benchmark(self):
+        self.get_pages()
+        queryset = Post.objects.namespace(self.app_config_1.namespace).published()
+        self._benchmark(
+            "Tag cloud",
+            {
+                "tag_cloud": lambda: Post.objects.tag_cloud(queryset=queryset),
+                "tag_cloud_values": lambda: Post.objects.tag_cloud_values(queryset=queryset),
+            },
+        )
+
+
+class AuthorEntriesPerformanceTest(PerformanceMixin, BaseTest):
+    def test_authors_queries(self):
+        pages = self.get_pages()
+        ph = pages[0].placeholders.get(slot="content")
+        plugin = add_plugin(ph, "BlogAuthorPostsPlugin", language="en", app_config=self.app_config_1, latest_posts=2)
+        plugin.authors.add(self.user)
+        request = self.get_request(pages[0], "en")
+        self._create_posts(3)
+        queries = self._count_queries(lambda: plugin.get_authors(request))
+
+        plugin.authors.add(self.user_staff, self.user_normal)
+        self._create_posts(3, author=self.user_staff)
+        self._create_posts(3, author=self.user_normal)
+        self.assertEqual(self._count_queries(lambda: plugin.get_authors(request)), queries)
+
+    @skipUnless(BENCHMARK, "BLOG_BENCHMARK not set")
+    def test_authors_benchmark(self):
+        pages = self.get_pages()
+        ph = pages[0].placeholders.get(slot="content")
+        plugin = add_plugin(ph, "BlogAuthorPostsPlugin", language="en", app_config=self.app_config_1)
+        plugin.authors.add(self.user, self.user_staff, self.user_normal)
+        request = self.get_request(pages[0], "en")
+        users = [self.user, self.user_staff, self.user_normal]
+
+        def create_posts(count):
+            for index in range(count):
+                self._create_posts(1, author=users[index % len(users)], tags=None)
+
+        self._benchmark(
+            "Author entries plugin",
+            {"get_authors": lambda: [list(author.posts) for author in plugin.get_authors(request)]},
+            create_posts=create_posts,
+        )
+
+
+class MenuPerformanceTest(PerformanceMixin, BaseTest):
+    def _get_nodes(self, pages):
+        request = self.get_page_request(None, self.user, r"/en/page-two/")
+
+        def get_nodes():
+            with smart_override("en"):
+                self._reset_menus()
+                return self.get_nodes(menu_pool, request)
+
+        return get_nodes
+
+    def test_menu_queries(self):
+        pages = self.get_pages()
+        self.app_config_1.app_data.config.menu_structure = MENU_TYPE_COMPLETE
+        self.app_config_1.app_data.config.url_patterns = PERMALINK_TYPE_CATEGORY
+        self.app_config_1.save()
+        self.reload_urlconf()
+        get_nodes = self._get_nodes(pages)
+        self._create_posts(3, tags=None)
+        get_nodes()
+        queries = self._count_queries(get_nodes)
+        self._create_posts(10, tags=None)
+        get_nodes()
+        self.assertEqual(self._count_queries(get_nodes), queries)
+
+    @skipUnless(BENCHMARK, "BLOG_BENCHMARK not set")
+    def test_menu_benchmark(self):
+        pages = self.get_pages()
+        self.app_config_1.app_data.config.menu_structure = MENU_TYPE_COMPLETE
+        self.app_config_1.save()
+        self._benchmark(
+            "Blog menu", {"get_nodes": self._get_nodes(pages)}, create_posts=partial(self._create_posts, tags=None)
+        )
+
+
+class PostUrlsPerformanceTest(PerformanceMixin, BaseTest):
+    def test_sitemap_queries(self):
+        self.get_pages()
+        self.app_config_1.app_data.config.url_patterns = PERMALINK_TYPE_CATEGORY
+        self.app_config_1.save()
+        sitemap = BlogSitemap()
+        self._create_posts(3, tags=None)
+        sitemap.items()
+        queries = self._count_queries(sitemap.items)
+        self._create_posts(10, tags=None)
+        self.assertEqual(self._count_queries(sitemap.items), queries)
+
+    def test_sitemap_section_queries(self):
+        self.get_pages()
+        self.app_config_1.app_data.config.url_patterns = PERMALINK_TYPE_CATEGORY
+        self.app_config_1.save()
+        site = Site.objects.get_current()
+        self._create_posts(3, tags=None)
+
+        def get_urls():
+            sitemap = BlogConfigSitemap(self.app_config_1, "en")
+            return sitemap.get_urls(site=site, protocol="https")
+
+        get_urls()
+        queries = self._count_queries(get_urls)
+        self._create_posts(10, tags=None)
+        # page boundaries are computed again
+        get_urls()
+        self.assertEqual(self._count_queries(get_urls), queries)
+
+    @skipUnless(BENCHMARK, "BLOG_BENCHMARK not set")
+    def test_sitemap_benchmark(self):
+        self.get_pages()
+        site = Site.objects.get_current()
+
+        def get_urls(sitemap_class, *args):
+            def func():
+                tracemalloc.start()
+                sitemap_class(*args).get_urls(site=site, protocol="https")
+                memory.setdefault(sitemap_class.__name__, []).append(tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+
+            return func
+
+        memory = {}
+        self._benchmark(
+            "Sitemap",
+            {
+                "BlogSitemap": get_urls(BlogSitemap),
+                "BlogConfigSitemap": get_urls(BlogConfigSitemap, self.app_config_1, "en"),
+            },
+            create_posts=partial(self._create_posts, tags=None),
+        )
+        for name, peaks in memory.items():
+            print("{:<30} peak memory (KB): {}".format(name, ", ".join(str(peak // 1024) for peak in peaks[::4])))
+
+    @skipUnless(BENCHMARK, "BLOG_BENCHMARK not set")
+    def test_urls_benchmark(self):
+        self.get_pages()
+        self.app_config_1.app_data.config.url_patterns = PERMALINK_TYPE_CATEGORY
+        self.app_config_1.save()
+
+        def get_absolute_url():
+            return [post.get_absolute_url("en") for post in Post.objects.published().select_related("app_config")]
+
+        self._benchmark(
+            "Post URLs",
+            {
+                "get_absolute_url": get_absolute_url,
+                "get_urls": lambda: Post.objects.published().get_urls("en"),
+            },
+            create_posts=partial(self._create_posts, tags=None),
+        )
+
+
+def clean_instant_article_iterparse(content):
+    """
+    Previous ``etree.iterparse`` based instant article cleaner, used as benchmark reference.
+    """
+    document = etree.iterparse(BytesIO(content), html=True)
+    for _a, element in document:
+        if not (element.text and element.text.strip()) and len(element) == 0 and element.tag == "p":
+            element.getparent().remove(element)
+        if element.tag in ("h3", "h4", "h5", "h6") and "op-kicker" not in element.attrib.get("class", ""):
+            element.tag = "h2"
+    return etree.tostring(document.root)
+
+
+class InstantArticlesPerformanceTest(PerformanceMixin, BaseTest):
+    @skipUnless(BENCHMARK, "BLOG_BENCHMARK not set")
+    def test_clean_html_benchmark(self):
+        pages = self.get_pages()
+        paragraph = (
+            "<h3>Section title</h3><p>Lorem ipsum <b>dolor</b> sit amet, <a href='/link/'>consectetur</a> adipiscing "
+            "elit, sed do eiusmod tempor incididunt ut labore et dolore magna aliqua.</p><p></p><p>&nbsp;</p>"
+            "<figure><img src='/media/image.jpg' alt=''><figcaption>Caption</figcaption></figure>"
+            "<ul><li>first</li><li>second</li></ul><h4>Subsection</h4><p>Ut enim ad minim veniam.</p>"
+        )
+        print("\nInstant article HTML cleaner")
+        print("{:>8} {:<30} {:>12}".format("KB", "implementation", "time (ms)"))
+        for size in (50, 100, 250, 500):
+            post = self._create_posts(1)[0]
+            add_plugin(post.content, "TextPlugin", language="en", body=paragraph * (size * 1024 // len(paragraph)))
+            with smart_override("en"):
+                request = self.get_page_request(pages[1], AnonymousUser(), path=post.get_absolute_url("en"))
+                response = PostDetailView.as_view(instant_article=True)(request, slug=post.slug)
+                content = response.render().content
+            self.assertEqual(
+                *(
+                    etree.tostring(etree.fromstring(cleaned, etree.HTMLParser()).find("body/article"))
+                    for cleaned in (clean_instant_article(content), clean_instant_article_iterparse(content))
+                )
+            )
+            for name, func in (
+                ("iterparse", clean_instant_article_iterparse),
+                ("article only", clean_instant_article),
+            ):
+                timing = self._timeit(lambda: func(content), repeat=10)
+                print("{:>8} {:<30} {:>12.2f}".format(len(content) // 1024, name, timing * 1000))
+
+    @skipUnless(BENCHMARK, "BLOG_BENCHMARK not set")
+    def test_instant_articles_benchmark(self):
+        pages = self.get_pages()
+
+        def create_posts(count):
+            for post in self._create_posts(count):
+                add_plugin(
+                    post.content, "TextPlugin", language="en", body="<h3>Title</h3><p></p>" + "<p>text</p>" * 50
+                )
+
+        def get_feed(workers):
+            def func():
+                # feed items are rendered on a cold cache
+                cache.clear()
+                with smart_override("en"), override_settings(BLOG_FEED_INSTANT_RENDER_WORKERS=workers):
+                    request = self.get_page_request(pages[1], AnonymousUser(), path="/en/page-two/feed/fb/")
+                    FBInstantArticles()(request)
+
+            return func
+
+        with shared_connection("djangocms_blog.feeds.ThreadPoolExecutor"):
+            self._benchmark(
+                "Instant articles feed (cold cache)",
+                {"sequential": get_feed(1), "parallel (4 workers)": get_feed(4)},
+                sizes=[50],
+                create_posts=create_posts,
+            )
+
+
+class TranslationsPrefetchPerformanceTest(PerformanceMixin, BaseTest):
+    #: languages of the extra translations, not active in the test project
+    extra_languages = ("de", "es", "nl", "pt", "pl", "sv", "da", "fi", "cs")
+
+    def _create_translated_posts(self, count):
+        posts = self._create_posts(count, tags=None)
+        translation_model = Post._parler_meta.root_model
+        translation_model.objects.bulk_create(
+            translation_model(
+                master=post,
+                language_code=language,
+                title="Post {} {}".format(post.pk, language),
+                slug="post-{}-{}".format(post.pk, language),
+                abstract="<p>abstract {} {}</p>".format(post.pk, language) * 20,
+            )
+            for post in posts
+            for language in self.extra_languages
+        )
+        return posts
+
+    @skipUnless(BENCHMARK, "BLOG_BENCHMARK not set")
+    def test_translations_prefetch_benchmark(self):
+        self.get_pages()
+        category_translation_model = BlogCategory._parler_meta.root_model
+        category_translation_model.objects.bulk_create(
+            category_translation_model(master=self.category_1, language_code=language, name="category 1 %s" % language)
+            for language in self.extra_languages
+        )
+        all_languages = {
+            "select_related": ("app_config",),
+            "prefetch_related": (
+                "translations",
+                "categories",
+                "categories__translations",
+                "categories__app_config",
+                "tags",
+            ),
+        }
+
+        def load(template_folder):
+            with smart_override("it"):
+                posts = list(
+                    optimize_queryset(Post.objects.published().active_translations(), "list", template_folder)
+                )
+                for post in posts:
+                    post.safe_translation_getter("title", any_language=True)
+                    post.safe_translation_getter("abstract")
+                    for category in post.categories.all():
+                        category.safe_translation_getter("name", any_language=True)
+            return posts
+
+        def get_posts(template_folder):
+            def func():
+                tracemalloc.start()
+                posts = load(template_folder)
+                memory.setdefault(template_folder, []).append(tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+                rows.setdefault(template_folder, []).append(
+                    sum(
+                        len(post.translations.all())
+                        + sum(len(category.translations.all()) for category in post.categories.all())
+                        for post in posts
+                    )
+                )
+
+            return func
+
+        memory = {}
+        rows = {}
+        with override_settings(BLOG_OPTIMIZE_PROFILES={"list:all-languages": all_languages}):
+            self._benchmark(
+                "Posts translations ({} extra languages)".format(len(self.extra_languages)),
+                {"all-languages": get_posts("all-languages"), "active-languages": get_posts("active-languages")},
+                create_posts=self._create_translated_posts,
+            )
+        for name in memory:
+            # each implementation runs 4 times per size
+            print("{:<30} translation rows: {}".format(name, ", ".join(str(count) for count in rows[name][::4])))
+            print(
+                "{:<30} peak memory (KB): {}".format(name, ", ".join(str(peak // 1024) for peak in memory[name][::4]))
+            )
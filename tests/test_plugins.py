@@ -1,18 +1,23 @@
 import os.path
 import re
+from datetime import timedelta
+from unittest.mock import patch
 
 from cms.api import add_plugin
 from cms.models import Page
 from cms.test_utils.util.fuzzy_int import FuzzyInt
 from django.contrib import admin
 from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils.http import urlencode
 from django.utils.timezone import now
+from django.utils.translation import override
 from taggit.models import Tag
 
-from djangocms_blog.models import BlogCategory
+from djangocms_blog.models import OPTIMIZE_PROFILES, BlogCategory, Post
 
 from .base import BaseTest
 
@@ -40,13 +45,13 @@ class PluginTest(BaseTest):
 
         plugin_nocache = add_plugin(ph, "BlogLatestEntriesPlugin", language="en", app_config=self.app_config_1)
         # FIXME: Investigate the correct number of queries expected here
-        with self.assertNumQueries(FuzzyInt(17, 18)):
+        with self.assertNumQueries(FuzzyInt(12, 13)):
             self.render_plugin(pages[0], "en", plugin_nocache)
 
-        with self.assertNumQueries(FuzzyInt(17, 18)):
+        with self.assertNumQueries(FuzzyInt(12, 13)):
             self.render_plugin(pages[0], "en", plugin)
 
-        with self.assertNumQueries(FuzzyInt(17, 18)):
+        with self.assertNumQueries(FuzzyInt(12, 13)):
             rendered = self.render_plugin(pages[0], "en", plugin)
 
         self.assertTrue(rendered.find("<p>first line</p>") > -1)
@@ -126,6 +131,107 @@ class PluginTest(BaseTest):
         self.assertTrue(rendered.find('<article id="post-first-post"') > -1)
         self.assertTrue(rendered.find('<article id="post-different-appconfig"') > -1)
 
+    @override_settings(BLOG_PUBLICATION_TIME_BUCKET=60)
+    def test_plugin_latest_time_bucket(self):
+        pages = self.get_pages()
+        posts = self.get_posts()
+        ph = pages[0].placeholders.get(slot="content")
+        plugin = add_plugin(ph, "BlogLatestEntriesPlugin", language="en", app_config=self.app_config_1)
+        request = self.get_request(pages[0], "en")
+
+        with patch("djangocms_blog.managers.now", return_value=now() + timedelta(minutes=2)):
+            self.assertEqual(list(plugin.get_posts(request)), [posts[0]])
+            # published ids and plugin filters are cached: only the posts (and prefetches) queries are executed
+            with self.assertNumQueries(6):
+                self.assertEqual(list(plugin.get_posts(request)), [posts[0]])
+
+            posts[1].publish = True
+            posts[1].save()
+            self.assertEqual(list(plugin.get_posts(request)), [posts[1], posts[0]])
+            # cached ids order is kept
+            with patch.object(type(Post.objects), "get_published_ids", return_value=[posts[0].pk, posts[1].pk]):
+                self.assertEqual(list(plugin.get_posts(request)), [posts[0], posts[1]])
+
+            plugin.latest_posts = 1
+            self.assertEqual(len(plugin.get_posts(request)), 1)
+
+    def test_plugin_latest_queries(self):
+        pages = self.get_pages()
+        posts = self.get_posts()
+        ph = pages[0].placeholders.get(slot="content")
+        plugin = add_plugin(ph, "BlogLatestEntriesPlugin", language="en", app_config=self.app_config_1)
+
+        def render():
+            with CaptureQueriesContext(connection) as queries:
+                rendered = self.render_plugin(pages[0], "en", plugin)
+            # easy_thumbnails looks up each thumbnail in its own query
+            return rendered, len([query for query in queries if "easy_thumbnails" not in query["sql"]])
+
+        # category counts are rendered by the default templates
+        profile = {
+            "select_related": OPTIMIZE_PROFILES["plugin"]["select_related"],
+            "prefetch_related": tuple(
+                "categories:counts" if lookup == "categories" else lookup
+                for lookup in OPTIMIZE_PROFILES["plugin"]["prefetch_related"]
+            ),
+        }
+        with override_settings(BLOG_OPTIMIZE_PROFILES={"plugin": profile}):
+            render()
+            __, num_queries = render()
+            # related objects of new posts are loaded by the same queries
+            for post, author in ((posts[1], self.user_staff), (posts[2], self.user_normal)):
+                post.publish = True
+                post.author = author
+                post.main_image = posts[0].main_image
+                post.main_image_thumbnail = self.thumb_1
+                post.save()
+                post.tags.add("tag %s" % post.pk, "tag")
+            posts[0].tags.add("tag")
+            # warm up the thumbnails
+            render()
+            rendered, new_num_queries = render()
+        self.assertEqual(rendered.count("<article "), 3)
+        self.assertEqual(new_num_queries, num_queries)
+
+    def test_plugin_cache_expiration(self):
+        pages = self.get_pages()
+        posts = self.get_posts()
+        ph = pages[0].placeholders.get(slot="content")
+        request = self.get_request(pages[0], "en")
+        latest = add_plugin(ph, "BlogLatestEntriesPluginCached", language="en", app_config=self.app_config_1)
+        featured = add_plugin(ph, "BlogFeaturedPostsPluginCached", language="en", app_config=self.app_config_1)
+        featured.posts.add(posts[0])
+        latest_class = latest.get_plugin_class_instance()
+        featured_class = featured.get_plugin_class_instance()
+
+        self.assertIsNone(latest_class.get_cache_expiration(request, latest, ph))
+        self.assertIsNone(latest_class.get_vary_cache_on(request, latest, ph))
+
+        # scheduled publication
+        posts[1].publish = True
+        posts[1].date_published = now() + timedelta(days=1)
+        posts[1].save()
+        self.assertEqual(latest_class.get_cache_expiration(request, latest, ph), posts[1].date_published)
+        self.assertIsNone(featured_class.get_cache_expiration(request, featured, ph))
+
+        # scheduled unpublication
+        posts[0].date_published_end = now() + timedelta(hours=2)
+        posts[0].save()
+        expiration = posts[0].date_published_end + timedelta(seconds=1)
+        self.assertEqual(latest_class.get_cache_expiration(request, latest, ph), expiration)
+        self.assertEqual(featured_class.get_cache_expiration(request, featured, ph), expiration)
+
+        # posts of other apphooks are ignored
+        posts[3].date_published_end = now() + timedelta(hours=1)
+        posts[3].save()
+        self.assertEqual(latest_class.get_cache_expiration(request, latest, ph), expiration)
+
+        with override_settings(BLOG_PUBLICATION_TIME_BUCKET=3600):
+            expiration = latest_class.get_cache_expiration(request, latest, ph)
+            self.assertEqual(expiration.timestamp() % 3600, 0)
+            # posts[0] has just been published: it's visible from the next time bucket
+            self.assertTrue(now() < expiration <= now() + timedelta(hours=1))
+
     def test_plugin_featured_cached(self):
         pages = self.get_pages()
         posts = self.get_posts()
@@ -145,13 +251,13 @@ class PluginTest(BaseTest):
         plugin_nocache = add_plugin(ph, "BlogFeaturedPostsPlugin", language="en", app_config=self.app_config_1)
         plugin_nocache.posts.add(posts[0])
         # FIXME: Investigate the correct number of queries expected here
-        with self.assertNumQueries(FuzzyInt(15, 17)):
+        with self.assertNumQueries(FuzzyInt(11, 12)):
             self.render_plugin(pages[0], "en", plugin_nocache)
 
-        with self.assertNumQueries(FuzzyInt(15, 17)):
+        with self.assertNumQueries(FuzzyInt(11, 12)):
             self.render_plugin(pages[0], "en", plugin)
 
-        with self.assertNumQueries(FuzzyInt(15, 17)):
+        with self.assertNumQueries(FuzzyInt(11, 12)):
             rendered = self.render_plugin(pages[0], "en", plugin)
 
         self.assertTrue(rendered.find("<p>first line</p>") > -1)
@@ -198,7 +304,11 @@ class PluginTest(BaseTest):
         posts[1].save()
         ph = pages[0].placeholders.get(slot="content")
         plugin = add_plugin(ph, "BlogTagsPlugin", language="en", app_config=self.app_config_1)
-        rendered = self.render_plugin(pages[0], "en", plugin, edit=True)
+        with CaptureQueriesContext(connection) as queries:
+            rendered = self.render_plugin(pages[0], "en", plugin, edit=True)
+        # publication filter is applied once
+        tags_query = [query["sql"] for query in queries if 'FROM "taggit_taggeditem"' in query["sql"]][-1]
+        self.assertEqual(tags_query.count('."publish"'), 1)
         for tag in Tag.objects.all():
             self.assertTrue(rendered.find(reverse("sample_app:posts-tagged", kwargs={"tag": tag.slug})) > -1)
             if tag.slug == "test-tag":
@@ -319,6 +429,56 @@ class PluginTest10(BaseTest):
         casted_authors, __ = new[0].get_plugin_instance()
         self.assertEqual(casted_authors.authors.count(), 3)
 
+    def test_plugin_authors_posts(self):
+        pages = self.get_pages()
+        posts = self.get_posts()
+        for post in posts[:3]:
+            post.publish = True
+            post.save()
+        posts[2].author = self.user_staff
+        posts[2].save()
+        ph = pages[0].placeholders.get(slot="content")
+        plugin = add_plugin(ph, "BlogAuthorPostsPlugin", language="en", app_config=self.app_config_1, latest_posts=1)
+        plugin.authors.add(self.user, self.user_staff, self.user_normal)
+        request = self.get_request(pages[0], "en")
+
+        authors = {author.pk: author for author in plugin.get_authors(request)}
+        self.assertEqual(authors[self.user.pk].count, 2)
+        self.assertEqual(authors[self.user.pk].posts, list(Post.objects.filter(pk__in=[posts[0].pk, posts[1].pk])[:1]))
+        self.assertEqual(authors[self.user_staff.pk].count, 1)
+        self.assertEqual(authors[self.user_staff.pk].posts, [posts[2]])
+        self.assertEqual(authors[self.user_normal.pk].count, 0)
+        self.assertEqual(authors[self.user_normal.pk].posts, [])
+
+        plugin.latest_posts = 5
+        authors = {author.pk: author for author in plugin.get_authors(request)}
+        self.assertEqual(set(authors[self.user.pk].posts), {posts[0], posts[1]})
+
+        plugin.latest_posts = 1
+        with patch("djangocms_blog.models.django.VERSION", (4, 1)):
+            authors = {author.pk: author for author in plugin.get_authors(request)}
+        self.assertEqual(len(authors[self.user.pk].posts), 1)
+        self.assertEqual(authors[self.user_staff.pk].posts, [posts[2]])
+
+    def test_plugin_authors_posts_translations(self):
+        pages = self.get_pages()
+        posts = self.get_posts()
+        posts[1].publish = True
+        posts[1].save()
+        for post in posts[:2]:
+            post.create_translation("fr", title="Post %s" % post.pk, abstract="<p>abstract</p>")
+            post.create_translation("de", title="Beitrag %s" % post.pk, abstract="<p>abstract</p>")
+        ph = pages[0].placeholders.get(slot="content")
+        plugin = add_plugin(ph, "BlogAuthorPostsPlugin", language="en", app_config=self.app_config_1, latest_posts=2)
+        plugin.authors.add(self.user)
+        request = self.get_request(pages[0], "it")
+
+        for language in ("it", "fr", "en"):
+            with override(language):
+                authors = plugin.get_authors(request)
+                self.assertEqual(authors[0].count, 2)
+                self.assertEqual(authors[0].posts, list(Post.objects.filter(pk__in=[posts[0].pk, posts[1].pk])))
+
     def test_plugin_authors_admin(self):
         other_author = User.objects.create(username="other_author")
         non_author = User.objects.create(username="non_author")
@@ -435,6 +595,9 @@ class PluginTest2(BaseTest):
         context = plugin_class.render(context, plugin, ph)
         self.assertTrue(context["categories"])
         self.assertEqual(list(context["categories"]), [self.category_1])
+        # counts are annotated on the categories
+        with self.assertNumQueries(0):
+            self.assertEqual([category.count for category in context["categories"]], [1])
 
         plugin.current_site = False
         plugin.save()
@@ -446,6 +609,7 @@ class PluginTest2(BaseTest):
         with self.settings(SITE_ID=2):
             context = plugin_class.render(context, plugin, ph)
             self.assertEqual(list(context["categories"]), [self.category_1, new_category])
+            self.assertEqual([category.count for category in context["categories"]], [2, 1])
 
         plugin.current_site = False
         plugin.save()
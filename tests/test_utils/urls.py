@@ -4,21 +4,32 @@ from cms.sitemaps import CMSSitemap
 from django.conf import settings
 from django.conf.urls.i18n import i18n_patterns
 from django.contrib import admin
-from django.contrib.sitemaps.views import sitemap
+from django.contrib.sitemaps.views import index, sitemap
 from django.contrib.staticfiles.urls import staticfiles_urlpatterns
 from django.urls import include, path
 from django.views.i18n import JavaScriptCatalog
 from django.views.static import serve
 
-from djangocms_blog.sitemaps import BlogSitemap
+from djangocms_blog.sitemaps import BlogSitemap, BlogSitemaps
+from djangocms_blog.views import PregeneratedFileView
 
 admin.autodiscover()
 
+blog_sitemaps = BlogSitemaps(cmspages=CMSSitemap)
+
 urlpatterns = [
     path("media/<str:path>", serve, {"document_root": settings.MEDIA_ROOT, "show_indexes": True}),
     path("jsi18n/", JavaScriptCatalog.as_view(), name="javascript-catalog"),
     path("taggit_autosuggest/", include("taggit_autosuggest.urls")),
     path("sitemap.xml", sitemap, {"sitemaps": {"cmspages": CMSSitemap, "blog": BlogSitemap}}),
+    path("sitemap-index.xml", index, {"sitemaps": blog_sitemaps}),
+    path(
+        "sitemap-<str:section>.xml",
+        sitemap,
+        {"sitemaps": blog_sitemaps},
+        name="django.contrib.sitemaps.views.sitemap",
+    ),
+    path("blog-files/<path:path>", PregeneratedFileView.as_view(), name="djangocms_blog-pregenerated"),
 ]
 
 urlpatterns += staticfiles_urlpatterns()
@@ -1,36 +1,66 @@
+import gzip
 import os.path
+import threading
+from datetime import timedelta
+from io import StringIO
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
 
 from aldryn_apphooks_config.utils import get_app_instance
 from app_helper.utils import captured_output
 from cms.api import add_plugin
+from cms.models import Placeholder
+from cms.signals import post_placeholder_operation
+from cms.test_utils.util.fuzzy_int import FuzzyInt
 from cms.toolbar.items import ModalItem
 from cms.utils.apphook_reload import reload_urlconf
 from django.contrib.auth.models import AnonymousUser
+from django.contrib.sites.models import Site
+from django.core.cache import cache
 from django.core.exceptions import ImproperlyConfigured
 from django.core.management import call_command
+from django.core.paginator import EmptyPage
+from django.db import connection
 from django.http import Http404
 from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils.http import http_date, parse_http_date
 from django.utils.timezone import now
 from django.utils.translation import gettext_lazy as _
 from parler.tests.utils import override_parler_settings
 from parler.utils.conf import add_default_language_settings
 from parler.utils.context import smart_override, switch_language
-
-from djangocms_blog.feeds import FBInstantArticles, FBInstantFeed, LatestEntriesFeed, TagFeed
-from djangocms_blog.models import BLOG_CURRENT_NAMESPACE
+from parler.views import TranslatableSlugMixin
+
+from djangocms_blog import caching
+from djangocms_blog.feeds import (
+    FBInstantArticles,
+    FBInstantFeed,
+    LatestEntriesFeed,
+    TagFeed,
+    clean_instant_article,
+    get_prerender_executor,
+    prerender_instant_article,
+    shutdown_prerender_executor,
+)
+from djangocms_blog.managers import get_feed_version, get_post_version
+from djangocms_blog.models import BLOG_CURRENT_NAMESPACE, OPTIMIZE_PROFILES, Post
+from djangocms_blog.pagination import KeysetPaginator
+from djangocms_blog.pregenerate import clear_changed, get_changed, get_storage, get_targets, mark_changed, pregenerate
 from djangocms_blog.settings import get_setting
-from djangocms_blog.sitemaps import BlogSitemap
+from djangocms_blog.sitemaps import BlogConfigSitemap, BlogSitemap, BlogSitemaps
 from djangocms_blog.views import (
     AuthorEntriesView,
     CategoryEntriesView,
     PostArchiveView,
     PostDetailView,
     PostListView,
+    PregeneratedFileView,
     TaggedListView,
 )
 
-from .base import BaseTest
+from .base import BaseTest, shared_connection
 
 
 class CustomUrlViewTest(BaseTest):
@@ -135,6 +165,63 @@ class ViewTest(BaseTest):
                 1,
             )
 
+    @override_settings(BLOG_LIST_CONDITIONAL_GET=True)
+    def test_list_conditional_get(self):
+        self.get_pages()
+        posts = self.get_posts()
+        posts[0].tags.add("tag 1")
+        posts[0].categories.add(self.category_1)
+        posts[0].author = self.user
+        posts[0].save()
+        namespace = self.app_config_1.namespace
+        with smart_override("en"):
+            urls = [
+                reverse("%s:posts-latest" % namespace),
+                reverse("%s:posts-archive" % namespace, kwargs={"year": posts[0].date_published.year}),
+                reverse("%s:posts-author" % namespace, kwargs={"username": self.user.get_username()}),
+                reverse(
+                    "%s:posts-category" % namespace,
+                    kwargs={"category": self.category_1.safe_translation_getter("slug", language_code="en")},
+                ),
+                reverse("%s:posts-tagged" % namespace, kwargs={"tag": "tag-1"}),
+            ]
+        etags = {}
+        for url in urls:
+            response = self.client.get(url)
+            self.assertContains(response, posts[0].get_absolute_url("en"))
+            etags[url] = response["ETag"]
+            with patch("django.views.generic.list.BaseListView.get") as get:
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etags[url]).status_code, 304)
+                response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response["ETag"], etags[url])
+                get.assert_not_called()
+        self.assertEqual(len(set(etags.values())), len(urls))
+        self.assertNotEqual(self.client.get(urls[0], {"page": 2}, HTTP_IF_NONE_MATCH=etags[urls[0]]).status_code, 304)
+
+        # post changes
+        posts[2].publish = True
+        posts[2].save()
+        posts[2].tags.add("tag 1")
+        posts[2].categories.add(self.category_1)
+        for url in urls:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etags[url])
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response["ETag"], etags[url])
+
+        # removed posts are not in the dates of the list
+        last_modified = self.client.get(urls[3])["Last-Modified"]
+        with patch("djangocms_blog.managers.now", return_value=now() + timedelta(seconds=10)):
+            posts[2].categories.remove(self.category_1)
+        response = self.client.get(urls[3], HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(parse_http_date(response["Last-Modified"]), parse_http_date(last_modified))
+
+        # toolbar users
+        self.client.force_login(self.user)
+        response = self.client.get(urls[0], HTTP_IF_NONE_MATCH=etags[urls[0]])
+        self.assertEqual(response.status_code, 200)
+
     def test_get_view_url(self):
         pages = self.get_pages()
         self.get_posts()
@@ -160,6 +247,86 @@ class ViewTest(BaseTest):
         with self.assertRaises(ImproperlyConfigured):
             view_obj_2.get_view_url()
 
+    def test_post_list_view_keyset(self):
+        pages = self.get_pages()
+        posts = self.get_posts()
+        for index, post in enumerate(posts[:3]):
+            post.publish = True
+            post.date_published = now().replace(year=2020, month=index + 1, day=1)
+            post.save()
+        # same date: pk breaks the tie
+        posts[2].date_published = posts[1].date_published
+        posts[2].save()
+        self.app_config_1.app_data.config.keyset_pagination = True
+        self.app_config_1.save()
+
+        def _get_page(**params):
+            request = self.request(
+                pages[1].get_absolute_url("en"), method="get", data=params, page=pages[1], lang="en", user=self.user
+            )
+            view_obj = PostListView()
+            view_obj.request = request
+            view_obj.namespace, view_obj.config = get_app_instance(request)
+            view_obj.args = ()
+            view_obj.kwargs = {}
+            view_obj.object_list = view_obj.get_queryset()
+            return view_obj, view_obj.get_context_data(object_list=view_obj.object_list)
+
+        try:
+            with smart_override("en"):
+                view_obj, context = _get_page()
+                self.assertTrue(context["is_paginated"])
+                self.assertTrue(context["paginator"].keyset)
+                self.assertEqual(list(context["post_list"]), [posts[2]])
+                self.assertFalse(context["page_obj"].has_previous())
+                self.assertTrue(context["page_obj"].next_url.startswith("?after="))
+                self.assertEqual(context["paginator"].count, 3)
+                response = view_obj.render_to_response(context)
+                self.assertContains(response, context["page_obj"].next_url)
+
+                __, context = _get_page(after=context["page_obj"].next_cursor)
+                self.assertEqual(list(context["post_list"]), [posts[1]])
+                self.assertTrue(context["page_obj"].has_previous())
+                self.assertTrue(context["page_obj"].has_next())
+
+                __, context = _get_page(after=context["page_obj"].next_cursor)
+                self.assertEqual(list(context["post_list"]), [posts[0]])
+                self.assertFalse(context["page_obj"].has_next())
+                self.assertTrue(context["page_obj"].previous_url.startswith("?before="))
+
+                __, context = _get_page(before=context["page_obj"].previous_cursor)
+                self.assertEqual(list(context["post_list"]), [posts[1]])
+                self.assertTrue(context["page_obj"].has_previous())
+
+                __, context = _get_page(before=context["page_obj"].previous_cursor)
+                self.assertEqual(list(context["post_list"]), [posts[2]])
+                self.assertFalse(context["page_obj"].has_previous())
+
+                # total count is cached
+                posts[0].delete()
+                __, context = _get_page()
+                self.assertEqual(context["paginator"].count, 3)
+
+                with self.assertRaises(Http404):
+                    _get_page(after="invalid")
+
+            # posts without publication date are sorted last
+            Post.objects.filter(pk=posts[3].pk).update(date_published=None)
+            paginator = KeysetPaginator(Post.objects.all(), 1)
+            page = paginator.page()
+            items = [page[0]]
+            while page.has_next():
+                page = paginator.page(after=page.next_cursor)
+                items.append(page[0])
+            self.assertEqual(items, [posts[2], posts[1], posts[3]])
+            while page.has_previous():
+                page = paginator.page(before=page.previous_cursor)
+                items.pop()
+                self.assertEqual(list(page), items[-1:])
+        finally:
+            self.app_config_1.app_data.config.keyset_pagination = False
+            self.app_config_1.save()
+
     def test_post_list_view_fallback(self):
         pages = self.get_pages()
         self.get_posts()
@@ -232,6 +399,199 @@ class ViewTest(BaseTest):
                 self.assertEqual(context["post"].language_code, "it")
                 self.assertTrue(context["meta"])
 
+    def test_post_detail_queries(self):
+        pages = self.get_pages()
+        posts = self.get_posts()
+        posts[0].tags.add("tag 1", "tag 2")
+        posts[0].categories.add(self.category_1)
+        url = posts[0].get_absolute_url("en")
+        get_object = TranslatableSlugMixin.get_object
+
+        def render():
+            request = self.get_page_request(pages[1], AnonymousUser(), lang="en", path=url)
+            return PostDetailView.as_view()(request, slug=posts[0].slug).render()
+
+        with smart_override("en"):
+            render()
+            with patch.object(TranslatableSlugMixin, "get_object", autospec=True, side_effect=get_object) as mock:
+                with CaptureQueriesContext(connection) as queries:
+                    response = render()
+            # django CMS queries (placeholders, menus) depend on the environment: only blog queries are counted
+            blog_queries = [query["sql"] for query in queries if 'FROM "djangocms_blog_' in query["sql"]]
+            self.assertEqual(len(blog_queries), 8)
+            self.assertEqual(len([sql for sql in blog_queries if sql.startswith('SELECT "djangocms_blog_post"')]), 1)
+            self.assertEqual(mock.call_count, 1)
+            self.assertEqual(response.context_data["post"], posts[0])
+            self.assertIs(
+                response.context_data["post"], getattr(response._request, get_setting("CURRENT_POST_IDENTIFIER"))
+            )
+
+    def test_post_list_queries(self):
+        pages = self.get_pages()
+        posts = self.get_posts()
+
+        def render():
+            request = self.get_page_request(pages[1], AnonymousUser(), lang="en")
+            with CaptureQueriesContext(connection) as queries:
+                response = PostListView.as_view()(request).render()
+            # easy_thumbnails looks up each thumbnail in its own query
+            return response, len([query for query in queries if "easy_thumbnails" not in query["sql"]])
+
+        self.app_config_1.app_data.config.paginate_by = 10
+        self.app_config_1.save()
+        self.addCleanup(self.app_config_1.save)
+        self.addCleanup(setattr, self.app_config_1.app_data.config, "paginate_by", 1)
+        # category counts are rendered by the default templates
+        profile = {
+            "select_related": OPTIMIZE_PROFILES["list"]["select_related"],
+            "prefetch_related": tuple(
+                "categories:counts" if lookup == "categories" else lookup
+                for lookup in OPTIMIZE_PROFILES["list"]["prefetch_related"]
+            ),
+        }
+        with smart_override("en"), override_settings(BLOG_OPTIMIZE_PROFILES={"list": profile}):
+            render()
+            __, num_queries = render()
+            # related objects of new posts are loaded by the same queries
+            for post, author in ((posts[1], self.user_staff), (posts[2], self.user_normal)):
+                post.publish = True
+                post.author = author
+                post.main_image = posts[0].main_image
+                post.main_image_thumbnail = self.thumb_1
+                post.save()
+                post.tags.add("tag %s" % post.pk, "tag")
+            posts[0].tags.add("tag")
+            # warm up the menu and the thumbnails
+            render()
+            response, new_num_queries = render()
+        self.assertEqual(len(response.context_data["post_list"]), 3)
+        self.assertEqual(new_num_queries, num_queries)
+
+    def test_optimize_profiles(self):
+        pages = self.get_pages()
+        self.get_posts()
+        request = self.get_request(pages[1], "en", AnonymousUser())
+
+        with smart_override("en"):
+            view_obj = PostListView()
+            view_obj.request = request
+            view_obj.namespace, view_obj.config = get_app_instance(request)
+            queryset = view_obj.get_queryset()
+            self.assertIn("author", queryset.query.select_related)
+            self.assertIn("tags", queryset._prefetch_related_lookups)
+            self.assertIn("translations", queryset._prefetch_related_lookups)
+
+            # only the active languages translations are fetched
+            profiles = {"list": {"select_related": (), "prefetch_related": ("translations:active",)}}
+            with override_settings(BLOG_OPTIMIZE_PROFILES=profiles):
+                translations = view_obj.get_queryset()._prefetch_related_lookups[0]
+                self.assertEqual(translations.prefetch_through, "translations")
+                self.assertEqual(set(translations.queryset.values_list("language_code", flat=True)), {"en"})
+
+            profiles = {"list:djangocms_blog": {"select_related": ("app_config",), "prefetch_related": ("tags",)}}
+            with override_settings(BLOG_OPTIMIZE_PROFILES=profiles):
+                queryset = view_obj.get_queryset()
+                self.assertEqual(queryset._prefetch_related_lookups, ("tags",))
+                self.assertNotIn("author", queryset.query.select_related)
+                self.assertEqual(list(queryset), list(view_obj.get_queryset()))
+                self.assertFalse(hasattr(queryset[0].categories.all()[0], "published_count"))
+
+            profiles = {"list": {"select_related": (), "prefetch_related": ("categories:counts",)}}
+            with override_settings(BLOG_OPTIMIZE_PROFILES=profiles):
+                queryset = view_obj.get_queryset()
+                self.assertEqual(queryset[0].categories.all()[0].published_count, 1)
+
+    def test_post_detail_cache(self):
+        self.get_pages()
+        posts = self.get_posts()
+        posts[2].publish = True
+        posts[2].save()
+        url = posts[0].get_absolute_url("en")
+        get_object = PostDetailView.get_object
+
+        def get(**headers):
+            with patch.object(PostDetailView, "get_object", autospec=True, side_effect=get_object) as mock:
+                response = self.client.get(url, **headers)
+            response.rendered = mock.called
+            return response
+
+        # disabled by default
+        self.assertTrue(get().rendered)
+        self.assertTrue(get().rendered)
+
+        self.app_config_1.app_data.config.detail_cache = True
+        self.app_config_1.save()
+        try:
+            response = get()
+            self.assertTrue(response.rendered)
+            self.assertContains(response, posts[0].get_title())
+            etag = response["ETag"]
+            posts[0].refresh_from_db()
+            self.assertEqual(response["Last-Modified"], http_date(posts[0].date_modified.timestamp()))
+
+            cached = get()
+            self.assertFalse(cached.rendered)
+            self.assertEqual(cached.content, response.content)
+            self.assertEqual(cached["ETag"], etag)
+            self.assertEqual(get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            self.assertEqual(get(HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]).status_code, 304)
+            # requests with a query string are not cached
+            with patch.object(PostDetailView, "get_object", autospec=True, side_effect=get_object) as mock:
+                self.assertEqual(self.client.get(url, {"utm_source": "feed"}).content, response.content)
+                self.assertTrue(mock.called)
+            self.assertFalse(get().rendered)
+
+            # post changes
+            version = get_post_version(posts[0].pk)
+            posts[0].set_current_language("en")
+            posts[0].title = "Changed title"
+            posts[0].save()
+            self.assertNotEqual(get_post_version(posts[0].pk), version)
+            response = get()
+            self.assertTrue(response.rendered)
+            self.assertContains(response, "Changed title")
+
+            # related posts, tags, categories and placeholders changes
+            for change in (
+                lambda: posts[0].related.add(posts[2]),
+                lambda: posts[2].save(),
+                lambda: posts[0].tags.add("tag 1"),
+                lambda: posts[0].categories.add(self.category_1),
+                lambda: self.category_1.save(),
+                lambda: self.category_1.blog_posts.clear(),
+                lambda: post_placeholder_operation.send(
+                    sender=Placeholder, operation="add_plugin", request=None, placeholder=posts[0].content
+                ),
+            ):
+                version = get_post_version(posts[0].pk)
+                change()
+                self.assertNotEqual(get_post_version(posts[0].pk), version)
+            version = get_post_version(posts[0].pk)
+            posts[1].save()
+            self.assertEqual(get_post_version(posts[0].pk), version)
+
+            # cache is bypassed for toolbar users
+            self.client.force_login(self.user)
+            response = get()
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.rendered)
+            self.client.logout()
+
+            # the old URL is not served from the cache after a slug change
+            get()
+            self.assertFalse(get().rendered)
+            posts[0].slug = "renamed-post"
+            posts[0].save()
+            new_url = posts[0].get_absolute_url("en")
+            self.assertContains(self.client.get(new_url), "Changed title")
+            self.assertContains(self.client.get(new_url), "Changed title")
+            response = get()
+            self.assertEqual(response.status_code, 404)
+            self.assertTrue(response.rendered)
+        finally:
+            self.app_config_1.app_data.config.detail_cache = False
+            self.app_config_1.save()
+
     def test_post_detail_on_different_site(self):
         pages = self.get_pages()
         post1 = self._get_post(
@@ -446,6 +806,61 @@ class TaggedItemViewTest(BaseTest):
             self.assertEqual(context["paginator"].count, 2)
             self.assertEqual(context["post_list"][0].title, "First post")
 
+    def test_feed_cache(self):
+        pages = self.get_pages()
+        posts = self.get_posts()
+        posts[0].tags.add("tag 1")
+
+        def get_feed(feed_class=LatestEntriesFeed, **kwargs):
+            request = self.get_page_request(pages[1], AnonymousUser(), path=posts[0].get_absolute_url("en"))
+            request.META.update(kwargs.pop("headers", {}))
+            return feed_class()(request, **kwargs)
+
+        with smart_override("en"):
+            response = get_feed()
+            self.assertContains(response, posts[0].get_absolute_url("en"))
+            self.assertNotContains(response, "Third post")
+            last_modified = response["Last-Modified"]
+            with self.assertNumQueries(FuzzyInt(0, 3)):
+                cached = get_feed()
+            self.assertEqual(cached.content, response.content)
+            self.assertEqual(cached["Last-Modified"], last_modified)
+            self.assertEqual(get_feed(TagFeed, tag="tag-1").content.count(b"<item>"), 1)
+
+            # conditional get
+            response = get_feed(headers={"HTTP_IF_MODIFIED_SINCE": last_modified})
+            self.assertEqual(response.status_code, 304)
+
+            # invalidation on post changes
+            posts[2].publish = True
+            posts[2].save()
+            response = get_feed()
+            self.assertContains(response, posts[2].get_absolute_url("en"))
+
+            # invalidation on tags changes
+            posts[2].tags.add("tag 1")
+            self.assertEqual(get_feed(TagFeed, tag="tag-1").content.count(b"<item>"), 2)
+
+            # feeds are versioned per app config and language
+            versions = {language: get_feed_version(self.app_config_1.pk, language) for language in ("en", "it")}
+            posts[3].save()
+            self.assertEqual(get_feed_version(self.app_config_1.pk, "en"), versions["en"])
+            posts[0].set_current_language("it")
+            posts[0].title = "Titolo cambiato"
+            posts[0].save_translations()
+            self.assertEqual(get_feed_version(self.app_config_1.pk, "en"), versions["en"])
+            self.assertNotEqual(get_feed_version(self.app_config_1.pk, "it"), versions["it"])
+            self.assertNotContains(get_feed(), "Titolo cambiato")
+            posts[0].save()
+            self.assertNotEqual(get_feed_version(self.app_config_1.pk, "en"), versions["en"])
+
+            # cache expires on the next publication change
+            posts[1].publish = True
+            posts[1].date_published = now() + timedelta(seconds=100)
+            posts[1].save()
+            timeout = LatestEntriesFeed().get_cache_timeout()
+            self.assertTrue(0 < timeout <= 101)
+
     def test_feed(self):
         self.user.first_name = "Admin"
         self.user.last_name = "User"
@@ -503,6 +918,81 @@ class TaggedItemViewTest(BaseTest):
                 posts[0].save()
 
 
+class PregeneratedFilesTest(BaseTest):
+    def test_pregenerate_files(self):
+        self.get_pages()
+        posts = self.get_posts()
+        with TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root, ALLOWED_HOSTS=["*"]):
+            output = StringIO()
+            call_command("pregenerate_blog_files", "--protocol=http", stdout=output)
+            storage = get_storage()
+            # 2 feeds and 1 sitemap page for each apphook and language, plus the sitemap index
+            self.assertEqual(output.getvalue().strip(), "Pre-generated files: %s" % (len(get_targets()) * 3 + 1))
+            self.assertEqual(len(storage.listdir("djangocms_blog/1/{}/en".format(self.app_config_1.namespace))[1]), 6)
+            name = "djangocms_blog/1/{}/en/feed.xml".format(self.app_config_1.namespace)
+            with storage.open(name) as file:
+                content = file.read()
+            with storage.open(name + ".gz") as file:
+                self.assertEqual(gzip.decompress(file.read()), content)
+            self.assertIn(posts[0].get_absolute_url("en").encode(), content)
+            self.assertTrue(
+                storage.exists("djangocms_blog/1/{}/it/instant-articles.xml".format(self.app_config_1.namespace))
+            )
+            with storage.open("djangocms_blog/1/sitemap.xml") as file:
+                self.assertIn(
+                    "http://example.com/blog-files/{}/en/sitemap-1.xml".format(self.app_config_1.namespace).encode(),
+                    file.read(),
+                )
+
+            # serving view
+            url = "/blog-files/{}/en/feed.xml".format(self.app_config_1.namespace)
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.content, content)
+            self.assertEqual(response["Content-Type"], "application/rss+xml; charset=utf-8")
+            self.assertTrue(response["Last-Modified"])
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+            self.assertEqual(response.status_code, 304)
+            response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip, deflate")
+            self.assertEqual(response["Content-Encoding"], "gzip")
+            self.assertEqual(gzip.decompress(response.content), content)
+            response = self.client.get("/blog-files/{}/en/sitemap-1.xml".format(self.app_config_1.namespace))
+            self.assertEqual(response["Content-Type"], "application/xml")
+            self.assertContains(response, posts[0].get_absolute_url("en"))
+            for path in ("../1/sitemap.xml", "missing.xml"):
+                with self.assertRaises(Http404):
+                    PregeneratedFileView.as_view()(self.get_request(None, "en"), path=path)
+
+            # incremental mode
+            output = StringIO()
+            call_command("pregenerate_blog_files", "--changed", stdout=output)
+            self.assertEqual(output.getvalue().strip(), "Pre-generated files: 1")
+            with override_settings(BLOG_PREGENERATE_ON_CHANGE=True):
+                posts[0].save()
+            output = StringIO()
+            call_command("pregenerate_blog_files", "--changed", "--language=en", stdout=output)
+            # 2 feeds and 1 sitemap page for the changed namespace, plus the sitemap index
+            self.assertEqual(output.getvalue().strip(), "Pre-generated files: 4")
+            # files are replaced, without leftover temporary files
+            self.assertEqual(len(storage.listdir("djangocms_blog/1/{}/en".format(self.app_config_1.namespace))[1]), 6)
+
+            # outdated status is cleared only once the files are written
+            target = (self.app_config_1.namespace, "en")
+            mark_changed(self.app_config_1.namespace)
+            with patch("djangocms_blog.pregenerate.generate_index", side_effect=OSError):
+                with self.assertRaises(OSError):
+                    pregenerate(languages=["en"], changed=True)
+            self.assertIn(target, get_changed([target]))
+            pregenerate(languages=["en"], changed=True)
+            self.assertEqual(get_changed([target]), {})
+            # changes made while the files are generated are kept
+            mark_changed(self.app_config_1.namespace)
+            marks = get_changed([target])
+            mark_changed(self.app_config_1.namespace)
+            clear_changed(marks)
+            self.assertIn(target, get_changed([target]))
+
+
 class SitemapViewTest(BaseTest):
     def test_sitemap(self):
         self.get_pages()
@@ -523,6 +1013,66 @@ class SitemapViewTest(BaseTest):
             with smart_override(item.get_current_language()):
                 self.assertEqual(sitemap.location(item), item.get_absolute_url())
 
+    def test_sitemap_sections(self):
+        self.get_pages()
+        posts = self.get_posts()
+        posts[1].publish = True
+        posts[1].save()
+        site = Site.objects.get_current()
+
+        sitemaps = BlogSitemaps()
+        self.assertEqual(
+            set(sitemaps.keys()),
+            {
+                "blog-{}-{}".format(app_config.namespace, language)
+                for app_config in (self.app_config_1, self.app_config_2)
+                for language in ("en", "it", "fr")
+            },
+        )
+        for language in ("en", "it"):
+            sitemap = sitemaps["blog-{}-{}".format(self.app_config_1.namespace, language)]
+            expected = {
+                "http://{}{}".format(site.domain, url)
+                for url in Post.objects.namespace(self.app_config_1.namespace).published().get_urls(language).values()
+            }
+            self.assertEqual(len(expected), 2)
+            urls = sitemap.get_urls(site=site, protocol="http")
+            self.assertEqual({url["location"] for url in urls}, expected)
+            self.assertEqual({url["priority"] for url in urls}, {get_setting("SITEMAP_PRIORITY_DEFAULT")})
+            self.assertEqual(sitemap.get_latest_lastmod(), max(url["lastmod"] for url in urls))
+        self.assertEqual(sitemaps["blog-{}-fr".format(self.app_config_1.namespace)].get_urls(site=site), [])
+
+        # pages
+        sitemap = BlogConfigSitemap(self.app_config_1, "en")
+        sitemap.limit = 1
+        self.assertEqual(sitemap.paginator.num_pages, 2)
+        locations = [url["location"] for page in (1, 2) for url in sitemap.get_urls(page, site=site)]
+        self.assertEqual(len(locations), 2)
+        self.assertEqual(len(set(locations)), 2)
+        with self.assertRaises(EmptyPage):
+            sitemap.get_urls(3, site=site)
+
+        # page boundaries are cached until posts change
+        sitemap = BlogConfigSitemap(self.app_config_1, "en")
+        sitemap.limit = 1
+        with self.assertNumQueries(0):
+            self.assertEqual(sitemap.paginator.num_pages, 2)
+        posts[2].publish = True
+        posts[2].save()
+        sitemap = BlogConfigSitemap(self.app_config_1, "en")
+        sitemap.limit = 1
+        self.assertEqual(sitemap.paginator.num_pages, 3)
+        posts[2].publish = False
+        posts[2].save()
+
+        # index and sections views
+        response = self.client.get("/sitemap-index.xml")
+        self.assertContains(response, "/sitemap-blog-{}-en.xml".format(self.app_config_1.namespace))
+        self.assertContains(response, "/sitemap-cmspages.xml")
+        response = self.client.get("/sitemap-blog-{}-en.xml".format(self.app_config_1.namespace))
+        self.assertContains(response, posts[0].get_absolute_url("en"))
+        self.assertNotContains(response, posts[2].get_absolute_url("en"))
+
     def test_sitemap_with_unpublished(self):
         pages = self.get_pages()
         self.get_posts()
@@ -593,3 +1143,131 @@ class InstanctArticlesViewTest(BaseTest):
                 # Assert text transformation
                 self.assertContains(xml, "<h2>Ciao</h2><p>Ciao</p>")
                 self.assertContains(xml, "<a>Admin User</a>")
+
+    def test_clean_instant_article(self):
+        page = (
+            "<!doctype html><html lang='it'><head><meta charset='utf-8'></head><body><article><header>"
+            "<h3 class='op-kicker'>Kicker</h3></header><div><h3>Ciaò</h3><h6 class='big'>Titolo</h6><p></p><p> </p>"
+            "<p>x&amp;y</p><p><br></p><h4>&egrave;</h4></div></article></body></html>"
+        ).encode("utf-8")
+        # only the article is parsed and cleaned
+        self.assertEqual(
+            clean_instant_article(page),
+            b"<html lang='it'><head><meta charset='utf-8'></head><body><article><header>"
+            b'<h3 class="op-kicker">Kicker</h3></header><div><h2>Cia&#242;</h2><h2 class="big">Titolo</h2>'
+            b"<p>x&amp;y</p><p><br/></p><h2>&#232;</h2></div></article></body></html>",
+        )
+        # pages without article are cleaned as a whole
+        self.assertEqual(
+            clean_instant_article(b"<div><p></p><h5>Ciao</h5></div>"),
+            b"<html><body><div><h2>Ciao</h2></div></body></html>",
+        )
+        # sibling articles are kept, and cleaned with the whole page
+        self.assertEqual(
+            clean_instant_article(
+                b"<body><article><h4>One</h4><p></p></article><aside><h5>Aside</h5></aside>"
+                b"<article><p></p><h3>Two</h3></article></body>"
+            ),
+            b"<html><body><article><h2>One</h2></article><aside><h2>Aside</h2></aside>"
+            b"<article><h2>Two</h2></article></body></html>",
+        )
+
+    def test_instant_articles_parallel(self):
+        pages = self.get_pages()
+        posts = self.get_posts()
+        posts[1].publish = True
+        posts[1].save()
+        posts[2].publish = True
+        posts[2].save()
+        for post in posts[:3]:
+            add_plugin(post.content, "TextPlugin", language="en", body="<h3>%s</h3><p></p>" % post.pk)
+
+        def get_feed():
+            with smart_override("en"):
+                request = self.get_page_request(pages[1], AnonymousUser(), path=posts[0].get_absolute_url("en"))
+                return FBInstantArticles()(request).content
+
+        threads = []
+        requests = []
+        render_content = FBInstantArticles.render_content
+
+        def record_thread(feed, request, item):
+            threads.append(threading.current_thread().name)
+            requests.append(request)
+            return render_content(feed, request, item)
+
+        with patch.object(FBInstantArticles, "render_content", record_thread):
+            with override_settings(BLOG_FEED_INSTANT_RENDER_WORKERS=1):
+                sequential = get_feed()
+            self.assertEqual(threads, [threading.current_thread().name] * 3)
+            for post in posts[:3]:
+                self.assertIn("<h2>{}</h2>".format(post.pk).encode(), sequential)
+
+            threads = []
+            requests = []
+            cache.clear()
+            with shared_connection("djangocms_blog.feeds.ThreadPoolExecutor"):
+                with override_settings(BLOG_FEED_INSTANT_RENDER_WORKERS=4):
+                    parallel = get_feed()
+            self.assertEqual(len(threads), 3)
+            self.assertTrue(all(name.startswith("djangocms-blog-feed") for name in threads))
+            # each item is rendered in its own request, with its own toolbar
+            self.assertEqual(len({id(request) for request in requests}), 3)
+            self.assertEqual(len({id(request.toolbar) for request in requests}), 3)
+            self.assertEqual(parallel, sequential)
+            for post in posts[:3]:
+                self.assertTrue(cache.get(post.get_cache_key("en", "feed")))
+
+            # cached contents are not rendered again
+            threads = []
+            cache.delete(posts[1].get_cache_key("en", "feed"))
+            with (
+                shared_connection("djangocms_blog.feeds.ThreadPoolExecutor"),
+                override_settings(BLOG_FEED_INSTANT_RENDER_WORKERS=4),
+            ):
+                FBInstantArticles().get_contents(
+                    self.get_page_request(pages[1], AnonymousUser(), lang="en"), posts[:3]
+                )
+            self.assertEqual(threads, [threading.current_thread().name])
+
+    def test_instant_articles_prerender(self):
+        pages = self.get_pages()
+        posts = self.get_posts()
+        add_plugin(posts[0].content, "TextPlugin", language="en", body="<h3>Ciao</h3><p></p><p>Ciao</p>")
+
+        with override_settings(ALLOWED_HOSTS=["*"]):
+            content = prerender_instant_article(posts[0].pk, "en")
+            self.assertIn(b"<h2>Ciao</h2><p>Ciao</p>", content)
+            self.assertEqual(caching.get(posts[0].get_cache_key("en", "feed")), content)
+            self.assertIsNone(prerender_instant_article(posts[1].pk, "en"))
+            self.assertIsNone(prerender_instant_article(posts[0].pk, "fr"))
+
+        # feed reads the pre-rendered content
+        with smart_override("en"), patch.object(FBInstantArticles, "render_content") as render_content:
+            request = self.get_page_request(pages[1], AnonymousUser(), path=posts[0].get_absolute_url("en"))
+            xml = FBInstantArticles()(request)
+            self.assertContains(xml, "<h2>Ciao</h2><p>Ciao</p>")
+            render_content.assert_not_called()
+
+        # rendering is scheduled after the post is saved
+        with patch("djangocms_blog.feeds.get_prerender_executor") as executor:
+            with self.captureOnCommitCallbacks(execute=True):
+                posts[0].save()
+            executor.assert_not_called()
+            with override_settings(BLOG_FEED_INSTANT_PRERENDER_WORKERS=2):
+                with self.captureOnCommitCallbacks(execute=True):
+                    posts[0].save()
+            self.assertEqual(
+                {call.args[1:] for call in executor.return_value.submit.call_args_list},
+                {(posts[0].pk, "en"), (posts[0].pk, "it")},
+            )
+
+        # the thread pool is created again after shutdown
+        with override_settings(BLOG_FEED_INSTANT_PRERENDER_WORKERS=2):
+            executor = get_prerender_executor()
+            self.assertIs(get_prerender_executor(), executor)
+            shutdown_prerender_executor()
+            with self.assertRaises(RuntimeError):
+                executor.submit(print)
+            self.assertIsNot(get_prerender_executor(), executor)
+            shutdown_prerender_executor()